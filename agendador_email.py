@@ -0,0 +1,177 @@
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from database import count_emails_sent_since
+from pool_smtp import conta_padrao
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Cotas de envio por conta (limites do provedor)
+MAIL_LIMITE_POR_MINUTO = int(os.getenv('MAIL_LIMITE_POR_MINUTO', 20))
+MAIL_LIMITE_POR_DIA = int(os.getenv('MAIL_LIMITE_POR_DIA', 500))
+
+# Pausa (segundos) de uma conta após o provedor recusar por excesso de envios
+MAIL_PAUSA_LIMITE = int(os.getenv('MAIL_PAUSA_LIMITE', 120))
+
+# Faixas (segundos) do histograma de espera na fila
+FAIXAS_ESPERA = (1, 5, 30, 60, 300, 900, 3600)
+
+class BaldeTokens:
+    """Token bucket: até `capacidade` envios, repostos continuamente a cada `periodo` segundos"""
+
+    def __init__(self, capacidade, periodo, tokens=None):
+        self.capacidade = capacidade
+        self.taxa = capacidade / periodo
+        self.tokens = capacidade if tokens is None else max(0, min(tokens, capacidade))
+        self.atualizado = time.monotonic()
+
+    def repor(self, agora):
+        if agora <= self.atualizado:
+            return
+        self.tokens = min(self.capacidade, self.tokens + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+
+    def espera(self):
+        """Segundos até haver um token (chamar após repor)"""
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.taxa
+
+def carregar_contas():
+    """Contas remetentes: MAIL_* e, opcionalmente, MAIL_USERNAME_2/MAIL_PASSWORD_2, _3...
+
+    MAIL_SERVER_N e MAIL_PORT_N são opcionais e herdam os valores da conta principal.
+    """
+    principal = conta_padrao()
+    contas = [principal]
+    numero = 2
+    while os.getenv(f"MAIL_USERNAME_{numero}"):
+        contas.append({
+            'servidor': os.getenv(f"MAIL_SERVER_{numero}", principal['servidor']),
+            'porta': int(os.getenv(f"MAIL_PORT_{numero}", principal['porta'])),
+            'usuario': os.getenv(f"MAIL_USERNAME_{numero}"),
+            'senha': os.getenv(f"MAIL_PASSWORD_{numero}")
+        })
+        numero += 1
+    return contas
+
+_remetentes = None
+_lock = threading.Lock()
+
+_metricas = {
+    'esperas': 0,
+    'espera_total': 0.0,
+    'espera_max': 0.0,
+    'histograma_espera': {str(faixa): 0 for faixa in FAIXAS_ESPERA + ('inf',)}
+}
+
+def _obter_remetentes():
+    """Estado das contas, criado na primeira utilização (cota diária descontando o já enviado nas últimas 24h)"""
+    global _remetentes
+    if _remetentes is None:
+        desde = datetime.now() - timedelta(days=1)
+        _remetentes = []
+        for conta in carregar_contas():
+            enviados_24h = count_emails_sent_since(desde, conta['usuario'])
+            _remetentes.append({
+                'conta': conta,
+                'minuto': BaldeTokens(MAIL_LIMITE_POR_MINUTO, 60),
+                'dia': BaldeTokens(MAIL_LIMITE_POR_DIA, 86400, MAIL_LIMITE_POR_DIA - enviados_24h),
+                'pausada_ate': 0,
+                'enviados': 0,
+                'limites_atingidos': 0
+            })
+        logger.info(f"Agendador de envio: {len(_remetentes)} conta(s), {MAIL_LIMITE_POR_MINUTO}/min e {MAIL_LIMITE_POR_DIA}/dia por conta")
+    return _remetentes
+
+def _espera_remetente(remetente, agora):
+    remetente['minuto'].repor(agora)
+    remetente['dia'].repor(agora)
+    return max(remetente['minuto'].espera(), remetente['dia'].espera(), remetente['pausada_ate'] - agora, 0)
+
+def envios_disponiveis():
+    """Quantos e-mails podem ser enviados agora sem exceder as cotas"""
+    with _lock:
+        agora = time.monotonic()
+        total = 0
+        for remetente in _obter_remetentes():
+            if _espera_remetente(remetente, agora) == 0:
+                total += int(min(remetente['minuto'].tokens, remetente['dia'].tokens))
+        return total
+
+def tempo_ate_proximo_envio():
+    """Segundos até alguma conta ter cota disponível"""
+    with _lock:
+        agora = time.monotonic()
+        return min(_espera_remetente(remetente, agora) for remetente in _obter_remetentes())
+
+def reservar_envio():
+    """Consome um envio da conta com mais cota livre; retorna a conta ou None se nenhuma tiver cota"""
+    with _lock:
+        agora = time.monotonic()
+        livres = [r for r in _obter_remetentes() if _espera_remetente(r, agora) == 0]
+        if not livres:
+            return None
+        # Distribuir a carga: a conta com mais envios disponíveis no minuto (e no dia) primeiro
+        remetente = max(livres, key=lambda r: (r['minuto'].tokens, r['dia'].tokens))
+        remetente['minuto'].tokens -= 1
+        remetente['dia'].tokens -= 1
+        remetente['enviados'] += 1
+        return remetente['conta']
+
+def aguardar_envio():
+    """Bloqueia até haver cota em alguma conta, reserva o envio e retorna a conta"""
+    while True:
+        conta = reservar_envio()
+        if conta:
+            return conta
+        time.sleep(min(max(tempo_ate_proximo_envio(), 0.05), 60))
+
+def registrar_limite_atingido(usuario):
+    """O provedor recusou por volume: pausa a conta e zera a cota do minuto"""
+    with _lock:
+        for remetente in _obter_remetentes():
+            if remetente['conta']['usuario'] == usuario:
+                remetente['pausada_ate'] = time.monotonic() + MAIL_PAUSA_LIMITE
+                remetente['minuto'].tokens = 0
+                remetente['limites_atingidos'] += 1
+    logger.warning(f"Limite de envio atingido na conta {usuario}: pausada por {MAIL_PAUSA_LIMITE}s")
+
+def registrar_espera_fila(segundos):
+    """Tempo que o e-mail esperou na fila desde que ficou pronto para envio"""
+    segundos = max(segundos, 0)
+    faixa = next((str(f) for f in FAIXAS_ESPERA if segundos <= f), 'inf')
+    with _lock:
+        _metricas['esperas'] += 1
+        _metricas['espera_total'] += segundos
+        _metricas['espera_max'] = max(_metricas['espera_max'], segundos)
+        _metricas['histograma_espera'][faixa] += 1
+
+def get_agendador_stats():
+    """Cotas disponíveis por conta e espera na fila (histograma com a contagem por faixa, em segundos)"""
+    with _lock:
+        agora = time.monotonic()
+        contas = {}
+        for remetente in _obter_remetentes():
+            espera = _espera_remetente(remetente, agora)
+            contas[remetente['conta']['usuario']] = {
+                'disponivel_minuto': math.floor(remetente['minuto'].tokens),
+                'disponivel_dia': math.floor(remetente['dia'].tokens),
+                'proximo_envio_segundos': espera,
+                'pausada': remetente['pausada_ate'] > agora,
+                'enviados': remetente['enviados'],
+                'limites_atingidos': remetente['limites_atingidos']
+            }
+        metricas = dict(_metricas)
+        metricas['histograma_espera'] = dict(_metricas['histograma_espera'])
+
+    metricas['espera_media'] = metricas['espera_total'] / metricas['esperas'] if metricas['esperas'] else 0
+    return {
+        'limite_por_minuto': MAIL_LIMITE_POR_MINUTO,
+        'limite_por_dia': MAIL_LIMITE_POR_DIA,
+        'contas': contas,
+        'espera_fila': metricas
+    }
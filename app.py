@@ -1,13 +1,24 @@
-from flask import Flask, render_template, request, jsonify, url_for, session, redirect
+from flask import Flask, render_template, request, jsonify, url_for, session, redirect, Response, stream_with_context, send_file
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from markupsafe import Markup
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
-import pdfkit
+import base64
+import mimetypes
+import re
+import json
+import itertools
+import csv
+import io
+import zipfile
+import math
+import hmac
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from types import MappingProxyType
 import os
+import requests
 
 smtplib.SMTP.debuglevel = 1   # <-- Coloque aqui!
 
@@ -25,35 +36,139 @@ except ImportError:
                     os.environ[key] = value
 
 print("DEBUG MP_ACCESS_TOKEN:", repr(os.getenv("MP_ACCESS_TOKEN")))
-import mercadopago
 from tabela_referencia_competencias import COMPETENCIAS_ACOES
-from database import init_database, save_transaction, get_transaction_by_payment_id, get_transactions_by_status, get_all_transactions, get_transaction_stats
+from pontuacao import COMPETENCIAS_PRINCIPAIS, CHAVES_RESPOSTAS, calcular_resultado_avaliacao
+from pontuacao_lote import numpy_disponivel, ler_linhas_csv, calcular_resultados_lote, formatar_resultados_lote
+from database import init_database, get_transaction_by_payment_id, get_transactions_by_status, get_all_transactions, get_transaction_stats, get_transaction_timeseries, get_outbox_stats, get_webhook_inbox_stats, save_assessment, get_assessment_report
+from jobs import submit_job, update_job, get_job
+from renderizador_pdf import renderizar_pdf, PDF_RENDER_CONCORRENCIA
+from cache_pdf import calcular_chave, calcular_versao_conteudo, get_pdf, put_pdf, caminho_pdf, contem_pdf, get_cache_stats
+from pool_smtp import get_pool_stats
+from outbox_email import enfileirar_email, iniciar_remetente, get_remetente_stats
+from agendador_email import get_agendador_stats
+from resumo_email import iniciar_resumo, enviar_resumo
+from cliente_mp import criar_sdk, get_mp_stats, prazo_chamada, CircuitoAberto
+from inbox_webhook import receber_notificacao, iniciar_resolvedor, get_resolvedor_stats, RECEBIDA, DUPLICADA, IGNORADA
+from pool_preferencias import retirar_preferencia, criar_preferencia, iniciar_pool_preferencias, get_pool_preferencias_stats
 
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
 
 from flask import request, jsonify
 
+def receber_webhook(origem):
+    """Ingestão única das notificações do Mercado Pago: valida, grava na inbox e responde
+    
+    A consulta do pagamento e o save_transaction (que registra o pagamento aprovado pelo
+    external_reference) acontecem no resolvedor em segundo plano (inbox_webhook), então a
+    resposta não espera a API do MP.
+    """
+    data = request.get_json(silent=True, force=True)
+    logger.info(f"Webhook MP recebido em {origem}: {data or dict(request.args)}")
+    
+    # Corpo que não é JSON e sem parâmetros de IPN na query string: requisição malformada
+    if data is None and request.get_data() and not request.args:
+        return jsonify({'status': 'error', 'message': 'Invalid notification'}), 400
+    
+    resultado, webhook_id = receber_notificacao(data, request.args, origem)
+    if resultado == RECEBIDA:
+        return jsonify({'status': 'received', 'id': webhook_id}), 200
+    if resultado == DUPLICADA:
+        return jsonify({'status': 'duplicate'}), 200
+    if resultado == IGNORADA:
+        # Outros tópicos ou sem id de pagamento: 200 para o Mercado Pago não reenviar
+        return jsonify({'status': 'ignored', 'message': 'Not a payment notification'}), 200
+    # Inbox indisponível: erro para o Mercado Pago reenviar a notificação
+    return jsonify({'status': 'error', 'message': 'Notification not stored'}), 500
+
 @app.route('/webhook', methods=['POST'])
 def webhook():
-    # Pega os dados recebidos do Mercado Pago
-    data = request.json
-    print("Recebido Webhook Mercado Pago:", data)
-    # Aqui você pode adicionar o tratamento necessário, como atualizar o status do pagamento
-    # Exemplo: salvar num log, atualizar banco, liberar acesso, etc.
-
-    # Sempre retorne 200 para indicar recebimento OK ao Mercado Pago
-    return jsonify({'status': 'received'}), 200
+    """Webhook do Mercado Pago (URL antiga)"""
+    return receber_webhook('/webhook')
 
 # Configuração do Mercado Pago via variáveis de ambiente
-mp = mercadopago.SDK(os.getenv("MP_ACCESS_TOKEN"))
+# (cliente HTTP com conexões keep-alive, timeouts e novas tentativas: cliente_mp.py)
+mp = criar_sdk(os.getenv("MP_ACCESS_TOKEN"))
+
+# Prazo (segundos) do /checkout para criar a preferência, somando as novas tentativas
+MP_PRAZO_CHECKOUT = float(os.getenv("MP_PRAZO_CHECKOUT", 5))
 PUBLIC_KEY = os.getenv("MP_PUBLIC_KEY")
 CLIENT_ID = os.getenv("MP_CLIENT_ID")
 CLIENT_SECRET = os.getenv("MP_CLIENT_SECRET")
 
+# Modo assíncrono do /submit_avaliacao: responde 202 com job_id e gera PDF/e-mail em segundo plano
+SUBMIT_ASSINCRONO = os.getenv("SUBMIT_ASSINCRONO", "false").lower() in ("1", "true", "sim")
+
+# Relatórios em lote: PDFs em andamento ao mesmo tempo (limita a memória usada pelo ZIP transmitido)
+LOTE_JANELA_PDFS = int(os.getenv("LOTE_JANELA_PDFS", PDF_RENDER_CONCORRENCIA * 2))
+
+# Relatórios em lote: máximo de respondentes por CSV
+LOTE_MAX_AVALIACOES = int(os.getenv("LOTE_MAX_AVALIACOES", 500))
+
+# Pontuação em lote: máximo de linhas (avaliações) por matriz
+LOTE_MAX_LINHAS = int(os.getenv("LOTE_MAX_LINHAS", 10000))
+
+# Credencial das rotas administrativas que geram relatórios ou enviam e-mails
+# (Authorization: Bearer <token> ou usuário qualquer e o token como senha no HTTP Basic)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Entrega do relatório por versão: 'anexo' (PDF no e-mail) ou 'link' (link assinado para /relatorio/<token>)
+ENTREGA_RELATORIO = {
+    'gratuita': os.getenv("ENTREGA_RELATORIO_GRATUITA", "anexo"),
+    'premium': os.getenv("ENTREGA_RELATORIO_PREMIUM", "anexo")
+}
+
+# Validade (em dias) dos links de download do relatório
+RELATORIO_LINK_VALIDADE_DIAS = int(os.getenv("RELATORIO_LINK_VALIDADE_DIAS", 30))
+
+# Links de relatório assinados (HMAC) com a SECRET_KEY
+serializador_relatorio = URLSafeTimedSerializer(app.secret_key, salt='relatorio-pdf')
+
+def admin_autorizado():
+    """Requisição com o ADMIN_TOKEN (sem ADMIN_TOKEN configurado, nenhuma é autorizada)"""
+    if not ADMIN_TOKEN:
+        return False
+    if request.authorization and request.authorization.password:
+        fornecido = request.authorization.password
+    else:
+        cabecalho = request.headers.get('Authorization', '')
+        fornecido = cabecalho[7:] if cabecalho.startswith('Bearer ') else ''
+    return hmac.compare_digest(fornecido.encode(), ADMIN_TOKEN.encode())
+
+def admin_obrigatorio(rota):
+    """Exige o ADMIN_TOKEN antes de executar a rota"""
+    @wraps(rota)
+    def verificar(*args, **kwargs):
+        if not admin_autorizado():
+            logger.warning(f"Acesso administrativo negado a {request.path} ({request.remote_addr})")
+            return jsonify({'error': 'Não autorizado'}), 401, {'WWW-Authenticate': 'Basic realm="admin"'}
+        return rota(*args, **kwargs)
+    return verificar
+
 # Inicializar banco de dados
 init_database()
 
+# Remetente da outbox de e-mails (envio SMTP em segundo plano, com novas tentativas)
+iniciar_remetente()
+
+# Resumo periódico das avaliações para a equipe (substitui a cópia de cada relatório); a mesma
+# thread apaga os dados guardados para gerar o PDF quando os links do relatório já expiraram
+iniciar_resumo(RELATORIO_LINK_VALIDADE_DIAS)
+
+def buscar_pagamento_mp(payment_id):
+    """Consulta um pagamento na API do Mercado Pago (usada pelo resolvedor de webhooks)"""
+    return mp.payment().get(payment_id)
+
+# Resolvedor das notificações gravadas na inbox pelos webhooks
+iniciar_resolvedor(buscar_pagamento_mp)
+
+def criar_preferencia_mp(preference_data):
+    """Cria uma preferência na API do Mercado Pago (usada pelo pool de preferências)"""
+    return mp.preference().create(preference_data)
+
+# Pool de preferências criadas com antecedência para o /checkout
+iniciar_pool_preferencias(criar_preferencia_mp)
+
 # Configuração de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -65,188 +180,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Mapeamento das 50 competências individuais
-COMPETENCIAS_MAPEAMENTO = {
-    # Comunicação (c1)
-    'c1_q1': 'Escuta ativa e empática',
-    'c1_q2': 'Comunicação não-violenta',
-    'c1_q3': 'Curiosidade genuína',
-    'c1_q4': 'Adaptação da linguagem',
-    'c1_q5': 'Clareza na transmissão',
-    'c1_q6': 'Busca por feedback',
-    'c1_q7': 'Linguagem corporal adequada',
-    'c1_q8': 'Mediação de conflitos',
-    'c1_q9': 'Comunicação assertiva',
-    'c1_q10': 'Reconhecimento de sucessos',
-    
-    # Organização (c2)
-    'c2_q1': 'Planejamento antecipado',
-    'c2_q2': 'Uso de sistemas organizacionais',
-    'c2_q3': 'Organização do espaço',
-    'c2_q4': 'Acesso rápido à informação',
-    'c2_q5': 'Divisão de projetos',
-    'c2_q6': 'Cumprimento de prazos',
-    'c2_q7': 'Revisão de prioridades',
-    'c2_q8': 'Minimização de distrações',
-    'c2_q9': 'Preparação para compromissos',
-    'c2_q10': 'Delegação eficaz',
-    
-    # Proatividade (c3)
-    'c3_q1': 'Identificação antecipada',
-    'c3_q2': 'Iniciativa para soluções',
-    'c3_q3': 'Responsabilidade pessoal',
-    'c3_q4': 'Melhoria contínua',
-    'c3_q5': 'Oferta de ajuda',
-    'c3_q6': 'Atitude positiva',
-    'c3_q7': 'Autodesenvolvimento',
-    'c3_q8': 'Adaptabilidade',
-    'c3_q9': 'Transformação de ideias',
-    'c3_q10': 'Antecipação de necessidades',
-    
-    # Pensamento Crítico (c4)
-    'c4_q1': 'Questionamento de padrões',
-    'c4_q2': 'Busca por evidências',
-    'c4_q3': 'Reconhecimento de vieses',
-    'c4_q4': 'Flexibilidade mental',
-    'c4_q5': 'Análise de causas profundas',
-    'c4_q6': 'Diferenciação de raciocínios',
-    'c4_q7': 'Consideração de perspectivas',
-    'c4_q8': 'Pausas estratégicas',
-    'c4_q9': 'Avaliação de riscos',
-    'c4_q10': 'Aprendizado com erros',
-    
-    # Produtividade (c5)
-    'c5_q1': 'Foco em uma tarefa',
-    'c5_q2': 'Eliminação de desperdícios',
-    'c5_q3': 'Técnicas de gestão de tempo',
-    'c5_q4': 'Pausas regulares',
-    'c5_q5': 'Estabelecimento de metas',
-    'c5_q6': 'Uso de ferramentas',
-    'c5_q7': 'Equilíbrio vida-trabalho',
-    'c5_q8': 'Avaliação de desempenho',
-    'c5_q9': 'Autocuidado produtivo',
-    'c5_q10': 'Celebração de conquistas'
-}
-
-# Mapeamento de categorias
-CATEGORIAS_COMPETENCIAS = {
-    'c1': 'Comunicação',
-    'c2': 'Organização', 
-    'c3': 'Proatividade',
-    'c4': 'Pensamento Crítico',
-    'c5': 'Produtividade'
-}
-
-def calcular_competencias_individuais(respostas):
-    """Calcula pontuação de cada uma das 50 competências individuais"""
-    competencias_individuais = {}
-    
-    for key, value in respostas.items():
-        if key in COMPETENCIAS_MAPEAMENTO:
-            try:
-                valor = int(value)
-                competencias_individuais[key] = {
-                    'nome': COMPETENCIAS_MAPEAMENTO[key],
-                    'categoria': CATEGORIAS_COMPETENCIAS[key[:2]],
-                    'pontuacao': valor
-                }
-            except (ValueError, TypeError):
-                logger.warning(f"Valor inválido para {key}: {value}")
-                continue
-    
-    return competencias_individuais
-
-def gerar_ranking_50_competencias(competencias_individuais):
-    """Gera ranking das 50 competências ordenadas por pontuação"""
-    ranking = []
-    
-    for key, comp in competencias_individuais.items():
-        ranking.append({
-            'nome': comp['nome'],
-            'categoria': comp['categoria'],
-            'pontuacao': comp['pontuacao']
-        })
-    
-    # Ordenar por pontuação (decrescente) e depois por nome (alfabética)
-    ranking.sort(key=lambda x: (-x['pontuacao'], x['nome']))
-    
-    return ranking
-
-def calcular_competencias_principais(respostas):
-    """Calcula médias das 5 competências principais"""
-    competencias = {
-        'comunicacao': [],
-        'organizacao': [],
-        'proatividade': [],
-        'pensamento_critico': [],
-        'produtividade': []
-    }
-    
-    for key, value in respostas.items():
-        try:
-            valor = int(value)
-            if key.startswith('c1_'):  # Comunicação
-                competencias['comunicacao'].append(valor)
-            elif key.startswith('c2_'):  # Organização
-                competencias['organizacao'].append(valor)
-            elif key.startswith('c3_'):  # Proatividade
-                competencias['proatividade'].append(valor)
-            elif key.startswith('c4_'):  # Pensamento Crítico
-                competencias['pensamento_critico'].append(valor)
-            elif key.startswith('c5_'):  # Produtividade
-                competencias['produtividade'].append(valor)
-        except (ValueError, TypeError):
-            logger.warning(f"Valor inválido para {key}: {value}")
-            continue
-    
-    # Calcular médias
-    medias = {}
-    for comp, valores in competencias.items():
-        if valores:
-            medias[comp] = sum(valores) / len(valores)
-        else:
-            medias[comp] = 0
-    
-    return medias
-
-def gerar_ranking_principais(medias):
-    """Gera ranking das 5 competências principais"""
-    competencias_info = [
-        {'nome': 'Comunicação', 'emoji': '🟠', 'media': medias['comunicacao']},
-        {'nome': 'Organização', 'emoji': '🟡', 'media': medias['organizacao']},
-        {'nome': 'Proatividade', 'emoji': '🔵', 'media': medias['proatividade']},
-        {'nome': 'Pensamento Crítico', 'emoji': '🟣', 'media': medias['pensamento_critico']},
-        {'nome': 'Produtividade', 'emoji': '🟢', 'media': medias['produtividade']}
-    ]
-    
-    # Ordenar por média (decrescente)
-    competencias_ordenadas = sorted(competencias_info, key=lambda x: x['media'], reverse=True)
-    
-    return competencias_ordenadas
-
-def identificar_pontos_fortes_e_oportunidades(ranking_principais):
-    """Identifica os 3 pontos fortes e 3 oportunidades de desenvolvimento"""
-    pontos_fortes = ranking_principais[:3]  # Top 3
-    oportunidades = ranking_principais[-3:]  # Bottom 3 (invertido)
-    oportunidades.reverse()  # Para mostrar do menor para o maior
-    
-    return pontos_fortes, oportunidades
-
-def identificar_subcompetencias_destaque(ranking_50):
-    """Identifica as subcompetências mais fortes e a desenvolver"""
-    top_subcompetencias = ranking_50[:5]  # Top 5
-    bottom_subcompetencias = ranking_50[-5:]  # Bottom 5
-    bottom_subcompetencias.reverse()  # Para mostrar do menor para o maior
-    
-    return top_subcompetencias, bottom_subcompetencias
-
-def identificar_competencias_desenvolver(ranking_principais):
-    """Identifica as 3 competências com menores pontuações para desenvolvimento"""
-    # Pegar as 3 últimas (menores pontuações) e ordenar por pontuação crescente
-    competencias_desenvolver = ranking_principais[-3:]
-    competencias_desenvolver.reverse()  # Do menor para o maior
-    return competencias_desenvolver
-
 def mapear_nome_competencia_para_chave(nome_competencia):
     """Mapeia nome da competência para chave usada na tabela de referência"""
     mapeamento = {
@@ -258,17 +191,12 @@ def mapear_nome_competencia_para_chave(nome_competencia):
     }
     return mapeamento.get(nome_competencia, nome_competencia.lower())
 
-def gerar_plano_desenvolvimento(competencias_desenvolver, versao='gratuita'):
-    """Gera plano de desenvolvimento baseado nas competências a desenvolver"""
+def montar_plano_competencias(nomes_competencias):
+    """Monta o plano (ações dos graus 1, 2 e 3) para uma sequência de competências"""
     plano = []
     
-    # Para versão gratuita, retorna apenas preview
-    if versao == 'gratuita':
-        return plano
-    
-    # Para versão premium, gera plano completo
-    for comp in competencias_desenvolver:
-        chave_competencia = mapear_nome_competencia_para_chave(comp['nome'])
+    for nome in nomes_competencias:
+        chave_competencia = mapear_nome_competencia_para_chave(nome)
         
         if chave_competencia in COMPETENCIAS_ACOES:
             acoes_competencia = COMPETENCIAS_ACOES[chave_competencia]
@@ -279,13 +207,48 @@ def gerar_plano_desenvolvimento(competencias_desenvolver, versao='gratuita'):
                 if grau in acoes_competencia:
                     acoes_plano.extend(acoes_competencia[grau])
             
-            plano.append({
-                'nome': comp['nome'],
-                'acoes': acoes_plano
-            })
+            plano.append(MappingProxyType({
+                'nome': nome,
+                'acoes': tuple(acoes_plano)
+            }))
+    
+    return tuple(plano)
+
+# Nomes das 5 competências principais
+NOMES_COMPETENCIAS_PRINCIPAIS = tuple(nome for _, _, nome, _ in COMPETENCIAS_PRINCIPAIS)
+
+# Planos pré-calculados para as 60 ordenações possíveis das 3 competências a desenvolver
+PLANOS_DESENVOLVIMENTO = MappingProxyType({
+    ordem: montar_plano_competencias(ordem)
+    for ordem in itertools.permutations(NOMES_COMPETENCIAS_PRINCIPAIS, 3)
+})
+
+# Fragmentos HTML do plano premium, renderizados uma única vez para cada ordenação
+_template_plano = app.jinja_env.get_template('plano_desenvolvimento.html')
+PLANOS_DESENVOLVIMENTO_HTML = MappingProxyType({
+    ordem: Markup(_template_plano.render(plano_desenvolvimento=plano))
+    for ordem, plano in PLANOS_DESENVOLVIMENTO.items()
+})
+
+def gerar_plano_desenvolvimento(competencias_desenvolver, versao='gratuita'):
+    """Gera plano de desenvolvimento baseado nas competências a desenvolver"""
+    # Para versão gratuita, retorna apenas preview
+    if versao == 'gratuita':
+        return ()
+    
+    # Para versão premium, consulta a tabela pré-calculada
+    ordem = tuple(comp['nome'] for comp in competencias_desenvolver)
+    plano = PLANOS_DESENVOLVIMENTO.get(ordem)
+    if plano is None:
+        plano = montar_plano_competencias(ordem)
     
     return plano
 
+def obter_plano_desenvolvimento_html(competencias_desenvolver):
+    """Retorna o fragmento HTML pré-renderizado do plano premium (None se não houver)"""
+    ordem = tuple(comp['nome'] for comp in competencias_desenvolver)
+    return PLANOS_DESENVOLVIMENTO_HTML.get(ordem)
+
 def gerar_corpo_email(nome, pontuacao_geral):
     """Gera o corpo do email personalizado"""
     return f"""Olá {nome}!
@@ -310,41 +273,25 @@ Sucesso em sua jornada de desenvolvimento!
 Equipe Método Faça Bem  
 consultoria@openmanagement.com.br"""
 
-def enviar_email(nome, email_destino, pdf_path, pontuacao_geral):
-    """Envia email com relatório em anexo usando configurações SMTP Zoho (VERSÃO CORRIGIDA)"""
-    try:
-        # Configurações do SMTP Zoho Mail - Exatamente conforme especificado
-        smtp_server = os.getenv("MAIL_SERVER")
-        smtp_port   = int(os.getenv("MAIL_PORT", 465))
-        email_usuario = os.getenv("MAIL_USERNAME")
-        email_senha   = os.getenv("MAIL_PASSWORD")
-        email_interno = email_usuario
- 
-        logger.info(f"MAIL_SERVER: '{smtp_server}'")
-        logger.info(f"MAIL_PORT: '{smtp_port}'")
-        logger.info(f"MAIL_USERNAME: '{email_usuario}'")
-        logger.info(f"MAIL_PASSWORD: '{email_senha}'")
-
-        # Verificar se o arquivo PDF existe antes de prosseguir
-        if not pdf_path or not os.path.exists(pdf_path):
-            logger.error(f"Arquivo PDF não encontrado ao tentar enviar e-mail: {pdf_path}")
-            return False
-
-        # Criar mensagem
-        msg = MIMEMultipart()
-        msg['From'] = f"Método Faça Bem <{email_usuario}>"
-        msg['To'] = f"{email_destino},{email_interno}"
-        msg['Subject'] = "[Método Faça Bem] Seu Relatório de Competências (PDF)"
-
-        # Corpo do email conforme especificado
-        corpo_html = f"""
+def gerar_corpo_email_html(nome, pontuacao_geral, email_usuario, link_relatorio=None):
+    """Gera o corpo HTML do e-mail que acompanha o relatório (em anexo ou por link)"""
+    if link_relatorio:
+        validade = (datetime.now() + timedelta(days=RELATORIO_LINK_VALIDADE_DIAS)).strftime('%d/%m/%Y')
+        entrega = f"""<p>Seu relatório personalizado em PDF está disponível para download:</p>
+                <p><a href="{link_relatorio}" style="display: inline-block; padding: 10px 20px; background: #4CAF50; color: #fff; text-decoration: none; border-radius: 4px;">Baixar meu relatório</a></p>
+                <p style="color: #666; font-size: 13px;">O link é pessoal e válido até {validade}.</p>
+                <p>No relatório você encontrará:</p>"""
+    else:
+        entrega = "<p>Em anexo, você encontrará seu relatório personalizado em PDF com:</p>"
+    
+    return f"""
         <html>
         <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
             <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
                 <h2 style="color: #4CAF50;">Olá {nome}!</h2>
                 <p>Parabéns por completar sua autoavaliação de competências! 🎉</p>
                 <p><strong>Sua pontuação geral foi: {pontuacao_geral:.2f}/5.00</strong></p>
-                <p>Em anexo, você encontrará seu relatório personalizado em PDF com:</p>
+                {entrega}
                 <ul>
                     <li>✅ Análise detalhada de suas competências</li>
                     <li>✅ Gráficos visuais dos resultados</li>
@@ -363,48 +310,264 @@ def enviar_email(nome, email_destino, pdf_path, pontuacao_geral):
         </body>
         </html>
         """
-        # --- Ajuste de encoding UTF-8 para evitar erros com acentos ---
-        html_part = MIMEText(corpo_html, 'html', 'utf-8')
-        html_part.replace_header('Content-Type', 'text/html; charset="utf-8"')
-        msg.attach(html_part)
-
-        # Anexar PDF
-        with open(pdf_path, "rb") as attachment:
-            part = MIMEBase('application', 'octet-stream')
-            part.set_payload(attachment.read())
-        encoders.encode_base64(part)
-        part.add_header(
-            'Content-Disposition',
-            f'attachment; filename="Relatorio_Competencias_{nome.replace(" ", "_")}.pdf"'
+
+def enviar_email(nome, email_destino, pdf_bytes, pontuacao_geral, link_relatorio=None):
+    """Coloca o e-mail com o relatório (em anexo ou por link) na outbox; o envio SMTP acontece em segundo plano
+    
+    Retorna o id do e-mail na outbox (None se não foi possível enfileirar).
+    """
+    try:
+        # Verificar se o PDF foi gerado antes de prosseguir
+        if not pdf_bytes and not link_relatorio:
+            logger.error("PDF vazio ao tentar enviar e-mail")
+            return None
+        
+        return enfileirar_email(
+            email_destino,
+            "[Método Faça Bem] Seu Relatório de Competências (PDF)",
+            gerar_corpo_email_html(nome, pontuacao_geral, os.getenv("MAIL_USERNAME"), link_relatorio),
+            None if link_relatorio else pdf_bytes,
+            None if link_relatorio else f'Relatorio_Competencias_{nome.replace(" ", "_")}.pdf'
         )
-        msg.attach(part)
-
-        # --- INÍCIO DA CORREÇÃO ---
-        # Se for porta 465, use SSL. Se não, use STARTTLS.
-        if smtp_port == 465:
-            with smtplib.SMTP_SSL(smtp_server, smtp_port) as server:
-                logger.info(f"Conectado ao servidor SMTP (SSL): {smtp_server}")
-                server.login(email_usuario, email_senha)
-                server.send_message(msg)
-                logger.info(f"E-mail enviado com sucesso para: {email_destino} (cópia para: {email_interno})")
-        else:
-            with smtplib.SMTP(smtp_server, smtp_port) as server:
-                logger.info(f"Conectado ao servidor SMTP (STARTTLS): {smtp_server}")
-                server.ehlo()
-                server.starttls()
-                server.login(email_usuario, email_senha)
-                server.send_message(msg)
-                logger.info(f"E-mail enviado com sucesso para: {email_destino} (cópia para: {email_interno})")
-        # --- FIM DA CORREÇÃO ---
-        
-        return True
-
-    except smtplib.SMTPAuthenticationError as e:
-        logger.error(f"ERRO DE AUTENTICAÇÃO SMTP: {e}. Verifique usuário/senha e se a 'senha de aplicativo' é necessária.")
-        return False
+        
     except Exception as e:
-        logger.error(f"Erro geral ao enviar email: {e}", exc_info=True)
-        return False
+        logger.error(f"Erro ao enfileirar email: {e}", exc_info=True)
+        return None
+
+# Opções para geração do PDF otimizadas para evitar timeout
+PDF_OPTIONS = {
+    'page-size': 'A4',
+    'margin-top': '0.75in',
+    'margin-right': '0.75in',
+    'margin-bottom': '0.75in',
+    'margin-left': '0.75in',
+    'encoding': "UTF-8",
+    'no-outline': None,
+    'enable-local-file-access': None,
+    'disable-smart-shrinking': '',
+    'print-media-type': '',
+    'images': '',
+    'zoom': '1.0',
+    'dpi': '150',  # Reduzido para melhor performance
+    'image-dpi': '150',  # Reduzido para melhor performance
+    'image-quality': '80',  # Reduzido para melhor performance
+    'footer-line': '',
+    'quiet': '',
+    'load-error-handling': 'ignore',
+    'load-media-error-handling': 'ignore',
+    'disable-plugins': '',
+    'minimum-font-size': '12',
+    'background': '',
+    'lowquality': False,
+    'grayscale': False,
+    'orientation': 'Portrait',
+    'disable-external-links': '',  # Evitar carregamento de recursos externos
+    'disable-forms': '',  # Desabilitar formulários para melhor performance
+    'disable-javascript': '',  # Desabilitar JS para evitar timeout
+    'no-stop-slow-scripts': ''  # Não parar scripts lentos
+}
+
+# Imagens referenciadas pelo template do relatório (relativas a static/)
+ASSETS_PDF = ('img/logo_nova_semfundo.png', 'img/favicon.ico')
+
+def carregar_assets_relatorio():
+    """Lê as imagens do relatório (ASSETS_PDF) uma única vez e monta data URIs para o PDF"""
+    assets = {}
+    
+    for arquivo in ASSETS_PDF:
+        mime_type, _ = mimetypes.guess_type(arquivo)
+        with open(os.path.join(app.static_folder, arquivo), 'rb') as f:
+            conteudo = base64.b64encode(f.read()).decode('ascii')
+        assets[f"{app.static_url_path}/{arquivo}"] = f"data:{mime_type};base64,{conteudo}"
+    
+    logger.info(f"Assets do relatório carregados em memória: {len(assets)} imagens")
+    return assets
+
+# Cache em memória das imagens usadas no relatório (caminho /static/... -> data URI)
+ASSETS_RELATORIO = carregar_assets_relatorio()
+
+def resolver_asset_pdf(caminho):
+    """Resolve um caminho local para data URI (cache) ou file:// — nunca para HTTP do próprio app"""
+    if caminho in ASSETS_RELATORIO:
+        return ASSETS_RELATORIO[caminho]
+    
+    prefixo_static = f"{app.static_url_path}/"
+    if caminho.startswith(prefixo_static):
+        arquivo = os.path.join(app.static_folder, caminho[len(prefixo_static):])
+        return f"file://{arquivo}"
+    
+    return caminho
+
+# Passada única sobre o HTML do PDF: resolve os src="/..." para os assets locais
+# (a versão impressa do template não tem scripts nem folhas de estilo externas)
+_RE_ASSET_PDF = re.compile(r'src="(/[^"]*)"')
+
+def _substituir_asset_pdf(match):
+    return f'src="{resolver_asset_pdf(match.group(1))}"'
+
+def preparar_html_pdf(html):
+    """Resolve os assets do HTML da versão impressa em uma única passada"""
+    return _RE_ASSET_PDF.sub(_substituir_asset_pdf, html)
+
+def calcular_versao_conteudo_pdf():
+    """Versão do conteúdo do PDF: templates, catálogo de ações, imagens e opções do wkhtmltopdf"""
+    templates = []
+    for nome_template in ('relatorio_template.html', 'plano_desenvolvimento.html'):
+        with open(os.path.join(app.root_path, app.template_folder, nome_template), 'rb') as f:
+            templates.append(f.read())
+    
+    return calcular_versao_conteudo(
+        *templates,
+        json.dumps(COMPETENCIAS_ACOES, sort_keys=True, ensure_ascii=False),
+        json.dumps(ASSETS_RELATORIO, sort_keys=True),
+        json.dumps(PDF_OPTIONS, sort_keys=True)
+    )
+
+# Entra na chave do cache de PDFs: mudar template/catálogo invalida os PDFs anteriores
+VERSAO_CONTEUDO_PDF = calcular_versao_conteudo_pdf()
+
+# Gravar cópia dos PDFs em static/reports (desligado por padrão: o PDF circula só em memória)
+RELATORIOS_SALVAR_DISCO = os.getenv("RELATORIOS_SALVAR_DISCO", "false").lower() in ("1", "true", "sim")
+
+def salvar_pdf_relatorio(nome, pdf_bytes):
+    """Grava o PDF em static/reports e retorna o caminho do arquivo"""
+    # Criar nome do arquivo PDF
+    nome_arquivo = nome.replace(' ', '_').replace('/', '_').replace('\\', '_')
+    pdf_filename = f"relatorio_{nome_arquivo}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    
+    # Garantir que o diretório static/reports existe
+    reports_dir = os.path.join(app.static_folder, 'reports')
+    os.makedirs(reports_dir, exist_ok=True)
+    
+    pdf_path = os.path.join(reports_dir, pdf_filename)
+    with open(pdf_path, 'wb') as f:
+        f.write(pdf_bytes)
+    logger.info(f"PDF salvo em disco: {pdf_path}")
+    
+    return pdf_path
+
+def gerar_pdf_relatorio(nome, html_pdf, chave_cache=None):
+    """Gera o PDF a partir do HTML da versão impressa (modo_pdf) e retorna seus bytes
+    
+    html_pdf pode ser uma função que renderiza o HTML: ela só é chamada se o PDF não estiver no cache.
+    """
+    # Reaproveitar PDF idêntico já gerado (reenvios, cliques duplos, mesmas respostas)
+    if chave_cache:
+        pdf_bytes = get_pdf(chave_cache)
+        if pdf_bytes:
+            logger.info(f"PDF obtido do cache para {nome} ({len(pdf_bytes)} bytes)")
+            if RELATORIOS_SALVAR_DISCO:
+                salvar_pdf_relatorio(nome, pdf_bytes)
+            return pdf_bytes
+    
+    if callable(html_pdf):
+        html_pdf = html_pdf()
+    
+    # Gerar PDF com renderizações simultâneas limitadas, com as imagens embutidas no próprio HTML
+    pdf_bytes = renderizar_pdf(preparar_html_pdf(html_pdf), PDF_OPTIONS)
+    
+    # Verificar se o PDF tem tamanho válido
+    if not pdf_bytes:
+        raise Exception("PDF não foi gerado ou está vazio")
+    
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    logger.info(f"[{timestamp}] PDF gerado com sucesso para {nome} ({len(pdf_bytes)} bytes)")
+    logger.info(f"[{timestamp}] PDF de Diagnóstico formatado conforme HTML — OK")
+    
+    if chave_cache:
+        put_pdf(chave_cache, pdf_bytes)
+    
+    if RELATORIOS_SALVAR_DISCO:
+        salvar_pdf_relatorio(nome, pdf_bytes)
+    
+    return pdf_bytes
+
+def montar_dados_relatorio(nome, email, celular, respostas, versao, data_avaliacao=None):
+    """Pontua as respostas e monta os dados usados pelo template do relatório"""
+    # Pontuar as respostas (50 competências, 5 médias, rankings e destaques) em uma única passada
+    resultado = calcular_resultado_avaliacao(respostas)
+    competencias_desenvolver = resultado.competencias_desenvolver
+    
+    # Gerar plano de desenvolvimento
+    plano_desenvolvimento = gerar_plano_desenvolvimento(competencias_desenvolver, versao)
+    
+    return {
+        'nome': nome,
+        'email': email,
+        'celular': celular,
+        'data_avaliacao': data_avaliacao or datetime.now().strftime('%d/%m/%Y'),
+        'pontuacao_geral': resultado.pontuacao_geral,
+        'ranking_50_competencias': resultado.ranking_50_competencias,
+        'medias': resultado.ranking_principais,
+        'pontos_fortes': resultado.pontos_fortes,
+        'oportunidades': resultado.oportunidades,
+        'top_subcompetencias': resultado.top_subcompetencias,
+        'bottom_subcompetencias': resultado.bottom_subcompetencias,
+        'competencias_desenvolver': competencias_desenvolver,
+        'plano_desenvolvimento': plano_desenvolvimento,
+        'plano_desenvolvimento_html': obter_plano_desenvolvimento_html(competencias_desenvolver) if versao == 'premium' else None,
+        'versao': versao
+    }
+
+def calcular_chave_pdf(respostas, dados_template):
+    """Chave do cache de PDFs: tudo que aparece no relatório + versão do conteúdo"""
+    dados_pessoais = {campo: dados_template[campo] for campo in ('nome', 'email', 'celular', 'data_avaliacao')}
+    return calcular_chave(respostas, dados_pessoais, dados_template['versao'], VERSAO_CONTEUDO_PDF)
+
+def montar_dados_renderizacao(respostas, dados_template):
+    """Entradas para gerar o PDF de novo (guardadas em assessments.report_data, fora do link)"""
+    return {
+        'nome': dados_template['nome'],
+        'email': dados_template['email'],
+        'celular': dados_template['celular'],
+        'versao': dados_template['versao'],
+        'data_avaliacao': dados_template['data_avaliacao'],
+        'respostas': [respostas.get(chave, '') for chave in CHAVES_RESPOSTAS]
+    }
+
+def renderizar_relatorio_salvo(dados, chave_pdf):
+    """Gera (e grava no cache) o PDF a partir dos dados guardados da avaliação"""
+    respostas = {chave: valor for chave, valor in zip(CHAVES_RESPOSTAS, dados['respostas']) if valor != ''}
+    dados_template = montar_dados_relatorio(
+        dados['nome'], dados['email'], dados['celular'], respostas, dados['versao'], dados['data_avaliacao']
+    )
+    html_pdf = render_template('relatorio_template.html', modo_pdf=True, **dados_template)
+    return gerar_pdf_relatorio(dados['nome'], html_pdf, chave_pdf)
+
+def gerar_link_relatorio(chave_pdf):
+    """Link assinado e com validade para /relatorio/<token>
+    
+    O token carrega só a chave do PDF; as respostas e os dados pessoais ficam no servidor
+    (assessments.report_data) para gerar o PDF no primeiro clique se não estiver no cache.
+    """
+    token = serializador_relatorio.dumps({'k': chave_pdf})
+    return f"{obter_url_base()}{url_for('relatorio_pdf', token=token)}"
+
+def pre_renderizar_relatorio(job_id, nome, html_pdf, chave_pdf):
+    """Job de segundo plano da entrega por link: deixa o PDF no cache antes do primeiro clique"""
+    update_job(job_id, etapa='gerando_pdf')
+    gerar_pdf_relatorio(nome, html_pdf, chave_pdf)
+    return {'pdf_gerado': True}
+
+def processar_relatorio(job_id, nome, email, html_pdf, pontuacao_geral, chave_pdf=None):
+    """Job de segundo plano: gera o PDF e envia o e-mail, reportando o progresso"""
+    update_job(job_id, etapa='gerando_pdf')
+    pdf_bytes = gerar_pdf_relatorio(nome, html_pdf, chave_pdf)
+    
+    update_job(job_id, etapa='enfileirando_email')
+    email_id = enviar_email(nome, email, pdf_bytes, pontuacao_geral)
+    if email_id is None:
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        logger.warning(f"[{timestamp}] Falha ao enfileirar email para {email}")
+    
+    return {'email_enfileirado': email_id is not None, 'email_id': email_id}
+
+def obter_url_base():
+    """URL base da requisição atual, forçando HTTPS"""
+    base_url = request.url_root.rstrip('/')
+    if base_url.startswith('http://' ):
+        base_url = base_url.replace('http://', 'https://' )
+    return base_url
 
 @app.route('/')
 def index():
@@ -414,39 +577,16 @@ def index():
 def checkout():
     """Cria preferência de pagamento no Mercado Pago"""
     try:
-        # Obter URL base dinamicamente
         # Obter URL base dinamicamente e forçar HTTPS
-        base_url = request.url_root.rstrip('/')
-        if base_url.startswith('http://' ):
-            base_url = base_url.replace('http://', 'https://' )
-
-        
-        # Dados do produto Premium
-        preference_data = {
-            "items": [
-                {
-                    "title": "Avaliação de Competências - Versão Premium",
-                    "quantity": 1,
-                    "unit_price": 29.90,
-                    "currency_id": "BRL"
-                }
-            ],
-            'back_urls': {
-                'success': f'{base_url}/pagamento_sucesso',
-                'failure': f'{base_url}/pagamento_falha',
-                'pending': f'{base_url}/pagamento_pendente',
-            },
-            "external_reference": f"premium_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        }
-        
-        # Criar preferência
-        logger.info(f"Criando preferência MP com dados: {preference_data}")
-        preference_response = mp.preference().create(preference_data)
-        
-        if preference_response["status"] == 201:
-            preference = preference_response["response"]
-            logger.info(f"Preferência criada com sucesso: {preference['id']}")
-            
+        base_url = obter_url_base()
+        
+        # Preferência já criada pelo pool; se estiver vazio, criar agora
+        preference = retirar_preferencia(base_url)
+        if preference is None:
+            with prazo_chamada(MP_PRAZO_CHECKOUT):
+                preference = criar_preferencia(base_url)
+        
+        if preference:
             # Retornar JSON para o frontend em vez de redirect
             return jsonify({
                 "success": True,
@@ -454,12 +594,22 @@ def checkout():
                 "preference_id": preference["id"]
             })
         else:
-            logger.error(f"Erro ao criar preferência MP: {preference_response}")
             return jsonify({
                 "success": False,
                 "error": "Erro ao criar preferência de pagamento"
             }), 500
 
+    except (CircuitoAberto, requests.ConnectionError, requests.Timeout) as e:
+        # Mercado Pago fora do ar ou sem resposta no prazo; com o circuito aberto, a recusa é
+        # imediata e o worker não fica preso esperando a API
+        logger.warning(f"Checkout indisponível: {e}")
+        segundos = max(math.ceil(e.segundos), 1) if isinstance(e, CircuitoAberto) else 5
+        return jsonify({
+            "success": False,
+            "error": "Pagamento temporariamente indisponível. Tente novamente em instantes.",
+            "retry_after": segundos
+        }), 503, {'Retry-After': str(segundos)}
+
     except Exception as e:
         logger.error(f"Erro no checkout: {e}")
         return jsonify({
@@ -471,49 +621,7 @@ def checkout():
 def mp_webhook():
     """Webhook para receber notificações do Mercado Pago"""
     try:
-        data = request.get_json()
-        logger.info(f"Webhook MP recebido: {data}")
-        
-        if data and data.get('type') == 'payment':
-            payment_id = data['data']['id']
-            
-            # Buscar informações do pagamento
-            payment_info = mp.payment().get(payment_id)
-            
-            if payment_info["status"] == 200:
-                payment = payment_info["response"]
-                
-                logger.info(f"Webhook MP - Payment ID: {payment_id}, Status: {payment.get('status')}, External Ref: {payment.get('external_reference')}")
-                
-                # Salvar transação no banco de dados
-                save_success = save_transaction(payment, data)
-                if save_success:
-                    logger.info(f"Transação salva no banco: {payment_id}")
-                else:
-                    logger.error(f"Erro ao salvar transação: {payment_id}")
-                
-                # Verificar se pagamento foi aprovado
-                if payment.get('status') == 'approved':
-                    external_reference = payment.get('external_reference', '')
-                    
-                    # Marcar como premium no banco de dados (mais confiável que sessão)
-                    # Para este projeto, vamos usar a sessão mas com melhor controle
-                    session[f'premium_paid_{external_reference}'] = True
-                    session['premium_user'] = True
-                    session['payment_id'] = payment_id
-                    session['external_reference'] = external_reference
-                    
-                    logger.info(f"✅ Pagamento APROVADO - Ref: {external_reference}, Payment ID: {payment_id}")
-                    
-                    return jsonify({'status': 'success', 'message': 'Payment approved'}), 200
-                else:
-                    logger.warning(f"❌ Pagamento NÃO aprovado - Status: {payment.get('status')}")
-                    return jsonify({'status': 'payment_not_approved', 'payment_status': payment.get('status')}), 200
-            else:
-                logger.error(f"Erro ao buscar informações do pagamento: {payment_info}")
-                return jsonify({'status': 'error', 'message': 'Failed to get payment info'}), 400
-                
-        return jsonify({'status': 'ignored', 'message': 'Not a payment notification'}), 200
+        return receber_webhook('/mp/webhook')
         
     except Exception as e:
         logger.error(f"Erro no webhook MP: {e}")
@@ -594,157 +702,75 @@ def submit_avaliacao():
         logger.info(f"Processando avaliação para {nome} ({email})")
         logger.info(f"Respostas recebidas: {len(respostas)} itens")
         
-        # Calcular competências individuais (50 competências)
-        competencias_individuais = calcular_competencias_individuais(respostas)
-        ranking_50_competencias = gerar_ranking_50_competencias(competencias_individuais)
-        
-        # Calcular competências principais (5 grupos)
-        medias_principais = calcular_competencias_principais(respostas)
-        ranking_principais = gerar_ranking_principais(medias_principais)
-        
-        # Calcular pontuação geral
-        pontuacao_geral = sum(medias_principais.values()) / len(medias_principais)
-        
-        # Identificar pontos fortes e oportunidades
-        pontos_fortes, oportunidades = identificar_pontos_fortes_e_oportunidades(ranking_principais)
-        top_subcompetencias, bottom_subcompetencias = identificar_subcompetencias_destaque(ranking_50_competencias)
-        
-        # Identificar competências a desenvolver (3 piores)
-        competencias_desenvolver = identificar_competencias_desenvolver(ranking_principais)
-        
         # Determinar versão baseada na escolha do usuário
         versao = tipo_experiencia if tipo_experiencia in ['gratuita', 'premium'] else 'gratuita'
         
-        # Gerar plano de desenvolvimento
-        plano_desenvolvimento = gerar_plano_desenvolvimento(competencias_desenvolver, versao)
-        
-        # Preparar dados para o template
-        data_avaliacao = datetime.now().strftime('%d/%m/%Y')
-        
-        dados_template = {
-            'nome': nome,
-            'email': email,
-            'celular': celular,
-            'data_avaliacao': data_avaliacao,
-            'pontuacao_geral': pontuacao_geral,
-            'ranking_50_competencias': ranking_50_competencias,
-            'medias': ranking_principais,
-            'pontos_fortes': pontos_fortes,
-            'oportunidades': oportunidades,
-            'top_subcompetencias': top_subcompetencias,
-            'bottom_subcompetencias': bottom_subcompetencias,
-            'competencias_desenvolver': competencias_desenvolver,
-            'plano_desenvolvimento': plano_desenvolvimento,
-            'versao': versao
-        }
+        # Pontuar as respostas e preparar dados para o template
+        dados_template = montar_dados_relatorio(nome, email, celular, respostas, versao)
+        pontuacao_geral = dados_template['pontuacao_geral']
         
         # Gerar HTML do relatório
         html_relatorio = render_template('relatorio_template.html', **dados_template)
         
-        # Substituir URLs relativos por caminhos absolutos para o PDF
-        import re
-        base_url = request.url_root
-        html_relatorio = re.sub(
-            r'src="([^"]*)"',
-            lambda m: f'src="{base_url.rstrip("/")}{m.group(1)}"' if m.group(1).startswith('/') else m.group(0),
-            html_relatorio
+        # Versão impressa (sem favicon, com estilos de impressão) usada só no PDF: renderizada
+        # apenas quando o PDF for gerado de fato
+        def renderizar_html_pdf():
+            return render_template('relatorio_template.html', modo_pdf=True, **dados_template)
+        
+        # Chave do cache de PDFs: tudo que aparece no relatório + versão do conteúdo
+        chave_pdf = calcular_chave_pdf(respostas, dados_template)
+        
+        # Registrar a avaliação para o resumo periódico da equipe
+        save_assessment(
+            nome, email, pontuacao_geral, versao, chave_pdf,
+            f"{obter_url_base()}{url_for('admin_relatorio_pdf', chave=chave_pdf)}",
+            montar_dados_renderizacao(respostas, dados_template)
         )
         
-        # Simplificar HTML para PDF - remover scripts e elementos que podem causar timeout
-        html_relatorio = re.sub(r'<script[^>]*>.*?</script>', '', html_relatorio, flags=re.DOTALL)
-        html_relatorio = re.sub(r'<link[^>]*rel=["\']stylesheet["\'][^>]*>', '', html_relatorio)
-        html_relatorio = re.sub(r'@import[^;]*;', '', html_relatorio)
-        
-        # Adicionar estilos inline básicos para manter formatação
-        html_relatorio = html_relatorio.replace('<head>', '''<head>
-        <style>
-        body { font-family: Arial, sans-serif; margin: 20px; }
-        .container { max-width: 800px; margin: 0 auto; }
-        .header { text-align: center; margin-bottom: 30px; }
-        .section { margin-bottom: 20px; }
-        .competencia { margin-bottom: 15px; padding: 10px; border: 1px solid #ddd; }
-        .score { font-weight: bold; color: #2c5aa0; }
-        .chart { margin: 20px 0; }
-        </style>''')
-        
-        
-        # Gerar PDF e salvar em pasta acessível
-        pdf_path = None
-        try:
-            # Criar nome do arquivo PDF
-            nome_arquivo = nome.replace(' ', '_').replace('/', '_').replace('\\', '_')
-            pdf_filename = f"relatorio_{nome_arquivo}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-            
-            # Garantir que o diretório static/reports existe
-            reports_dir = os.path.join(app.static_folder, 'reports')
-            os.makedirs(reports_dir, exist_ok=True)
-            
-            pdf_path = os.path.join(reports_dir, pdf_filename)
-            
-            # Opções para geração do PDF otimizadas para evitar timeout
-            options = {
-                'page-size': 'A4',
-                'margin-top': '0.75in',
-                'margin-right': '0.75in',
-                'margin-bottom': '0.75in',
-                'margin-left': '0.75in',
-                'encoding': "UTF-8",
-                'no-outline': None,
-                'enable-local-file-access': None,
-                'disable-smart-shrinking': '',
-                'print-media-type': '',
-                'images': '',
-                'zoom': '1.0',
-                'dpi': '150',  # Reduzido para melhor performance
-                'image-dpi': '150',  # Reduzido para melhor performance
-                'image-quality': '80',  # Reduzido para melhor performance
-                'footer-line': '',
-                'quiet': '',
-                'load-error-handling': 'ignore',
-                'load-media-error-handling': 'ignore',
-                'disable-plugins': '',
-                'minimum-font-size': '12',
-                'background': '',
-                'lowquality': False,
-                'grayscale': False,
-                'orientation': 'Portrait',
-                'disable-external-links': '',  # Evitar carregamento de recursos externos
-                'disable-forms': '',  # Desabilitar formulários para melhor performance
-                'disable-javascript': '',  # Desabilitar JS para evitar timeout
-                'no-stop-slow-scripts': ''  # Não parar scripts lentos
-            }
-            
-            # Gerar PDF com tratamento de exceções robusto
-            pdfkit.from_string(html_relatorio, pdf_path, options=options)
-            logger.info(f"PDF gerado: {pdf_path}")
-            
-            # Verificar se o arquivo foi criado e tem tamanho válido
-            if os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0:
+        # Entrega por link: o e-mail sai imediatamente; o PDF é gerado em segundo plano ou no primeiro clique
+        if ENTREGA_RELATORIO.get(versao) == 'link':
+            link_relatorio = gerar_link_relatorio(chave_pdf)
+            if enviar_email(nome, email, None, pontuacao_geral, link_relatorio) is None:
                 timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                logger.info(f"[{timestamp}] PDF gerado com sucesso: {pdf_path} ({os.path.getsize(pdf_path)} bytes)")
-                logger.info(f"[{timestamp}] PDF de Diagnóstico formatado conforme HTML — OK")
-            else:
-                raise Exception("Arquivo PDF não foi criado ou está vazio")
-                
+                logger.warning(f"[{timestamp}] Falha ao enfileirar email para {email}")
+            if not contem_pdf(chave_pdf):
+                submit_job(pre_renderizar_relatorio, nome, renderizar_html_pdf(), chave_pdf)
+            return jsonify({
+                'success': True,
+                'message': f'Avaliação processada com sucesso! Pontuação: {pontuacao_geral:.2f}/5.00',
+                'html_content': html_relatorio,
+                'pontuacao_geral': pontuacao_geral,
+                'relatorio_url': link_relatorio
+            })
+        
+        # Modo assíncrono: PDF e e-mail vão para o pool de segundo plano
+        if SUBMIT_ASSINCRONO:
+            job_id = submit_job(processar_relatorio, nome, email, renderizar_html_pdf(), pontuacao_geral, chave_pdf)
+            return jsonify({
+                'success': True,
+                'message': f'Avaliação processada com sucesso! Pontuação: {pontuacao_geral:.2f}/5.00',
+                'html_content': html_relatorio,
+                'pontuacao_geral': pontuacao_geral,
+                'job_id': job_id,
+                'status_url': url_for('job_status', job_id=job_id)
+            }), 202
+        
+        # Gerar PDF em memória
+        try:
+            pdf_bytes = gerar_pdf_relatorio(nome, renderizar_html_pdf, chave_pdf)
         except Exception as e:
             logger.error("Erro PDF/e-mail", exc_info=True)
             return jsonify({"error": "Erro interno ao gerar PDF ou enviar e-mail"}), 500
         
-        # Tentar enviar email apenas se PDF foi gerado com sucesso
-        if pdf_path and os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0:
-            try:
-                envio_sucesso = enviar_email(nome, email, pdf_path, pontuacao_geral)
-                if envio_sucesso:
-                    logger.info(f"E-mail enviado: {email}")
-                else:
-                    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    logger.warning(f"[{timestamp}] Falha no envio de email para {email}")
-            except Exception as e:
-                logger.error("Erro PDF/e-mail", exc_info=True)
-                return jsonify({"error": "Erro interno ao gerar PDF ou enviar e-mail"}), 500
-        else:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            logger.error(f"[{timestamp}] Não foi possível enviar email - PDF não gerado ou inválido")
+        # Enfileirar o email apenas se PDF foi gerado com sucesso (o envio é feito pelo remetente da outbox)
+        try:
+            email_id = enviar_email(nome, email, pdf_bytes, pontuacao_geral)
+            if email_id is None:
+                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                logger.warning(f"[{timestamp}] Falha ao enfileirar email para {email}")
+        except Exception as e:
+            logger.error("Erro PDF/e-mail", exc_info=True)
+            return jsonify({"error": "Erro interno ao gerar PDF ou enviar e-mail"}), 500
         
         # Retornar resposta JSON com HTML do relatório
         return jsonify({
@@ -761,6 +787,65 @@ def submit_avaliacao():
             'message': 'Erro interno do servidor'
         }), 500
 
+@app.route('/relatorio/<token>')
+def relatorio_pdf(token):
+    """Download do relatório por link assinado (ETag, Last-Modified, GET condicional e Range)"""
+    try:
+        dados_token = serializador_relatorio.loads(token, max_age=RELATORIO_LINK_VALIDADE_DIAS * 86400)
+    except SignatureExpired:
+        return jsonify({'error': 'Link expirado. Refaça a avaliação para receber um novo relatório.'}), 410
+    except BadSignature:
+        return jsonify({'error': 'Relatório não encontrado'}), 404
+    
+    try:
+        chave_pdf = dados_token['k']
+        dados = get_assessment_report(chave_pdf)
+        
+        nome_arquivo = 'Relatorio_Competencias.pdf'
+        if dados:
+            nome_arquivo = f'Relatorio_Competencias_{dados["nome"].replace(" ", "_")}.pdf'
+        
+        caminho = caminho_pdf(chave_pdf)
+        if caminho is None:
+            if dados is None:
+                return jsonify({'error': 'Relatório não encontrado'}), 404
+            
+            # PDF ainda não gerado (ou removido do cache): gerar agora a partir dos dados guardados
+            pdf_bytes = renderizar_relatorio_salvo(dados, chave_pdf)
+            
+            caminho = caminho_pdf(chave_pdf)
+            if caminho is None:
+                # Cache indisponível: entregar da memória, sem suporte a Range
+                return Response(pdf_bytes, mimetype='application/pdf',
+                                headers={'Content-Disposition': f'inline; filename="{nome_arquivo}"'})
+        
+        # O conteúdo é endereçado pela chave: ela serve de ETag; Last-Modified é o mtime do PDF no cache
+        resposta = send_file(
+            caminho,
+            mimetype='application/pdf',
+            download_name=nome_arquivo,
+            conditional=True,
+            etag=chave_pdf,
+            max_age=3600
+        )
+        resposta.cache_control.public = False
+        resposta.cache_control.private = True
+        return resposta
+        
+    except Exception as e:
+        logger.error(f"Erro ao entregar relatório por link: {e}", exc_info=True)
+        return jsonify({'error': 'Erro interno ao gerar o relatório'}), 500
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Consulta o progresso de um job de geração de PDF/envio de e-mail"""
+    job = get_job(job_id)
+    
+    if job:
+        return jsonify({'job': job})
+    else:
+        return jsonify({'error': 'Job não encontrado'}), 404
+
 if __name__ == '__main__':
     import os
     port = int(os.environ.get("PORT", 9000))
@@ -806,25 +891,51 @@ def process_payment_return():
 
 @app.route("/webhook_mercadopago", methods=["POST"])
 def webhook_mercadopago():
-    data = request.json
-    logger.info(f"Webhook Mercado Pago recebido: {data}")
-    # Aqui você pode processar o webhook para atualizar o status do pagamento no seu banco de dados, se houver.
-    # Por exemplo, verificar o 'type' e 'data.id' para obter detalhes da notificação.
-    # Para este exercício, apenas logamos a informação.
-    return jsonify({"status": "ok"}), 200
+    """Webhook do Mercado Pago (URL configurada no painel)"""
+    return receber_webhook('/webhook_mercadopago')
 
 
 
 # Rotas de administração para visualizar transações
+def codificar_cursor(transacao):
+    """Cursor opaco da paginação por chave: (created_at, id) da última transação da página"""
+    return base64.urlsafe_b64encode(json.dumps([transacao['created_at'], transacao['id']]).encode()).decode()
+
+def decodificar_cursor(cursor):
+    """Inverso de codificar_cursor; ValueError se o cursor for inválido"""
+    try:
+        created_at, transacao_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(created_at), int(transacao_id)
+    except Exception:
+        raise ValueError('cursor inválido')
+
+def proximo_cursor(transactions, limit):
+    """Cursor da próxima página (None na última)"""
+    return codificar_cursor(transactions[-1]) if transactions and len(transactions) == limit else None
+
 @app.route('/admin/transactions')
 def admin_transactions():
-    """Lista todas as transações (para administração)"""
+    """Lista todas as transações (para administração)
+    
+    Paginação por chave com ?cursor=<next_cursor da página anterior>; ?page= continua aceito.
+    """
     try:
-        page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 50))
-        offset = (page - 1) * limit
+        cursor = request.args.get('cursor')
+        
+        if cursor:
+            try:
+                antes = decodificar_cursor(cursor)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            page = None
+            offset = None
+            transactions = get_all_transactions(limit=limit, before=antes)
+        else:
+            page = int(request.args.get('page', 1))
+            offset = (page - 1) * limit
+            transactions = get_all_transactions(limit=limit, offset=offset)
         
-        transactions = get_all_transactions(limit=limit, offset=offset)
         stats = get_transaction_stats()
         
         return jsonify({
@@ -833,7 +944,9 @@ def admin_transactions():
             'pagination': {
                 'page': page,
                 'limit': limit,
-                'offset': offset
+                'offset': offset,
+                'cursor': cursor,
+                'next_cursor': proximo_cursor(transactions, limit)
             }
         })
         
@@ -858,15 +971,25 @@ def admin_transaction_detail(payment_id):
 
 @app.route('/admin/transactions/status/<status>')
 def admin_transactions_by_status(status):
-    """Lista transações por status"""
+    """Lista transações por status (paginação por chave com ?cursor=<next_cursor>)"""
     try:
         limit = int(request.args.get('limit', 100))
-        transactions = get_transactions_by_status(status, limit=limit)
+        cursor = request.args.get('cursor')
+        
+        antes = None
+        if cursor:
+            try:
+                antes = decodificar_cursor(cursor)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        
+        transactions = get_transactions_by_status(status, limit=limit, before=antes)
         
         return jsonify({
             'transactions': transactions,
             'status': status,
-            'count': len(transactions)
+            'count': len(transactions),
+            'next_cursor': proximo_cursor(transactions, limit)
         })
         
     except Exception as e:
@@ -883,3 +1006,349 @@ def admin_stats():
     except Exception as e:
         logger.error(f"Erro ao buscar estatísticas: {e}")
         return jsonify({'error': str(e)}), 500
+
+# Formato das chaves de período em transaction_rollups e janela padrão de cada granularidade
+PERIODOS_SERIE = {
+    'hour': ('%Y-%m-%dT%H', timedelta(hours=48)),
+    'day': ('%Y-%m-%d', timedelta(days=30))
+}
+
+@app.route('/admin/stats/timeseries')
+def admin_stats_timeseries():
+    """Receita e conversão por hora ou dia, por status, método e tipo de pagamento
+    
+    ?bucket=day|hour&from=AAAA-MM-DD[THH:MM]&to=AAAA-MM-DD[THH:MM] (to inclusive; padrão:
+    últimos 30 dias ou últimas 48 horas).
+    """
+    try:
+        bucket = request.args.get('bucket', 'day')
+        if bucket not in PERIODOS_SERIE:
+            return jsonify({'error': 'bucket deve ser day ou hour'}), 400
+        formato, janela = PERIODOS_SERIE[bucket]
+        
+        try:
+            fim = request.args.get('to')
+            if fim:
+                data_fim = datetime.fromisoformat(fim)
+                # Só a data: o dia inteiro
+                if len(fim) == 10:
+                    data_fim += timedelta(days=1) - timedelta(microseconds=1)
+            else:
+                data_fim = datetime.now()
+            inicio = request.args.get('from')
+            data_inicio = datetime.fromisoformat(inicio) if inicio else data_fim - janela
+        except ValueError:
+            return jsonify({'error': 'from/to devem estar no formato AAAA-MM-DD ou AAAA-MM-DDTHH:MM'}), 400
+        
+        serie = get_transaction_timeseries(bucket, data_inicio.strftime(formato), data_fim.strftime(formato))
+        return jsonify({
+            'bucket': bucket,
+            'from': data_inicio.strftime(formato),
+            'to': data_fim.strftime(formato),
+            'series': serie
+        })
+        
+    except Exception as e:
+        logger.error(f"Erro ao buscar série de receita: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/cache_pdf')
+def admin_cache_pdf():
+    """Estatísticas do cache de PDFs (hits, misses, ocupação)"""
+    try:
+        stats = get_cache_stats()
+        return jsonify({'cache_pdf': stats})
+        
+    except Exception as e:
+        logger.error(f"Erro ao buscar estatísticas do cache de PDFs: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/smtp')
+def admin_smtp():
+    """Sessões SMTP do pool (abertas, reutilizadas, ociosas) por conta"""
+    try:
+        stats = get_pool_stats()
+        return jsonify({'smtp': stats})
+        
+    except Exception as e:
+        logger.error(f"Erro ao buscar estatísticas do pool SMTP: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/outbox')
+def admin_outbox():
+    """Profundidade da outbox de e-mails, latência de envio, cotas por conta e espera na fila"""
+    try:
+        return jsonify({
+            'outbox': get_outbox_stats(),
+            'remetente': get_remetente_stats(),
+            'agendador': get_agendador_stats()
+        })
+        
+    except Exception as e:
+        logger.error(f"Erro ao buscar estatísticas da outbox: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/webhooks')
+def admin_webhooks():
+    """Profundidade da inbox de webhooks, latência até o processamento e contadores do resolvedor"""
+    try:
+        return jsonify({
+            'inbox': get_webhook_inbox_stats(),
+            'resolvedor': get_resolvedor_stats()
+        })
+        
+    except Exception as e:
+        logger.error(f"Erro ao buscar estatísticas da inbox de webhooks: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/mercadopago')
+def admin_mercadopago():
+    """Latência, erros e novas tentativas por endpoint da API do Mercado Pago e pool de preferências"""
+    try:
+        return jsonify({
+            'mercadopago': get_mp_stats(),
+            'pool_preferencias': get_pool_preferencias_stats()
+        })
+        
+    except Exception as e:
+        logger.error(f"Erro ao buscar estatísticas do Mercado Pago: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/resumo_email', methods=['POST'])
+@admin_obrigatorio
+def admin_resumo_email():
+    """Enfileira agora o resumo das avaliações ainda não resumidas"""
+    try:
+        incluidas = enviar_resumo()
+        return jsonify({'success': True, 'avaliacoes': incluidas})
+        
+    except Exception as e:
+        logger.error(f"Erro ao enviar resumo de avaliações: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/relatorio_pdf/<chave>')
+@admin_obrigatorio
+def admin_relatorio_pdf(chave):
+    """PDF de uma avaliação (link do resumo enviado à equipe); fora do cache, é gerado de novo"""
+    if not re.fullmatch(r'[0-9a-f]{64}', chave):
+        return jsonify({'error': 'Relatório não encontrado'}), 404
+    
+    try:
+        pdf_bytes = get_pdf(chave)
+        if not pdf_bytes:
+            # Removido do cache (TTL/LRU): gerar a partir dos dados guardados da avaliação
+            dados = get_assessment_report(chave)
+            if dados is None:
+                return jsonify({'error': 'Relatório não encontrado'}), 404
+            pdf_bytes = renderizar_relatorio_salvo(dados, chave)
+        
+        return Response(pdf_bytes, mimetype='application/pdf')
+        
+    except Exception as e:
+        logger.error(f"Erro ao entregar relatório {chave}: {e}", exc_info=True)
+        return jsonify({'error': 'Erro interno ao gerar o relatório'}), 500
+
+@app.route('/admin/pontuacao_lote', methods=['POST'])
+@admin_obrigatorio
+def admin_pontuacao_lote():
+    """Pontua uma matriz N×50 de respostas (JSON ou CSV) de uma só vez"""
+    try:
+        if not numpy_disponivel():
+            return jsonify({'error': 'Pontuação em lote indisponível (NumPy não instalado)'}), 501
+        
+        # Aceita CSV (corpo text/csv ou arquivo 'arquivo') ou JSON (lista de listas ou {"respostas": [...]})
+        arquivo = request.files.get('arquivo')
+        if arquivo:
+            matriz = ler_linhas_csv(arquivo.read().decode('utf-8-sig'))
+        elif request.mimetype == 'text/csv':
+            matriz = ler_linhas_csv(request.get_data(as_text=True))
+        else:
+            dados = request.get_json(silent=True)
+            if isinstance(dados, dict):
+                dados = dados.get('respostas')
+            if not isinstance(dados, list):
+                return jsonify({'error': 'Envie uma lista de listas com 50 respostas por linha'}), 400
+            matriz = dados
+        
+        # Limite conferido antes de converter as notas para a matriz NumPy
+        if not matriz:
+            return jsonify({'error': 'Nenhuma linha de respostas'}), 400
+        if len(matriz) > LOTE_MAX_LINHAS:
+            return jsonify({'error': f'Matriz com {len(matriz)} linhas (máximo {LOTE_MAX_LINHAS} por lote)'}), 413
+        
+        resultados = calcular_resultados_lote(matriz)
+        
+        return jsonify({
+            'total': len(resultados['pontuacao_geral']),
+            'resultados': formatar_resultados_lote(resultados)
+        })
+        
+    except ValueError as e:
+        return jsonify({'error': f'Matriz de respostas inválida: {e}'}), 400
+    except Exception as e:
+        logger.error(f"Erro na pontuação em lote: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def ler_avaliacoes_csv(conteudo):
+    """Lê o CSV de respondentes: nome, email, [celular,] c1_q1..c5_q10 (com cabeçalho) ou nome, email + 50 respostas"""
+    linhas = [linha for linha in csv.reader(io.StringIO(conteudo)) if linha and any(campo.strip() for campo in linha)]
+    if not linhas:
+        return []
+    
+    cabecalho = [campo.strip().lower() for campo in linhas[0]]
+    if 'email' in cabecalho:
+        coluna_nome = cabecalho.index('nome_completo') if 'nome_completo' in cabecalho else cabecalho.index('nome')
+        coluna_email = cabecalho.index('email')
+        coluna_celular = cabecalho.index('celular') if 'celular' in cabecalho else None
+        colunas_respostas = [cabecalho.index(chave) for chave in CHAVES_RESPOSTAS]
+        linhas = linhas[1:]
+    else:
+        coluna_nome, coluna_email, coluna_celular = 0, 1, None
+        colunas_respostas = list(range(2, 2 + len(CHAVES_RESPOSTAS)))
+    
+    avaliacoes = []
+    for numero, linha in enumerate(linhas, start=1):
+        if len(linha) <= max(colunas_respostas):
+            raise ValueError(f"linha {numero} com {len(linha)} colunas")
+        avaliacoes.append({
+            'nome': linha[coluna_nome].strip(),
+            'email': linha[coluna_email].strip(),
+            'celular': linha[coluna_celular].strip() if coluna_celular is not None else '',
+            'respostas': {chave: linha[coluna] for chave, coluna in zip(CHAVES_RESPOSTAS, colunas_respostas)}
+        })
+    
+    return avaliacoes
+
+class _SaidaZip:
+    """Destino sem seek para o zipfile: acumula os bytes até o gerador repassá-los ao cliente"""
+    
+    def __init__(self):
+        self._partes = []
+    
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+    
+    def flush(self):
+        pass
+    
+    def retirar(self):
+        dados = b''.join(self._partes)
+        self._partes = []
+        return dados
+
+def _gerar_relatorio_lote(nome, email, html_pdf, pontuacao_geral, chave_pdf, enviar_emails):
+    """Gera o PDF de um respondente do lote e, se pedido, envia o e-mail"""
+    pdf_bytes = gerar_pdf_relatorio(nome, html_pdf, chave_pdf)
+    
+    email_enfileirado = None
+    if enviar_emails:
+        email_enfileirado = enviar_email(nome, email, pdf_bytes, pontuacao_geral) is not None
+    
+    return pdf_bytes, email_enfileirado
+
+def gerar_zip_relatorios(avaliacoes, versao, enviar_emails):
+    """Gerador do ZIP: cada PDF é gravado e repassado ao cliente assim que fica pronto"""
+    saida = _SaidaZip()
+    resumo = [['linha', 'nome', 'email', 'pontuacao_geral', 'arquivo', 'status', 'email_enfileirado']]
+    proximas = iter(enumerate(avaliacoes, start=1))
+    em_andamento = {}
+    
+    with ThreadPoolExecutor(max_workers=LOTE_JANELA_PDFS, thread_name_prefix='lote') as executor, \
+            zipfile.ZipFile(saida, 'w', zipfile.ZIP_STORED) as arquivo_zip:
+        
+        def submeter_proxima():
+            try:
+                linha, avaliacao = next(proximas)
+            except StopIteration:
+                return False
+            dados_template = montar_dados_relatorio(
+                avaliacao['nome'], avaliacao['email'], avaliacao['celular'], avaliacao['respostas'], versao
+            )
+            html_pdf = render_template('relatorio_template.html', modo_pdf=True, **dados_template)
+            chave_pdf = calcular_chave_pdf(avaliacao['respostas'], dados_template)
+            
+            # Registrar a avaliação para o resumo periódico da equipe, como no /submit_avaliacao
+            save_assessment(
+                avaliacao['nome'], avaliacao['email'], dados_template['pontuacao_geral'], versao, chave_pdf,
+                f"{obter_url_base()}{url_for('admin_relatorio_pdf', chave=chave_pdf)}",
+                montar_dados_renderizacao(avaliacao['respostas'], dados_template)
+            )
+            
+            futuro = executor.submit(
+                _gerar_relatorio_lote,
+                avaliacao['nome'],
+                avaliacao['email'],
+                html_pdf,
+                dados_template['pontuacao_geral'],
+                chave_pdf,
+                enviar_emails
+            )
+            em_andamento[futuro] = (linha, avaliacao, dados_template['pontuacao_geral'])
+            return True
+        
+        while len(em_andamento) < LOTE_JANELA_PDFS and submeter_proxima():
+            pass
+        
+        while em_andamento:
+            prontos, _ = wait(list(em_andamento), return_when=FIRST_COMPLETED)
+            for futuro in prontos:
+                linha, avaliacao, pontuacao_geral = em_andamento.pop(futuro)
+                nome_arquivo = avaliacao['nome'].replace(' ', '_').replace('/', '_').replace('\\', '_')
+                pdf_filename = f"{linha:04d}_relatorio_{nome_arquivo}.pdf"
+                try:
+                    pdf_bytes, email_enfileirado = futuro.result()
+                    arquivo_zip.writestr(pdf_filename, pdf_bytes)
+                    resumo.append([linha, avaliacao['nome'], avaliacao['email'], f"{pontuacao_geral:.2f}", pdf_filename, 'ok', email_enfileirado])
+                except Exception as e:
+                    logger.error(f"Erro ao gerar relatório do lote (linha {linha}): {e}")
+                    resumo.append([linha, avaliacao['nome'], avaliacao['email'], f"{pontuacao_geral:.2f}", '', f'erro: {e}', None])
+                
+                yield saida.retirar()
+                submeter_proxima()
+        
+        # Resumo do lote, na ordem do CSV
+        conteudo_resumo = io.StringIO()
+        csv.writer(conteudo_resumo).writerows([resumo[0]] + sorted(resumo[1:], key=lambda item: item[0]))
+        arquivo_zip.writestr('resumo.csv', conteudo_resumo.getvalue())
+    
+    # Diretório central do ZIP, gravado ao fechar o arquivo
+    yield saida.retirar()
+
+@app.route('/admin/avaliacoes_lote', methods=['POST'])
+@admin_obrigatorio
+def admin_avaliacoes_lote():
+    """Gera os relatórios de um CSV de respondentes e devolve um ZIP transmitido à medida que os PDFs ficam prontos"""
+    try:
+        arquivo = request.files.get('arquivo')
+        if arquivo:
+            conteudo = arquivo.read().decode('utf-8-sig')
+        else:
+            conteudo = request.get_data(as_text=True)
+        
+        try:
+            avaliacoes = ler_avaliacoes_csv(conteudo)
+        except ValueError as e:
+            return jsonify({'error': f'CSV inválido: {e}'}), 400
+        
+        if not avaliacoes:
+            return jsonify({'error': 'Nenhum respondente no CSV'}), 400
+        if len(avaliacoes) > LOTE_MAX_AVALIACOES:
+            return jsonify({'error': f'CSV com {len(avaliacoes)} respondentes (máximo {LOTE_MAX_AVALIACOES} por lote)'}), 413
+        
+        versao = request.args.get('versao', request.form.get('versao', 'gratuita'))
+        versao = versao if versao in ['gratuita', 'premium'] else 'gratuita'
+        enviar_emails = request.args.get('enviar_email', request.form.get('enviar_email', 'false')).lower() in ('1', 'true', 'sim')
+        
+        logger.info(f"Lote de {len(avaliacoes)} avaliações recebido (versão {versao}, e-mail: {enviar_emails})")
+        
+        nome_zip = f"relatorios_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        return Response(
+            stream_with_context(gerar_zip_relatorios(avaliacoes, versao, enviar_emails)),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename="{nome_zip}"'}
+        )
+        
+    except Exception as e:
+        logger.error(f"Erro no lote de avaliações: {e}")
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark do database.py: inserções do webhook e leituras do admin em processos concorrentes
+(simulando workers do gunicorn), comparando conexão por chamada (journal padrão) com a
+conexão reaproveitada por thread em WAL
+
+Uso: python bench_database.py [segundos] [escritores] [leitores] [linhas iniciais]   (padrão: 5 2 2 20000)
+"""
+
+import sys
+import os
+import sqlite3
+import tempfile
+import time
+import multiprocessing
+
+# Adicionar o diretório atual ao path para importar os módulos
+sys.path.insert(0, os.path.dirname(__file__))
+
+import database
+
+def _conexao_por_chamada():
+    """Comportamento anterior: uma conexão nova, sem ajustes, a cada chamada"""
+    return sqlite3.connect(database.DB_PATH)
+
+_conexao_por_thread = database.get_connection
+
+def _configurar(modo, caminho):
+    database.DB_PATH = caminho
+    database.get_connection = _conexao_por_chamada if modo == 'por_chamada' else _conexao_por_thread
+
+def _escritor(modo, caminho, duracao, indice, resultados):
+    _configurar(modo, caminho)
+    operacoes = 0
+    fim = time.perf_counter() + duracao
+    while time.perf_counter() < fim:
+        database.save_transaction({
+            'id': f"{indice}-{operacoes}",
+            'external_reference': f"premium_bench_{indice}_{operacoes}",
+            'status': 'approved' if operacoes % 3 else 'pending',
+            'transaction_amount': 29.90,
+            'currency_id': 'BRL',
+            'payment_method_id': 'pix',
+            'payment_type_id': 'bank_transfer',
+            'payer': {'email': f"bench{operacoes}@teste.com", 'first_name': 'Bench', 'last_name': str(indice)}
+        }, {'type': 'payment'})
+        operacoes += 1
+    resultados.put(('escrita', operacoes))
+
+def _leitor(modo, caminho, duracao, indice, resultados):
+    _configurar(modo, caminho)
+    operacoes = 0
+    fim = time.perf_counter() + duracao
+    while time.perf_counter() < fim:
+        database.get_all_transactions(limit=50)
+        database.get_transaction_stats()
+        operacoes += 1
+    resultados.put(('leitura', operacoes))
+
+def popular(caminho, linhas):
+    """Tabela inicial com `linhas` transações, para as leituras não medirem uma tabela vazia"""
+    with sqlite3.connect(caminho) as conn:
+        conn.executemany('''
+            INSERT INTO transactions
+            (payment_id, external_reference, status, amount, currency_id, payment_method,
+             payment_type, payer_email, payer_name, created_at, updated_at)
+            VALUES (?, ?, ?, 29.90, 'BRL', 'pix', 'bank_transfer', ?, 'Bench', ?, ?)
+        ''', [
+            (f"inicial-{i}", f"premium_inicial_{i}", ('approved', 'pending', 'rejected')[i % 3],
+             f"inicial{i}@teste.com", f"2025-01-01T00:00:{i % 60:02d}.{i:06d}", f"2025-01-01T00:00:{i % 60:02d}.{i:06d}")
+            for i in range(linhas)
+        ])
+
+def executar(modo, duracao, escritores, leitores, linhas_iniciais):
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, 'bench.db')
+        _configurar(modo, caminho)
+        database.init_database()
+        if modo == 'por_chamada':
+            with sqlite3.connect(caminho) as conn:
+                conn.execute('PRAGMA journal_mode=DELETE')
+        database.close_connection()
+        popular(caminho, linhas_iniciais)
+
+        resultados = multiprocessing.Queue()
+        processos = [
+            multiprocessing.Process(target=_escritor, args=(modo, caminho, duracao, i, resultados))
+            for i in range(escritores)
+        ] + [
+            multiprocessing.Process(target=_leitor, args=(modo, caminho, duracao, i, resultados))
+            for i in range(leitores)
+        ]
+        for processo in processos:
+            processo.start()
+        totais = {'escrita': 0, 'leitura': 0}
+        for _ in processos:
+            papel, operacoes = resultados.get()
+            totais[papel] += operacoes
+        for processo in processos:
+            processo.join()
+
+    return totais['escrita'] / duracao, totais['leitura'] / duracao
+
+def main():
+    duracao = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    escritores = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    leitores = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    linhas_iniciais = int(sys.argv[4]) if len(sys.argv) > 4 else 20000
+
+    print(f"{duracao:.0f}s, {escritores} processo(s) escrevendo e {leitores} lendo, {linhas_iniciais} transações iniciais")
+    print(f"{'modo':>24} | {'inserções/s':>12} | {'leituras admin/s':>16}")
+    for modo, descricao in (('por_chamada', 'conexão por chamada'), ('reaproveitada', 'conexão por thread + WAL')):
+        escritas, leituras = executar(modo, duracao, escritores, leitores, linhas_iniciais)
+        print(f"{descricao:>24} | {escritas:>12.0f} | {leituras:>16.0f}")
+
+if __name__ == '__main__':
+    # fork: os processos herdam o módulo já configurado (como os workers do gunicorn)
+    multiprocessing.set_start_method('fork')
+    main()
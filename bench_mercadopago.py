@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark do cliente do Mercado Pago contra um servidor HTTPS local que imita a API:
+conexões TLS abertas (handshakes) e tempo por chamada com o HttpClient padrão do SDK e
+com o ClienteHttpMP (sessão keep-alive, timeouts e novas tentativas)
+
+Uso: python bench_mercadopago.py [chamadas] [threads] [% de respostas 503]   (padrão: 200 4 0)
+"""
+
+import sys
+import os
+import json
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Adicionar o diretório atual ao path para importar os módulos
+sys.path.insert(0, os.path.dirname(__file__))
+
+import mercadopago
+from mercadopago.config.config import Config
+
+import cliente_mp
+
+class StubMP(BaseHTTPRequestHandler):
+    """Responde GET /v1/payments/<id> e POST /checkout/preferences; conta conexões e requisições"""
+    protocol_version = 'HTTP/1.1'
+    # Cabeçalhos e corpo num único envio (sem a espera do ACK atrasado entre dois segmentos)
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    conexoes = 0
+    requisicoes = 0
+    falhas_pct = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with StubMP.lock:
+            StubMP.conexoes += 1
+
+    def _responder(self, corpo):
+        with StubMP.lock:
+            StubMP.requisicoes += 1
+            falhar = StubMP.falhas_pct and StubMP.requisicoes % (100 // StubMP.falhas_pct) == 0
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        if tamanho:
+            self.rfile.read(tamanho)
+        status, dados = (503, b'{"message": "unavailable"}') if falhar else (200, json.dumps(corpo).encode())
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        self._responder({'id': int(self.path.rsplit('/', 1)[-1]), 'status': 'approved', 'transaction_amount': 29.90})
+
+    def do_POST(self):
+        self._responder({'id': 'pref-bench', 'init_point': 'https://example.com/checkout'})
+
+    def log_message(self, *args):
+        pass
+
+def iniciar_stub(diretorio):
+    """Servidor HTTPS com certificado autoassinado para 127.0.0.1; retorna a URL base"""
+    certificado = os.path.join(diretorio, 'stub.pem')
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+        '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+        '-keyout', certificado, '-out', certificado
+    ], check=True, capture_output=True)
+    os.environ['REQUESTS_CA_BUNDLE'] = certificado
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), StubMP)
+    contexto = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    contexto.load_cert_chain(certificado)
+    servidor.socket = contexto.wrap_socket(servidor.socket, server_side=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return f"https://127.0.0.1:{servidor.server_address[1]}"
+
+def executar(sdk, chamadas, threads):
+    StubMP.conexoes = 0
+    StubMP.requisicoes = 0
+    erros = 0
+
+    def chamar(i):
+        try:
+            if i % 10 == 0:
+                return sdk.preference().create({'items': [{'title': 'Bench', 'quantity': 1, 'unit_price': 29.90}]})
+            return sdk.payment().get(1000 + i)
+        except Exception as e:
+            return {'status': None, 'response': str(e)}
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for resposta in executor.map(chamar, range(chamadas)):
+            if resposta['status'] not in (200, 201):
+                erros += 1
+    duracao = time.perf_counter() - inicio
+    return StubMP.conexoes, StubMP.requisicoes, erros, duracao
+
+def main():
+    chamadas = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    StubMP.falhas_pct = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        Config._Config__api_base_url = iniciar_stub(diretorio)
+        print(f"{chamadas} chamadas em {threads} threads, {StubMP.falhas_pct}% de respostas 503")
+        print(f"{'cliente':>16} | {'conexões TLS':>12} | {'requisições':>11} | {'erros':>5} | {'ms/chamada':>10}")
+        for nome, sdk in (
+            ('SDK padrão', mercadopago.SDK('TEST-bench', request_options=mercadopago.config.RequestOptions(max_retries=0))),
+            ('ClienteHttpMP', cliente_mp.criar_sdk('TEST-bench'))
+        ):
+            conexoes, requisicoes, erros, duracao = executar(sdk, chamadas, threads)
+            print(f"{nome:>16} | {conexoes:>12} | {requisicoes:>11} | {erros:>5} | {duracao / chamadas * 1000:>10.2f}")
+
+        print("\nLatência por endpoint (ClienteHttpMP):")
+        for endpoint, metricas in cliente_mp.get_mp_stats()['endpoints'].items():
+            print(f"  {endpoint}: {metricas['chamadas']} chamadas, {metricas['retentativas']} novas tentativas, "
+                  f"média {metricas['tempo_medio'] * 1000:.2f} ms, histograma {metricas['histograma_ms']}")
+
+if __name__ == '__main__':
+    main()
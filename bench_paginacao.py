@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark das listagens do admin: paginação por OFFSET x paginação por chave (created_at, id)
+em páginas profundas de uma tabela grande
+
+Uso: python bench_paginacao.py [linhas] [tamanho da página]   (padrão: 1000000 50)
+"""
+
+import sys
+import os
+import sqlite3
+import tempfile
+import time
+
+# Adicionar o diretório atual ao path para importar os módulos
+sys.path.insert(0, os.path.dirname(__file__))
+
+import database
+
+STATUS = ('approved', 'pending', 'rejected', 'cancelled')
+
+def popular(caminho, linhas):
+    with sqlite3.connect(caminho) as conn:
+        conn.executemany('''
+            INSERT INTO transactions
+            (payment_id, external_reference, status, amount, currency_id, payment_method,
+             payment_type, payer_email, payer_name, created_at, updated_at)
+            VALUES (?, ?, ?, 29.90, 'BRL', 'pix', 'bank_transfer', ?, 'Bench', ?, ?)
+        ''', (
+            (f"bench-{i}", f"premium_bench_{i}", STATUS[i % len(STATUS)], f"bench{i}@teste.com",
+             f"2025-01-01T00:{(i // 60000) % 60:02d}:{(i // 1000) % 60:02d}.{i:07d}",
+             f"2025-01-01T00:{(i // 60000) % 60:02d}:{(i // 1000) % 60:02d}.{i:07d}")
+            for i in range(linhas)
+        ))
+        conn.execute('ANALYZE')
+
+def medir(funcao, repeticoes=5):
+    """Melhor tempo (ms) de `repeticoes` execuções"""
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor * 1000
+
+def main():
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    limite = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        database.DB_PATH = os.path.join(diretorio, 'bench.db')
+        database.init_database()
+        inicio = time.perf_counter()
+        popular(database.DB_PATH, linhas)
+        print(f"{linhas} transações inseridas em {time.perf_counter() - inicio:.1f}s, páginas de {limite}")
+
+        conn = database.get_connection()
+        print(f"{'listagem':>10} | {'profundidade':>12} | {'OFFSET (ms)':>11} | {'chave (ms)':>10}")
+        for profundidade in (0, linhas // 100, linhas // 10, linhas // 2, linhas - limite):
+            # cursor = última linha da página anterior, como o admin receberia em next_cursor
+            for nome, listar_offset, listar_chave, filtro, parametros in (
+                ('todas', lambda: database.get_all_transactions(limit=limite, offset=profundidade),
+                 lambda: database.get_all_transactions(limit=limite, before=cursor), '', ()),
+                ('approved', None,
+                 lambda: database.get_transactions_by_status('approved', limit=limite, before=cursor),
+                 'WHERE status = ?', ('approved',))
+            ):
+                deslocamento = profundidade if not filtro else profundidade // len(STATUS)
+                anterior = conn.execute(f'''
+                    SELECT created_at, id FROM transactions {filtro}
+                    ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET ?
+                ''', parametros + (max(deslocamento - 1, 0),)).fetchone()
+                cursor = anterior if deslocamento else None
+                if listar_offset is None:
+                    # a listagem por status não tinha OFFSET; mede-se a consulta equivalente
+                    def listar_offset():
+                        return conn.execute('''
+                            SELECT * FROM transactions WHERE status = ?
+                            ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?
+                        ''', ('approved', limite, deslocamento)).fetchall()
+                print(f"{nome:>10} | {deslocamento:>12} | {medir(listar_offset):>11.2f} | {medir(listar_chave):>10.2f}")
+
+        database.close_connection()
+
+if __name__ == '__main__':
+    main()
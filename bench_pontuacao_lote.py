@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Benchmark da pontuação em lote (NumPy) contra a pontuação por requisição
+
+Uso: python bench_pontuacao_lote.py [linhas ...]   (padrão: 10000 100000)
+"""
+
+import sys
+import os
+import time
+
+# Adicionar o diretório atual ao path para importar os módulos
+sys.path.insert(0, os.path.dirname(__file__))
+
+import numpy as np
+
+from pontuacao import CHAVES_RESPOSTAS, calcular_resultado_avaliacao
+from pontuacao_lote import calcular_resultados_lote, formatar_resultados_lote
+
+def medir(func):
+    inicio = time.perf_counter()
+    func()
+    return time.perf_counter() - inicio
+
+def main():
+    tamanhos = [int(arg) for arg in sys.argv[1:]] or [10000, 100000]
+    gerador = np.random.default_rng(42)
+
+    print(f"{'linhas':>8} | {'por requisição':>18} | {'lote (arrays)':>18} | {'lote + formatação':>18}")
+    for total in tamanhos:
+        matriz = gerador.integers(1, 6, size=(total, len(CHAVES_RESPOSTAS)))
+
+        # Pontuação por requisição: mesmo formato de entrada do formulário (strings)
+        formularios = [dict(zip(CHAVES_RESPOSTAS, map(str, linha))) for linha in matriz.tolist()]
+        t_requisicao = medir(lambda: [calcular_resultado_avaliacao(respostas) for respostas in formularios])
+        t_lote = medir(lambda: calcular_resultados_lote(matriz))
+        t_formatado = medir(lambda: formatar_resultados_lote(calcular_resultados_lote(matriz)))
+
+        print(f"{total:>8} | {total / t_requisicao:>15,.0f} /s | {total / t_lote:>15,.0f} /s | {total / t_formatado:>15,.0f} /s")
+
+if __name__ == "__main__":
+    main()
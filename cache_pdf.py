@@ -0,0 +1,173 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Diretório dos PDFs em cache (um arquivo <chave>.pdf por relatório)
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'cache_pdf'))
+
+# Tamanho máximo do cache em MB (os PDFs usados há mais tempo são removidos primeiro)
+PDF_CACHE_MAX_MB = int(os.getenv('PDF_CACHE_MAX_MB', 200))
+
+# Tempo (em segundos) sem acesso após o qual um PDF expira
+PDF_CACHE_TTL_SEGUNDOS = int(os.getenv('PDF_CACHE_TTL_SEGUNDOS', 7 * 24 * 3600))
+
+_contadores = {
+    'hits': 0,
+    'misses': 0,
+    'gravacoes': 0,
+    'remocoes': 0
+}
+_lock = threading.Lock()
+
+def _incrementar(contador, valor=1):
+    with _lock:
+        _contadores[contador] += valor
+
+def _caminho(chave):
+    return os.path.join(PDF_CACHE_DIR, f"{chave}.pdf")
+
+def calcular_versao_conteudo(*partes):
+    """Hash das partes que mudam o PDF sem mudar as respostas (template, catálogo de ações, opções)"""
+    h = hashlib.sha256()
+    for parte in partes:
+        if isinstance(parte, str):
+            parte = parte.encode('utf-8')
+        h.update(hashlib.sha256(parte).digest())
+    return h.hexdigest()
+
+def calcular_chave(respostas, dados_pessoais, versao, versao_conteudo):
+    """Chave do PDF: hash das respostas normalizadas, dados pessoais, versão (tier) e versão do conteúdo"""
+    normalizado = {
+        'respostas': sorted((str(k), str(v).strip()) for k, v in respostas.items()),
+        'dados_pessoais': sorted((str(k), str(v).strip()) for k, v in dados_pessoais.items()),
+        'versao': versao,
+        'versao_conteudo': versao_conteudo
+    }
+    return hashlib.sha256(json.dumps(normalizado, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def get_pdf(chave):
+    """Retorna os bytes do PDF em cache ou None (contabiliza hit/miss)"""
+    caminho = _caminho(chave)
+    try:
+        if time.time() - os.path.getatime(caminho) > PDF_CACHE_TTL_SEGUNDOS:
+            os.remove(caminho)
+            _incrementar('remocoes')
+            raise FileNotFoundError(caminho)
+        with open(caminho, 'rb') as f:
+            pdf_bytes = f.read()
+        # Marcar como usado recentemente (ordem LRU pelo atime; o mtime continua sendo a geração do PDF)
+        os.utime(caminho, (time.time(), os.path.getmtime(caminho)))
+    except OSError:
+        _incrementar('misses')
+        return None
+
+    _incrementar('hits')
+    return pdf_bytes
+
+def caminho_pdf(chave):
+    """Caminho do PDF em cache (para servir direto do disco) ou None (contabiliza hit/miss)"""
+    caminho = _caminho(chave)
+    try:
+        if time.time() - os.path.getatime(caminho) > PDF_CACHE_TTL_SEGUNDOS:
+            os.remove(caminho)
+            _incrementar('remocoes')
+            raise FileNotFoundError(caminho)
+        # Marcar como usado recentemente (ordem LRU pelo atime; o mtime continua sendo a geração do PDF)
+        os.utime(caminho, (time.time(), os.path.getmtime(caminho)))
+    except OSError:
+        _incrementar('misses')
+        return None
+
+    _incrementar('hits')
+    return caminho
+
+def contem_pdf(chave):
+    """True se o PDF está no cache e não expirou (não contabiliza hit/miss nem marca uso)"""
+    try:
+        return time.time() - os.path.getatime(_caminho(chave)) <= PDF_CACHE_TTL_SEGUNDOS
+    except OSError:
+        return False
+
+def put_pdf(chave, pdf_bytes):
+    """Grava o PDF no cache (escrita atômica) e aplica a política de remoção"""
+    try:
+        os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+        caminho = _caminho(chave)
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, 'wb') as f:
+            f.write(pdf_bytes)
+        os.replace(temporario, caminho)
+        _incrementar('gravacoes')
+        _remover_excedentes()
+        return True
+    except OSError as e:
+        logger.error(f"Erro ao gravar PDF no cache: {e}")
+        return False
+
+def _remover_excedentes():
+    """Remove PDFs expirados e, se o cache passar do limite, os usados há mais tempo"""
+    agora = time.time()
+    limite_bytes = PDF_CACHE_MAX_MB * 1024 * 1024
+    arquivos = []
+    total = 0
+    removidos = 0
+
+    for entrada in os.scandir(PDF_CACHE_DIR):
+        if not entrada.name.endswith('.pdf'):
+            continue
+        try:
+            info = entrada.stat()
+        except OSError:
+            continue
+        if agora - info.st_atime > PDF_CACHE_TTL_SEGUNDOS:
+            try:
+                os.remove(entrada.path)
+                removidos += 1
+            except OSError:
+                pass
+            continue
+        arquivos.append((info.st_atime, info.st_size, entrada.path))
+        total += info.st_size
+
+    if total > limite_bytes:
+        for _, tamanho, caminho in sorted(arquivos):
+            try:
+                os.remove(caminho)
+                removidos += 1
+                total -= tamanho
+            except OSError:
+                pass
+            if total <= limite_bytes:
+                break
+
+    if removidos:
+        _incrementar('remocoes', removidos)
+
+def get_cache_stats():
+    """Contadores do processo atual e ocupação do diretório de cache"""
+    with _lock:
+        stats = dict(_contadores)
+
+    arquivos = 0
+    tamanho = 0
+    if os.path.isdir(PDF_CACHE_DIR):
+        for entrada in os.scandir(PDF_CACHE_DIR):
+            if not entrada.name.endswith('.pdf'):
+                continue
+            try:
+                tamanho += entrada.stat().st_size
+                arquivos += 1
+            except OSError:
+                continue
+
+    consultas = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / consultas if consultas else 0
+    stats['arquivos'] = arquivos
+    stats['tamanho_bytes'] = tamanho
+    return stats
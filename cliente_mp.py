@@ -0,0 +1,262 @@
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import mercadopago
+import requests
+from requests.adapters import HTTPAdapter
+from mercadopago.config import RequestOptions
+from mercadopago.http import HttpClient
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Timeouts (segundos) de conexão e de leitura de cada chamada à API do Mercado Pago
+MP_TIMEOUT_CONEXAO = float(os.getenv('MP_TIMEOUT_CONEXAO', 3.05))
+MP_TIMEOUT_LEITURA = float(os.getenv('MP_TIMEOUT_LEITURA', 10))
+
+# Conexões keep-alive mantidas abertas por processo
+MP_POOL_CONEXOES = int(os.getenv('MP_POOL_CONEXOES', 10))
+
+# Novas tentativas para 429/5xx e falhas de conexão, com backoff exponencial e jitter (segundos)
+MP_MAX_RETENTATIVAS = int(os.getenv('MP_MAX_RETENTATIVAS', 2))
+MP_BACKOFF_BASE = float(os.getenv('MP_BACKOFF_BASE', 0.25))
+MP_BACKOFF_MAX = float(os.getenv('MP_BACKOFF_MAX', 4))
+MP_STATUS_RETENTATIVA = (429, 500, 502, 503, 504)
+
+# Prazo total (segundos) de uma chamada, somando as novas tentativas
+MP_PRAZO_CHAMADA = float(os.getenv('MP_PRAZO_CHAMADA', 15))
+
+# Circuit breaker: após MP_CIRCUITO_FALHAS chamadas seguidas com falha (5xx/429 ou sem resposta),
+# as chamadas falham na hora por MP_CIRCUITO_ABERTO segundos; depois uma chamada de teste decide
+MP_CIRCUITO_FALHAS = int(os.getenv('MP_CIRCUITO_FALHAS', 5))
+MP_CIRCUITO_ABERTO = float(os.getenv('MP_CIRCUITO_ABERTO', 30))
+
+# Faixas (milissegundos) do histograma de latência por endpoint
+FAIXAS_LATENCIA_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Estados do circuito
+CIRCUITO_FECHADO = 'fechado'
+CIRCUITO_ABERTO = 'aberto'
+CIRCUITO_MEIO_ABERTO = 'meio_aberto'
+
+class CircuitoAberto(Exception):
+    """Chamada recusada sem acessar o Mercado Pago: o circuito está aberto"""
+
+    def __init__(self, segundos):
+        super().__init__(f"Mercado Pago indisponível (circuito aberto), nova tentativa em {segundos:.0f}s")
+        self.segundos = segundos
+
+_local = threading.local()
+_lock = threading.Lock()
+_sessao = None
+_sessao_pid = None
+_endpoints = {}
+
+_circuito = {
+    'estado': CIRCUITO_FECHADO,
+    'falhas_seguidas': 0,
+    'aberto_ate': 0,
+    'sonda_em_andamento': False,
+    'aberturas': 0,
+    'recusadas': 0
+}
+
+@contextmanager
+def prazo_chamada(segundos):
+    """Prazo (segundos) das chamadas ao Mercado Pago feitas pela thread dentro do bloco"""
+    anterior = getattr(_local, 'prazo', None)
+    _local.prazo = segundos
+    try:
+        yield
+    finally:
+        _local.prazo = anterior
+
+def tempo_circuito_aberto():
+    """Segundos até o circuito aceitar uma chamada de teste (0 se fechado ou meio aberto)"""
+    with _lock:
+        if _circuito['estado'] != CIRCUITO_ABERTO:
+            return 0
+        return max(_circuito['aberto_ate'] - time.monotonic(), 0)
+
+def _liberar_chamada():
+    """Recusa a chamada se o circuito estiver aberto; retorna True se ela for a chamada de teste"""
+    with _lock:
+        agora = time.monotonic()
+        if _circuito['estado'] == CIRCUITO_ABERTO:
+            if agora < _circuito['aberto_ate']:
+                _circuito['recusadas'] += 1
+                raise CircuitoAberto(_circuito['aberto_ate'] - agora)
+            _circuito['estado'] = CIRCUITO_MEIO_ABERTO
+            _circuito['sonda_em_andamento'] = False
+        if _circuito['estado'] == CIRCUITO_MEIO_ABERTO:
+            # Uma chamada de teste por vez; as demais falham na hora até ela terminar
+            if _circuito['sonda_em_andamento']:
+                _circuito['recusadas'] += 1
+                raise CircuitoAberto(1)
+            _circuito['sonda_em_andamento'] = True
+            return True
+        return False
+
+def _registrar_resultado(sucesso, sonda):
+    with _lock:
+        if sonda:
+            _circuito['sonda_em_andamento'] = False
+        if sucesso:
+            if _circuito['estado'] != CIRCUITO_FECHADO:
+                logger.info("Mercado Pago respondendo: circuito fechado")
+            _circuito['estado'] = CIRCUITO_FECHADO
+            _circuito['falhas_seguidas'] = 0
+            return
+        _circuito['falhas_seguidas'] += 1
+        if sonda or (_circuito['estado'] == CIRCUITO_FECHADO and _circuito['falhas_seguidas'] >= MP_CIRCUITO_FALHAS):
+            _circuito['estado'] = CIRCUITO_ABERTO
+            _circuito['aberto_ate'] = time.monotonic() + MP_CIRCUITO_ABERTO
+            _circuito['aberturas'] += 1
+            logger.error(f"Mercado Pago com {_circuito['falhas_seguidas']} falha(s) seguida(s): "
+                         f"circuito aberto por {MP_CIRCUITO_ABERTO:.0f}s")
+
+def _obter_sessao():
+    """Sessão HTTP do processo (recriada após fork): as conexões TLS ficam abertas entre chamadas"""
+    global _sessao, _sessao_pid
+    with _lock:
+        if _sessao is None or _sessao_pid != os.getpid():
+            sessao = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=2, pool_maxsize=MP_POOL_CONEXOES, max_retries=0)
+            sessao.mount('https://', adaptador)
+            sessao.mount('http://', adaptador)
+            _sessao = sessao
+            _sessao_pid = os.getpid()
+        return _sessao
+
+def nome_endpoint(metodo, url):
+    """Endpoint para as métricas: método e caminho com os ids trocados por :id"""
+    caminho = re.sub(r'^https?://[^/]+', '', url.split('?', 1)[0])
+    return f"{metodo} {re.sub(r'/[0-9][^/]*', '/:id', caminho)}"
+
+def _registrar(endpoint, duracao, status):
+    faixa = next((str(f) for f in FAIXAS_LATENCIA_MS if duracao * 1000 <= f), 'inf')
+    with _lock:
+        metricas = _endpoints.setdefault(endpoint, {
+            'chamadas': 0,
+            'erros': 0,
+            'retentativas': 0,
+            'tempo_total': 0.0,
+            'tempo_max': 0.0,
+            'por_status': {},
+            'histograma_ms': {str(f): 0 for f in FAIXAS_LATENCIA_MS + ('inf',)}
+        })
+        metricas['chamadas'] += 1
+        metricas['tempo_total'] += duracao
+        metricas['tempo_max'] = max(metricas['tempo_max'], duracao)
+        metricas['histograma_ms'][faixa] += 1
+        chave_status = str(status) if status else 'falha_conexao'
+        metricas['por_status'][chave_status] = metricas['por_status'].get(chave_status, 0) + 1
+        if not status or status >= 400:
+            metricas['erros'] += 1
+
+def _contar_retentativa(endpoint):
+    with _lock:
+        _endpoints[endpoint]['retentativas'] += 1
+
+def calcular_espera(tentativa, resposta=None):
+    """Espera antes da nova tentativa: Retry-After do 429 ou backoff exponencial com jitter total"""
+    if resposta is not None:
+        retry_after = resposta.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            return min(int(retry_after), MP_BACKOFF_MAX)
+    return random.uniform(0, min(MP_BACKOFF_MAX, MP_BACKOFF_BASE * 2 ** (tentativa - 1)))
+
+class ClienteHttpMP(HttpClient):
+    """HttpClient do SDK com sessão keep-alive compartilhada, timeouts e novas tentativas
+
+    O HttpClient padrão abre uma requests.Session (e um handshake TLS) por chamada e só usa
+    o timeout de 60s do RequestOptions. Aqui os timeouts são MP_TIMEOUT_CONEXAO/LEITURA e o
+    maxretries do SDK é substituído por MP_MAX_RETENTATIVAS. Retentar um POST é seguro: o SDK
+    envia x-idempotency-key e a mesma chave vale para todas as tentativas da chamada.
+
+    Cada chamada respeita o prazo total (MP_PRAZO_CHAMADA ou prazo_chamada) e passa pelo
+    circuit breaker: com o circuito aberto, levanta CircuitoAberto sem acessar a rede.
+    """
+
+    def request(self, method, url, maxretries=None, **kwargs):
+        sonda = _liberar_chamada()
+        sucesso = False
+        try:
+            resultado = self._request_com_prazo(method, url, **kwargs)
+            sucesso = resultado['status'] not in MP_STATUS_RETENTATIVA
+            return resultado
+        finally:
+            _registrar_resultado(sucesso, sonda)
+
+    def _request_com_prazo(self, method, url, **kwargs):
+        endpoint = nome_endpoint(method, url)
+        limite = time.monotonic() + (getattr(_local, 'prazo', None) or MP_PRAZO_CHAMADA)
+        tentativa = 0
+        while True:
+            inicio = time.monotonic()
+            restante = max(limite - inicio, 0.001)
+            kwargs['timeout'] = (min(MP_TIMEOUT_CONEXAO, restante), min(MP_TIMEOUT_LEITURA, restante))
+            resposta = None
+            try:
+                resposta = _obter_sessao().request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                erro = e
+            _registrar(endpoint, time.monotonic() - inicio, resposta.status_code if resposta is not None else None)
+
+            if resposta is not None and resposta.status_code not in MP_STATUS_RETENTATIVA:
+                break
+            espera = calcular_espera(tentativa + 1, resposta)
+            # Sem tentativas ou sem prazo para mais uma: devolve a última resposta (ou o erro)
+            if tentativa >= MP_MAX_RETENTATIVAS or time.monotonic() + espera >= limite:
+                if resposta is None:
+                    raise erro
+                break
+
+            tentativa += 1
+            _contar_retentativa(endpoint)
+            logger.warning(f"Mercado Pago {endpoint}: {resposta.status_code if resposta is not None else erro}, "
+                           f"nova tentativa ({tentativa}/{MP_MAX_RETENTATIVAS}) em {espera:.2f}s")
+            time.sleep(espera)
+
+        resultado = {"status": resposta.status_code, "response": None}
+        if resposta.status_code != 204 and resposta.content:
+            try:
+                resultado["response"] = resposta.json()
+            except ValueError as e:
+                logger.error(f"Resposta inválida do Mercado Pago em {endpoint}: {e}")
+        return resultado
+
+def criar_sdk(access_token):
+    """SDK do Mercado Pago usando o ClienteHttpMP"""
+    return mercadopago.SDK(
+        access_token,
+        http_client=ClienteHttpMP(),
+        request_options=RequestOptions(connection_timeout=MP_TIMEOUT_LEITURA, max_retries=MP_MAX_RETENTATIVAS)
+    )
+
+def get_mp_stats():
+    """Latência por endpoint da API do Mercado Pago (histograma com a contagem por faixa, em ms)"""
+    with _lock:
+        endpoints = {}
+        for endpoint, metricas in _endpoints.items():
+            copia = dict(metricas)
+            copia['por_status'] = dict(metricas['por_status'])
+            copia['histograma_ms'] = dict(metricas['histograma_ms'])
+            copia['tempo_medio'] = copia['tempo_total'] / copia['chamadas'] if copia['chamadas'] else 0
+            endpoints[endpoint] = copia
+        circuito = dict(_circuito)
+    aberto_ate = circuito.pop('aberto_ate')
+    circuito['aberto_por_segundos'] = max(aberto_ate - time.monotonic(), 0) if circuito['estado'] == CIRCUITO_ABERTO else 0
+    return {
+        'timeout_conexao': MP_TIMEOUT_CONEXAO,
+        'timeout_leitura': MP_TIMEOUT_LEITURA,
+        'prazo_chamada': MP_PRAZO_CHAMADA,
+        'max_retentativas': MP_MAX_RETENTATIVAS,
+        'circuito': circuito,
+        'endpoints': endpoints
+    }
@@ -0,0 +1,17 @@
+import sys
+import os
+
+import pytest
+
+# Adicionar o diretório atual ao path para importar os módulos
+sys.path.insert(0, os.path.dirname(__file__))
+
+import database
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    """Banco de dados temporário (não altera o transactions.db do projeto)"""
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'teste.db'))
+    assert database.init_database()
+    yield
+    database.close_connection()
@@ -1,6 +1,8 @@
 import sqlite3
+import json
 import logging
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 import os
 
 # Configurar logging
@@ -9,10 +11,136 @@ logger = logging.getLogger(__name__)
 # Caminho do banco de dados
 DB_PATH = os.path.join(os.path.dirname(__file__), 'transactions.db')
 
+# Ajustes aplicados uma vez por conexão
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 64 * 1024 * 1024))
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 16 * 1024))
+SQLITE_CACHED_STATEMENTS = int(os.getenv('SQLITE_CACHED_STATEMENTS', 256))
+SQLITE_TIMEOUT = int(os.getenv('SQLITE_TIMEOUT', 30))
+
+# Uma conexão por thread, reaproveitada entre chamadas
+_local = threading.local()
+
+def get_connection():
+    """Conexão SQLite da thread atual, criada e configurada (WAL, cache, mmap) na primeira chamada
+    
+    Os statements preparados ficam no cache da própria conexão (cached_statements), então
+    reaproveitar a conexão também reaproveita o parse/plano das consultas.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.db_path == DB_PATH and _local.pid == os.getpid():
+        return conn
+    
+    conn = sqlite3.connect(DB_PATH, timeout=SQLITE_TIMEOUT, cached_statements=SQLITE_CACHED_STATEMENTS)
+    # WAL: escritas do webhook não bloqueiam as leituras do admin (e vice-versa)
+    conn.execute('PRAGMA journal_mode=WAL')
+    # NORMAL é seguro em WAL: só perde as últimas transações numa queda de energia, sem corromper
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE:d}')
+    conn.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB:d}')
+    
+    _local.conn = conn
+    _local.db_path = DB_PATH
+    _local.pid = os.getpid()
+    return conn
+
+def rollback_connection():
+    """Desfaz a transação pendente da conexão da thread após um erro (ela continua em uso)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and conn.in_transaction:
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            pass
+
+def close_connection():
+    """Fecha a conexão da thread atual (a próxima chamada abre outra)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        _local.conn = None
+        conn.close()
+
+# Gatilhos que mantêm transaction_stats: o UPSERT do save_transaction dispara o de INSERT
+# (pagamento novo) ou o de UPDATE (notificação seguinte), que move a transação entre os status
+_STATS_ADD = '''
+    INSERT INTO transaction_stats (status, count, amount_cents)
+    VALUES (NEW.status, 1, CAST(ROUND(COALESCE(NEW.amount, 0) * 100) AS INTEGER))
+    ON CONFLICT(status) DO UPDATE SET
+        count = count + 1,
+        amount_cents = amount_cents + excluded.amount_cents;
+'''
+_STATS_REMOVE = '''
+    UPDATE transaction_stats SET
+        count = count - 1,
+        amount_cents = amount_cents - CAST(ROUND(COALESCE(OLD.amount, 0) * 100) AS INTEGER)
+    WHERE status = OLD.status;
+'''
+TRANSACTION_STATS_TRIGGERS = (
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_transaction_stats_insert
+    AFTER INSERT ON transactions
+    BEGIN {_STATS_ADD} END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_transaction_stats_update
+    AFTER UPDATE OF status, amount ON transactions
+    WHEN OLD.status IS NOT NEW.status OR OLD.amount IS NOT NEW.amount
+    BEGIN {_STATS_REMOVE} {_STATS_ADD} END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_transaction_stats_delete
+    AFTER DELETE ON transactions
+    BEGIN {_STATS_REMOVE} END
+    '''
+)
+
+# Agregados de receita por período (hora e dia da criação da transação), status, método e tipo
+# de pagamento, mantidos pelos gatilhos abaixo como transaction_stats
+ROLLUP_BUCKETS = {
+    'hour': "replace(substr({row}.created_at, 1, 13), ' ', 'T')",
+    'day': "substr({row}.created_at, 1, 10)"
+}
+
+def _rollup_statements(row, sign):
+    statements = []
+    for bucket, period in ROLLUP_BUCKETS.items():
+        values = (f"'{bucket}', {period.format(row=row)}, {row}.status, "
+                  f"COALESCE({row}.payment_method, ''), COALESCE({row}.payment_type, '')")
+        cents = f"CAST(ROUND(COALESCE({row}.amount, 0) * 100) AS INTEGER)"
+        statements.append(f'''
+            INSERT INTO transaction_rollups
+            (bucket, period, status, payment_method, payment_type, count, amount_cents)
+            VALUES ({values}, {sign}1, {sign}{cents})
+            ON CONFLICT(bucket, period, status, payment_method, payment_type) DO UPDATE SET
+                count = count + excluded.count,
+                amount_cents = amount_cents + excluded.amount_cents;
+        ''')
+    return ''.join(statements)
+
+TRANSACTION_ROLLUP_TRIGGERS = (
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_transaction_rollups_insert
+    AFTER INSERT ON transactions
+    BEGIN {_rollup_statements('NEW', '')} END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_transaction_rollups_update
+    AFTER UPDATE OF status, amount, payment_method, payment_type, created_at ON transactions
+    WHEN OLD.status IS NOT NEW.status OR OLD.amount IS NOT NEW.amount
+      OR OLD.payment_method IS NOT NEW.payment_method OR OLD.payment_type IS NOT NEW.payment_type
+      OR OLD.created_at IS NOT NEW.created_at
+    BEGIN {_rollup_statements('OLD', '-')} {_rollup_statements('NEW', '')} END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_transaction_rollups_delete
+    AFTER DELETE ON transactions
+    BEGIN {_rollup_statements('OLD', '-')} END
+    '''
+)
+
 def init_database():
     """Inicializa o banco de dados e cria as tabelas necessárias"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Criar tabela de transações
@@ -37,103 +165,271 @@ def init_database():
         # Criar índices para melhor performance
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_payment_id ON transactions(payment_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_external_reference ON transactions(external_reference)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_status ON transactions(status)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_created_at ON transactions(created_at)')
         
+        # Listagem por status já ordenada: percorrido de trás para frente, o índice entrega
+        # created_at DESC, id DESC (o id/rowid é a última coluna implícita), sem ordenação extra.
+        # Substitui o índice só de status, que é prefixo deste.
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_status_created_at ON transactions(status, created_at)')
+        cursor.execute('DROP INDEX IF EXISTS idx_status')
+        
+        # Estatísticas por status mantidas pelos gatilhos abaixo, na mesma transação da escrita
+        # (valores em centavos para a soma não acumular erro de ponto flutuante)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS transaction_stats (
+                status TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0,
+                amount_cents INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        for trigger_sql in TRANSACTION_STATS_TRIGGERS:
+            cursor.execute(trigger_sql)
+        
+        # Bancos criados antes da tabela de estatísticas: preencher a partir das transações
+        cursor.execute('SELECT COUNT(*) FROM transaction_stats')
+        if cursor.fetchone()[0] == 0:
+            _rebuild_transaction_stats(cursor)
+        
+        # Receita e conversão por hora/dia: o dashboard lê estes agregados, não a tabela inteira
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS transaction_rollups (
+                bucket TEXT NOT NULL,
+                period TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payment_method TEXT NOT NULL,
+                payment_type TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                amount_cents INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (bucket, period, status, payment_method, payment_type)
+            ) WITHOUT ROWID
+        ''')
+        for trigger_sql in TRANSACTION_ROLLUP_TRIGGERS:
+            cursor.execute(trigger_sql)
+        
+        cursor.execute('SELECT COUNT(*) FROM transaction_rollups')
+        if cursor.fetchone()[0] == 0:
+            _rebuild_transaction_rollups(cursor)
+        
+        # Fila de e-mails (outbox): o envio acontece em segundo plano, com novas tentativas
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS email_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                recipient TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                body_html TEXT NOT NULL,
+                pdf_path TEXT,
+                attachment_name TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TIMESTAMP,
+                last_error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                sent_at TIMESTAMP,
+                sender TEXT
+            )
+        ''')
+        
+        # Bancos criados antes da coluna sender (conta que enviou o e-mail)
+        cursor.execute('PRAGMA table_info(email_outbox)')
+        if 'sender' not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute('ALTER TABLE email_outbox ADD COLUMN sender TEXT')
+        
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_outbox_status_next ON email_outbox(status, next_attempt_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_outbox_sent_at ON email_outbox(sent_at)')
+        
+        # Avaliações concluídas (listadas no resumo periódico enviado à equipe)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS assessments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                email TEXT NOT NULL,
+                score REAL,
+                tier TEXT,
+                pdf_key TEXT,
+                pdf_url TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                digest_sent_at TIMESTAMP,
+                report_data TEXT
+            )
+        ''')
+        
+        # Bancos criados antes da coluna report_data (dados para gerar o PDF de novo, fora do link)
+        cursor.execute('PRAGMA table_info(assessments)')
+        if 'report_data' not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute('ALTER TABLE assessments ADD COLUMN report_data TEXT')
+        
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_assessments_digest ON assessments(digest_sent_at, created_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_assessments_pdf_key ON assessments(pdf_key)')
+        
+        # Notificações do Mercado Pago (inbox): o webhook só grava, a consulta do pagamento é em segundo plano
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS webhook_inbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT NOT NULL,
+                resource_id TEXT NOT NULL,
+                payload TEXT,
+                source TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TIMESTAMP,
+                last_error TEXT,
+                received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                processed_at TIMESTAMP,
+                notifications INTEGER NOT NULL DEFAULT 1
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_webhook_status_next ON webhook_inbox(status, next_attempt_at)')
+        
+        # Inboxes criadas antes da coalescência (notifications = quantas notificações a linha representa)
+        cursor.execute('PRAGMA table_info(webhook_inbox)')
+        if 'notifications' not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute('ALTER TABLE webhook_inbox ADD COLUMN notifications INTEGER NOT NULL DEFAULT 1')
+        
+        # No máximo uma notificação pendente por pagamento: as seguintes se juntam a ela
+        cursor.execute('''
+            UPDATE webhook_inbox SET status = ?
+            WHERE status = ? AND id NOT IN (
+                SELECT MAX(id) FROM webhook_inbox WHERE status = ? GROUP BY topic, resource_id
+            )
+        ''', (WEBHOOK_COALESCED, WEBHOOK_PENDING, WEBHOOK_PENDING))
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_webhook_pending_resource
+            ON webhook_inbox(topic, resource_id) WHERE status = 'pending'
+        ''')
+        
+        # Jobs de segundo plano (PDF/e-mail do /submit_avaliacao): o estado fica no banco para que
+        # /jobs/<id> responda em qualquer worker, não só no que executa o job
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                etapa TEXT,
+                resultado TEXT,
+                erro TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_finished_at ON jobs(finished_at)')
+        
         conn.commit()
-        conn.close()
         
         logger.info("Banco de dados inicializado com sucesso")
         return True
         
     except Exception as e:
+        rollback_connection()
         logger.error(f"Erro ao inicializar banco de dados: {e}")
         return False
 
+# Inserção ou atualização atômica pelo payment_id (duas notificações simultâneas não duplicam a linha)
+UPSERT_TRANSACTION_SQL = '''
+    INSERT INTO transactions 
+    (payment_id, external_reference, status, amount, currency_id, 
+     payment_method, payment_type, payer_email, payer_name, 
+     created_at, updated_at, webhook_data)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(payment_id) DO UPDATE SET
+        status = excluded.status,
+        amount = excluded.amount,
+        currency_id = excluded.currency_id,
+        payment_method = excluded.payment_method,
+        payment_type = excluded.payment_type,
+        payer_email = excluded.payer_email,
+        payer_name = excluded.payer_name,
+        updated_at = excluded.updated_at,
+        webhook_data = excluded.webhook_data
+'''
+
+def _transaction_row(payment_data, webhook_data, current_time):
+    """Parâmetros do UPSERT_TRANSACTION_SQL a partir do pagamento do Mercado Pago"""
+    # Extrair dados do pagamento
+    payment_id = str(payment_data.get('id', ''))
+    external_reference = payment_data.get('external_reference', '')
+    status = payment_data.get('status', '')
+    amount = float(payment_data.get('transaction_amount', 0))
+    currency_id = payment_data.get('currency_id', '')
+    
+    # Dados do método de pagamento
+    payment_method = ''
+    payment_type = ''
+    if 'payment_method_id' in payment_data:
+        payment_method = payment_data.get('payment_method_id', '')
+    if 'payment_type_id' in payment_data:
+        payment_type = payment_data.get('payment_type_id', '')
+    
+    # Dados do pagador
+    payer_email = ''
+    payer_name = ''
+    if 'payer' in payment_data:
+        payer = payment_data['payer']
+        payer_email = payer.get('email', '')
+        if 'first_name' in payer and 'last_name' in payer:
+            payer_name = f"{payer.get('first_name', '')} {payer.get('last_name', '')}".strip()
+    
+    # Converter webhook_data para string JSON se fornecido
+    webhook_data_str = str(webhook_data) if webhook_data else None
+    
+    return (payment_id, external_reference, status, amount, currency_id,
+            payment_method, payment_type, payer_email, payer_name,
+            current_time, current_time, webhook_data_str)
+
 def save_transaction(payment_data, webhook_data=None):
-    """Salva ou atualiza uma transação no banco de dados"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Extrair dados do pagamento
-        payment_id = str(payment_data.get('id', ''))
-        external_reference = payment_data.get('external_reference', '')
-        status = payment_data.get('status', '')
-        amount = float(payment_data.get('transaction_amount', 0))
-        currency_id = payment_data.get('currency_id', '')
-        
-        # Dados do método de pagamento
-        payment_method = ''
-        payment_type = ''
-        if 'payment_method_id' in payment_data:
-            payment_method = payment_data.get('payment_method_id', '')
-        if 'payment_type_id' in payment_data:
-            payment_type = payment_data.get('payment_type_id', '')
-        
-        # Dados do pagador
-        payer_email = ''
-        payer_name = ''
-        if 'payer' in payment_data:
-            payer = payment_data['payer']
-            payer_email = payer.get('email', '')
-            if 'first_name' in payer and 'last_name' in payer:
-                payer_name = f"{payer.get('first_name', '')} {payer.get('last_name', '')}".strip()
-        
-        # Converter webhook_data para string JSON se fornecido
-        webhook_data_str = str(webhook_data) if webhook_data else None
-        
-        # Verificar se a transação já existe
-        cursor.execute('SELECT id FROM transactions WHERE payment_id = ?', (payment_id,))
-        existing = cursor.fetchone()
-        
-        current_time = datetime.now().isoformat()
+    """Salva ou atualiza uma transação no banco de dados (um único UPSERT)"""
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
         
-        if existing:
-            # Atualizar transação existente
-            cursor.execute('''
-                UPDATE transactions 
-                SET status = ?, amount = ?, currency_id = ?, payment_method = ?, 
-                    payment_type = ?, payer_email = ?, payer_name = ?, 
-                    updated_at = ?, webhook_data = ?
-                WHERE payment_id = ?
-            ''', (status, amount, currency_id, payment_method, payment_type, 
-                  payer_email, payer_name, current_time, webhook_data_str, payment_id))
-            
-            logger.info(f"Transação atualizada: {payment_id} - Status: {status}")
-        else:
-            # Inserir nova transação
-            cursor.execute('''
-                INSERT INTO transactions 
-                (payment_id, external_reference, status, amount, currency_id, 
-                 payment_method, payment_type, payer_email, payer_name, 
-                 created_at, updated_at, webhook_data)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (payment_id, external_reference, status, amount, currency_id,
-                  payment_method, payment_type, payer_email, payer_name,
-                  current_time, current_time, webhook_data_str))
-            
-            logger.info(f"Nova transação salva: {payment_id} - Status: {status}")
+        row = _transaction_row(payment_data, webhook_data, datetime.now().isoformat())
+        cursor.execute(UPSERT_TRANSACTION_SQL, row)
         
         conn.commit()
-        conn.close()
+        logger.info(f"Transação salva: {row[0]} - Status: {row[2]}")
         return True
         
     except Exception as e:
+        rollback_connection()
         logger.error(f"Erro ao salvar transação: {e}")
         return False
 
+def save_transactions_bulk(payments):
+    """Salva ou atualiza vários pagamentos em uma única transação (conciliações e cargas históricas)
+    
+    Aceita qualquer iterável de pagamentos (pode ser um gerador) e retorna quantas linhas foram
+    inseridas/atualizadas; em caso de erro nada é gravado e o retorno é 0.
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        current_time = datetime.now().isoformat()
+        cursor.executemany(
+            UPSERT_TRANSACTION_SQL,
+            (_transaction_row(payment_data, None, current_time) for payment_data in payments)
+        )
+        saved = cursor.rowcount
+        
+        conn.commit()
+        logger.info(f"{saved} transações salvas em lote")
+        return saved
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao salvar transações em lote: {e}")
+        return 0
+
 def get_transaction_by_payment_id(payment_id):
     """Busca uma transação pelo payment_id"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute('SELECT * FROM transactions WHERE payment_id = ?', (payment_id,))
         row = cursor.fetchone()
         
-        conn.close()
-        
         if row:
             # Converter tupla em dicionário
             columns = ['id', 'payment_id', 'external_reference', 'status', 'amount', 
@@ -144,24 +440,36 @@ def get_transaction_by_payment_id(payment_id):
         return None
         
     except Exception as e:
+        rollback_connection()
         logger.error(f"Erro ao buscar transação: {e}")
         return None
 
-def get_transactions_by_status(status, limit=100):
-    """Busca transações por status"""
+def get_transactions_by_status(status, limit=100, before=None):
+    """Busca transações por status
+    
+    before: cursor (created_at, id) da última transação da página anterior; a consulta
+    continua a partir dele pelo índice, com o mesmo custo em qualquer profundidade.
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT * FROM transactions 
-            WHERE status = ? 
-            ORDER BY created_at DESC 
-            LIMIT ?
-        ''', (status, limit))
+        if before:
+            cursor.execute('''
+                SELECT * FROM transactions 
+                WHERE status = ? AND (created_at, id) < (?, ?)
+                ORDER BY created_at DESC, id DESC 
+                LIMIT ?
+            ''', (status, before[0], before[1], limit))
+        else:
+            cursor.execute('''
+                SELECT * FROM transactions 
+                WHERE status = ? 
+                ORDER BY created_at DESC, id DESC 
+                LIMIT ?
+            ''', (status, limit))
         
         rows = cursor.fetchall()
-        conn.close()
         
         # Converter tuplas em dicionários
         columns = ['id', 'payment_id', 'external_reference', 'status', 'amount', 
@@ -171,23 +479,35 @@ def get_transactions_by_status(status, limit=100):
         return [dict(zip(columns, row)) for row in rows]
         
     except Exception as e:
+        rollback_connection()
         logger.error(f"Erro ao buscar transações por status: {e}")
         return []
 
-def get_all_transactions(limit=100, offset=0):
-    """Busca todas as transações com paginação"""
+def get_all_transactions(limit=100, offset=0, before=None):
+    """Busca todas as transações com paginação
+    
+    Com before (cursor (created_at, id) da última transação da página anterior) a paginação
+    é por chave e offset é ignorado; OFFSET percorre e descarta todas as linhas puladas.
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT * FROM transactions 
-            ORDER BY created_at DESC 
-            LIMIT ? OFFSET ?
-        ''', (limit, offset))
+        if before:
+            cursor.execute('''
+                SELECT * FROM transactions 
+                WHERE (created_at, id) < (?, ?)
+                ORDER BY created_at DESC, id DESC 
+                LIMIT ?
+            ''', (before[0], before[1], limit))
+        else:
+            cursor.execute('''
+                SELECT * FROM transactions 
+                ORDER BY created_at DESC, id DESC 
+                LIMIT ? OFFSET ?
+            ''', (limit, offset))
         
         rows = cursor.fetchall()
-        conn.close()
         
         # Converter tuplas em dicionários
         columns = ['id', 'payment_id', 'external_reference', 'status', 'amount', 
@@ -197,44 +517,38 @@ def get_all_transactions(limit=100, offset=0):
         return [dict(zip(columns, row)) for row in rows]
         
     except Exception as e:
+        rollback_connection()
         logger.error(f"Erro ao buscar todas as transações: {e}")
         return []
 
 def get_transaction_stats():
-    """Retorna estatísticas das transações"""
+    """Retorna estatísticas das transações (lidas de transaction_stats, uma linha por status)"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
-        # Contar transações por status
-        cursor.execute('''
-            SELECT status, COUNT(*) as count, SUM(amount) as total_amount
-            FROM transactions 
-            GROUP BY status
-        ''')
+        cursor.execute('SELECT status, count, amount_cents FROM transaction_stats WHERE count > 0')
         
         stats_by_status = {}
+        total_count = 0
+        total_cents = 0
         for row in cursor.fetchall():
-            status, count, total_amount = row
+            status, count, amount_cents = row
             stats_by_status[status] = {
                 'count': count,
-                'total_amount': total_amount or 0
+                'total_amount': amount_cents / 100
             }
-        
-        # Total geral
-        cursor.execute('SELECT COUNT(*) as total_count, SUM(amount) as total_amount FROM transactions')
-        total_row = cursor.fetchone()
-        total_count, total_amount = total_row
-        
-        conn.close()
+            total_count += count
+            total_cents += amount_cents
         
         return {
             'total_transactions': total_count,
-            'total_amount': total_amount or 0,
+            'total_amount': total_cents / 100,
             'by_status': stats_by_status
         }
         
     except Exception as e:
+        rollback_connection()
         logger.error(f"Erro ao buscar estatísticas: {e}")
         return {
             'total_transactions': 0,
@@ -242,3 +556,823 @@ def get_transaction_stats():
             'by_status': {}
         }
 
+
+def _rebuild_transaction_stats(cursor):
+    """Recalcula transaction_stats a partir das transações; retorna os status que divergiam"""
+    cursor.execute('''
+        SELECT status, COUNT(*), SUM(CAST(ROUND(COALESCE(amount, 0) * 100) AS INTEGER))
+        FROM transactions
+        GROUP BY status
+    ''')
+    expected = {status: (count, amount_cents) for status, count, amount_cents in cursor.fetchall()}
+    
+    cursor.execute('SELECT status, count, amount_cents FROM transaction_stats WHERE count != 0 OR amount_cents != 0')
+    current = {status: (count, amount_cents) for status, count, amount_cents in cursor.fetchall()}
+    
+    cursor.execute('DELETE FROM transaction_stats')
+    cursor.executemany('''
+        INSERT INTO transaction_stats (status, count, amount_cents) VALUES (?, ?, ?)
+    ''', [(status, count, amount_cents) for status, (count, amount_cents) in expected.items()])
+    
+    return {
+        status: {'expected': expected.get(status, (0, 0)), 'found': current.get(status, (0, 0))}
+        for status in set(expected) | set(current)
+        if expected.get(status) != current.get(status)
+    }
+
+def rebuild_transaction_stats():
+    """Recalcula as estatísticas a partir da tabela de transações (verificação/correção)
+    
+    Retorna {status: {'expected': (count, centavos), 'found': (count, centavos)}} com as
+    divergências encontradas (vazio se as estatísticas estavam corretas) ou None em caso de erro.
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        # BEGIN IMMEDIATE: nenhuma escrita entre a contagem e a regravação
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            drift = _rebuild_transaction_stats(cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        if drift:
+            logger.warning(f"Estatísticas de transações divergentes corrigidas: {drift}")
+        else:
+            logger.info("Estatísticas de transações conferidas: sem divergências")
+        return drift
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao recalcular estatísticas: {e}")
+        return None
+
+def _rebuild_transaction_rollups(cursor):
+    """Recalcula transaction_rollups a partir das transações; retorna quantas linhas divergiam"""
+    expected = ' UNION ALL '.join(f'''
+        SELECT '{bucket}', {period.format(row='transactions')}, status,
+               COALESCE(payment_method, ''), COALESCE(payment_type, ''),
+               COUNT(*), SUM(CAST(ROUND(COALESCE(amount, 0) * 100) AS INTEGER))
+        FROM transactions
+        GROUP BY 2, 3, 4, 5
+    ''' for bucket, period in ROLLUP_BUCKETS.items())
+    current = '''
+        SELECT bucket, period, status, payment_method, payment_type, count, amount_cents
+        FROM transaction_rollups WHERE count != 0 OR amount_cents != 0
+    '''
+    
+    cursor.execute(f'''
+        SELECT (SELECT COUNT(*) FROM (SELECT * FROM ({expected}) EXCEPT {current}))
+             + (SELECT COUNT(*) FROM ({current} EXCEPT SELECT * FROM ({expected})))
+    ''')
+    drift = cursor.fetchone()[0]
+    
+    cursor.execute('DELETE FROM transaction_rollups')
+    cursor.execute(f'''
+        INSERT INTO transaction_rollups
+        (bucket, period, status, payment_method, payment_type, count, amount_cents)
+        {expected}
+    ''')
+    return drift
+
+def rebuild_transaction_rollups():
+    """Recalcula os agregados por hora/dia; retorna quantas linhas divergiam (None em caso de erro)"""
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            drift = _rebuild_transaction_rollups(cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        if drift:
+            logger.warning(f"Agregados de receita: {drift} linha(s) divergente(s) corrigida(s)")
+        else:
+            logger.info("Agregados de receita conferidos: sem divergências")
+        return drift
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao recalcular agregados de receita: {e}")
+        return None
+
+def get_transaction_timeseries(bucket, start, end):
+    """Série de receita e conversão por período ('hour' ou 'day'), de start a end inclusive
+    
+    start/end são chaves de período ('2025-01-31' ou '2025-01-31T14'). Cada ponto traz o total,
+    a receita e a taxa de conversão (aprovadas/total) e as quebras por status, método e tipo.
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT period, status, payment_method, payment_type, count, amount_cents
+            FROM transaction_rollups
+            WHERE bucket = ? AND period >= ? AND period <= ? AND count != 0
+            ORDER BY period
+        ''', (bucket, start, end))
+        
+        series = []
+        for period, status, payment_method, payment_type, count, amount_cents in cursor.fetchall():
+            if not series or series[-1]['period'] != period:
+                series.append({
+                    'period': period,
+                    'count': 0,
+                    'amount_cents': 0,
+                    'approved': 0,
+                    'revenue_cents': 0,
+                    'by_status': {},
+                    'by_payment_method': {},
+                    'by_payment_type': {}
+                })
+            point = series[-1]
+            point['count'] += count
+            point['amount_cents'] += amount_cents
+            if status == 'approved':
+                point['approved'] += count
+                point['revenue_cents'] += amount_cents
+            for key, value in (('by_status', status), ('by_payment_method', payment_method),
+                               ('by_payment_type', payment_type)):
+                group = point[key].setdefault(value, {'count': 0, 'amount': 0})
+                group['count'] += count
+                group['amount'] += amount_cents
+        
+        for point in series:
+            point['amount'] = point.pop('amount_cents') / 100
+            point['revenue'] = point.pop('revenue_cents') / 100
+            point['conversion_rate'] = point['approved'] / point['count'] if point['count'] else 0
+            for key in ('by_status', 'by_payment_method', 'by_payment_type'):
+                for group in point[key].values():
+                    group['amount'] /= 100
+        
+        return series
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao buscar série de receita: {e}")
+        return []
+
+
+# Estados de um e-mail na outbox
+EMAIL_PENDING = 'pending'
+EMAIL_SENDING = 'sending'
+EMAIL_SENT = 'sent'
+EMAIL_DEAD = 'dead'
+
+OUTBOX_COLUMNS = ['id', 'recipient', 'subject', 'body_html', 'pdf_path', 'attachment_name',
+                  'status', 'attempts', 'next_attempt_at', 'last_error', 'created_at',
+                  'updated_at', 'sent_at', 'sender']
+
+def enqueue_email(recipient, subject, body_html, pdf_path=None, attachment_name=None):
+    """Insere um e-mail na outbox e retorna seu id (None em caso de erro)"""
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        current_time = datetime.now().isoformat()
+        cursor.execute('''
+            INSERT INTO email_outbox
+            (recipient, subject, body_html, pdf_path, attachment_name, status,
+             attempts, next_attempt_at, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?, ?)
+        ''', (recipient, subject, body_html, pdf_path, attachment_name, EMAIL_PENDING,
+              current_time, current_time, current_time))
+        email_id = cursor.lastrowid
+        
+        conn.commit()
+        
+        logger.info(f"E-mail {email_id} enfileirado para: {recipient}")
+        return email_id
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao enfileirar e-mail: {e}")
+        return None
+
+def claim_emails(limit=20, lease_seconds=300):
+    """Reserva até `limit` e-mails prontos para envio (status sending) e os retorna
+    
+    E-mails presos em sending há mais de lease_seconds (worker encerrado no meio do envio)
+    voltam a ser elegíveis.
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        now = datetime.now()
+        current_time = now.isoformat()
+        lease_limit = (now - timedelta(seconds=lease_seconds)).isoformat()
+        
+        # BEGIN IMMEDIATE: outro processo não reserva os mesmos e-mails entre o SELECT e o UPDATE
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute('''
+                SELECT * FROM email_outbox
+                WHERE (status = ? AND next_attempt_at <= ?)
+                   OR (status = ? AND updated_at <= ?)
+                ORDER BY next_attempt_at
+                LIMIT ?
+            ''', (EMAIL_PENDING, current_time, EMAIL_SENDING, lease_limit, limit))
+            rows = cursor.fetchall()
+            
+            if rows:
+                cursor.executemany('''
+                    UPDATE email_outbox
+                    SET status = ?, attempts = attempts + 1, updated_at = ?
+                    WHERE id = ?
+                ''', [(EMAIL_SENDING, current_time, row[0]) for row in rows])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        emails = [dict(zip(OUTBOX_COLUMNS, row)) for row in rows]
+        for email in emails:
+            email['status'] = EMAIL_SENDING
+            email['attempts'] += 1
+        return emails
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao reservar e-mails da outbox: {e}")
+        return []
+
+def mark_email_sent(email_id, sender=None):
+    """Marca um e-mail da outbox como enviado (sender: conta que fez o envio)"""
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        current_time = datetime.now().isoformat()
+        cursor.execute('''
+            UPDATE email_outbox
+            SET status = ?, sent_at = ?, updated_at = ?, last_error = NULL, sender = ?
+            WHERE id = ?
+        ''', (EMAIL_SENT, current_time, current_time, sender, email_id))
+        
+        conn.commit()
+        return True
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao marcar e-mail {email_id} como enviado: {e}")
+        return False
+
+def mark_email_failed(email_id, error, next_attempt_at=None, count_attempt=True):
+    """Registra a falha de envio: reagenda para next_attempt_at ou, sem ele, move para dead
+    
+    Com count_attempt=False (ex.: limite de envio do provedor), a tentativa contada por
+    claim_emails é devolvida e o reagendamento não consome EMAIL_MAX_TENTATIVAS.
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        status = EMAIL_PENDING if next_attempt_at else EMAIL_DEAD
+        next_attempt = next_attempt_at.isoformat() if next_attempt_at else None
+        cursor.execute('''
+            UPDATE email_outbox
+            SET status = ?, next_attempt_at = ?, last_error = ?, updated_at = ?,
+                attempts = CASE WHEN ? THEN attempts ELSE MAX(attempts - 1, 0) END
+            WHERE id = ?
+        ''', (status, next_attempt, str(error), datetime.now().isoformat(), count_attempt, email_id))
+        
+        conn.commit()
+        
+        if status == EMAIL_DEAD:
+            logger.error(f"E-mail {email_id} movido para dead letter: {error}")
+        return True
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao registrar falha do e-mail {email_id}: {e}")
+        return False
+
+def count_emails_sent_since(since, sender=None):
+    """Quantidade de e-mails enviados desde `since` (datetime), opcionalmente por uma conta"""
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        if sender is None:
+            cursor.execute('''
+                SELECT COUNT(*) FROM email_outbox WHERE status = ? AND sent_at >= ?
+            ''', (EMAIL_SENT, since.isoformat()))
+        else:
+            cursor.execute('''
+                SELECT COUNT(*) FROM email_outbox WHERE status = ? AND sent_at >= ? AND sender = ?
+            ''', (EMAIL_SENT, since.isoformat(), sender))
+        count = cursor.fetchone()[0]
+        
+        return count
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao contar e-mails enviados: {e}")
+        return 0
+
+def get_outbox_stats(latency_sample=100):
+    """Profundidade da outbox por status e latência (criação → envio) dos últimos e-mails enviados"""
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT status, COUNT(*) FROM email_outbox GROUP BY status')
+        by_status = {status: count for status, count in cursor.fetchall()}
+        
+        # Idade do e-mail mais antigo ainda não enviado
+        cursor.execute('''
+            SELECT MIN(created_at) FROM email_outbox WHERE status IN (?, ?)
+        ''', (EMAIL_PENDING, EMAIL_SENDING))
+        oldest = cursor.fetchone()[0]
+        
+        cursor.execute('''
+            SELECT (julianday(sent_at) - julianday(created_at)) * 86400.0
+            FROM email_outbox
+            WHERE status = ?
+            ORDER BY sent_at DESC
+            LIMIT ?
+        ''', (EMAIL_SENT, latency_sample))
+        latencies = sorted(row[0] for row in cursor.fetchall())
+        
+        oldest_age = (datetime.now() - datetime.fromisoformat(oldest)).total_seconds() if oldest else 0
+        
+        return {
+            'depth': by_status.get(EMAIL_PENDING, 0) + by_status.get(EMAIL_SENDING, 0),
+            'by_status': by_status,
+            'oldest_pending_seconds': oldest_age,
+            'latency_seconds': {
+                'sample': len(latencies),
+                'avg': sum(latencies) / len(latencies) if latencies else 0,
+                'p50': latencies[len(latencies) // 2] if latencies else 0,
+                'p95': latencies[int(len(latencies) * 0.95)] if latencies else 0,
+                'max': latencies[-1] if latencies else 0
+            }
+        }
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao buscar estatísticas da outbox: {e}")
+        return {
+            'depth': 0,
+            'by_status': {},
+            'oldest_pending_seconds': 0,
+            'latency_seconds': {}
+        }
+
+# Estados de uma notificação na inbox de webhooks
+WEBHOOK_PENDING = 'pending'
+WEBHOOK_PROCESSING = 'processing'
+WEBHOOK_DONE = 'done'
+WEBHOOK_DEAD = 'dead'
+# Coberta por outra notificação do mesmo pagamento (não gera consulta nem escrita próprias)
+WEBHOOK_COALESCED = 'coalesced'
+
+WEBHOOK_COLUMNS = ['id', 'topic', 'resource_id', 'payload', 'source', 'status', 'attempts',
+                   'next_attempt_at', 'last_error', 'received_at', 'updated_at', 'processed_at',
+                   'notifications']
+
+def enqueue_webhook(topic, resource_id, payload=None, source=None, delay_seconds=0):
+    """Grava uma notificação na inbox e retorna (id, coalescida) ou (None, False) em caso de erro
+    
+    Se já houver uma notificação pendente do mesmo recurso, a nova se junta a ela (coalescida):
+    o payload passa a ser o mais recente e continua havendo uma única consulta/escrita.
+    delay_seconds adia o processamento para juntar as notificações que chegam em rajada.
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        now = datetime.now()
+        current_time = now.isoformat()
+        next_attempt = (now + timedelta(seconds=delay_seconds)).isoformat()
+        cursor.execute('''
+            INSERT INTO webhook_inbox
+            (topic, resource_id, payload, source, status, attempts, next_attempt_at,
+             received_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?)
+            ON CONFLICT(topic, resource_id) WHERE status = 'pending' DO UPDATE SET
+                payload = excluded.payload,
+                source = excluded.source,
+                notifications = notifications + 1,
+                next_attempt_at = MIN(next_attempt_at, excluded.next_attempt_at),
+                updated_at = excluded.updated_at
+            RETURNING id, notifications
+        ''', (topic, str(resource_id), payload, source, WEBHOOK_PENDING,
+              next_attempt, current_time, current_time))
+        webhook_id, notifications = cursor.fetchone()
+        
+        conn.commit()
+        return webhook_id, notifications > 1
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao gravar notificação {topic} {resource_id} na inbox: {e}")
+        return None, False
+
+def claim_webhooks(limit=20, lease_seconds=120):
+    """Reserva até `limit` notificações prontas para processamento (status processing)
+    
+    Notificações presas em processing há mais de lease_seconds voltam a ser elegíveis.
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        now = datetime.now()
+        current_time = now.isoformat()
+        lease_limit = (now - timedelta(seconds=lease_seconds)).isoformat()
+        
+        # BEGIN IMMEDIATE: outro worker não reserva as mesmas notificações entre o SELECT e o UPDATE
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute('''
+                SELECT * FROM webhook_inbox
+                WHERE (status = ? AND next_attempt_at <= ?)
+                   OR (status = ? AND updated_at <= ?)
+                ORDER BY next_attempt_at
+                LIMIT ?
+            ''', (WEBHOOK_PENDING, current_time, WEBHOOK_PROCESSING, lease_limit, limit))
+            rows = cursor.fetchall()
+            
+            if rows:
+                cursor.executemany('''
+                    UPDATE webhook_inbox
+                    SET status = ?, attempts = attempts + 1, updated_at = ?
+                    WHERE id = ?
+                ''', [(WEBHOOK_PROCESSING, current_time, row[0]) for row in rows])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        notifications = [dict(zip(WEBHOOK_COLUMNS, row)) for row in rows]
+        for notification in notifications:
+            notification['status'] = WEBHOOK_PROCESSING
+            notification['attempts'] += 1
+        return notifications
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao reservar notificações da inbox: {e}")
+        return []
+
+def mark_webhook_done(webhook_id, fetched_at=None):
+    """Marca a notificação como processada e retorna quantas pendentes ela cobriu (None em caso de erro)
+    
+    fetched_at: início da consulta ao Mercado Pago. Notificações pendentes do mesmo recurso
+    recebidas (ou coalescidas pela última vez) até esse momento já estão refletidas na consulta
+    e são marcadas como coalesced.
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        current_time = datetime.now().isoformat()
+        cursor.execute('''
+            UPDATE webhook_inbox
+            SET status = ?, last_error = NULL, updated_at = ?, processed_at = ?
+            WHERE id = ?
+        ''', (WEBHOOK_DONE, current_time, current_time, webhook_id))
+        
+        covered = 0
+        if fetched_at:
+            cursor.execute('''
+                UPDATE webhook_inbox
+                SET status = ?, updated_at = ?, processed_at = ?
+                WHERE status = ? AND updated_at <= ? AND (topic, resource_id) = (
+                    SELECT topic, resource_id FROM webhook_inbox WHERE id = ?
+                )
+            ''', (WEBHOOK_COALESCED, current_time, current_time, WEBHOOK_PENDING,
+                  fetched_at.isoformat(), webhook_id))
+            covered = cursor.rowcount
+        
+        conn.commit()
+        return covered
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao marcar notificação {webhook_id} como processada: {e}")
+        return None
+
+def mark_webhook_failed(webhook_id, error, next_attempt_at=None, count_attempt=True):
+    """Registra a falha: reagenda para next_attempt_at ou, sem ele, move para dead
+    
+    Com count_attempt=False (ex.: circuito do Mercado Pago aberto), a tentativa contada por
+    claim_webhooks é devolvida e o reagendamento não consome WEBHOOK_MAX_TENTATIVAS.
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        status = WEBHOOK_PENDING if next_attempt_at else WEBHOOK_DEAD
+        next_attempt = next_attempt_at.isoformat() if next_attempt_at else None
+        # Se chegou outra notificação do mesmo recurso durante a tentativa, ela já está pendente
+        # e fará a nova consulta: esta é coalescida em vez de voltar para a fila
+        cursor.execute('''
+            UPDATE webhook_inbox
+            SET status = CASE WHEN ? = ? AND EXISTS (
+                    SELECT 1 FROM webhook_inbox AS other
+                    WHERE other.topic = webhook_inbox.topic AND other.resource_id = webhook_inbox.resource_id
+                      AND other.status = ? AND other.id != webhook_inbox.id
+                ) THEN ? ELSE ? END,
+                next_attempt_at = ?, last_error = ?, updated_at = ?,
+                attempts = CASE WHEN ? THEN attempts ELSE MAX(attempts - 1, 0) END
+            WHERE id = ?
+        ''', (status, WEBHOOK_PENDING, WEBHOOK_PENDING, WEBHOOK_COALESCED, status,
+              next_attempt, str(error), datetime.now().isoformat(), count_attempt, webhook_id))
+        
+        conn.commit()
+        
+        if status == WEBHOOK_DEAD:
+            logger.error(f"Notificação {webhook_id} movida para dead letter: {error}")
+        return True
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao registrar falha da notificação {webhook_id}: {e}")
+        return False
+
+def get_webhook_inbox_stats(latency_sample=100):
+    """Profundidade da inbox por status e latência (recebimento → processamento) das últimas notificações"""
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT status, COUNT(*), SUM(notifications) FROM webhook_inbox GROUP BY status')
+        rows = cursor.fetchall()
+        by_status = {status: count for status, count, _ in rows}
+        notifications = sum(total for _, _, total in rows)
+        # Cada linha done/dead custou uma consulta ao MP; as demais notificações foram coalescidas
+        fetches = by_status.get(WEBHOOK_DONE, 0) + by_status.get(WEBHOOK_DEAD, 0)
+        finished = sum(total for status, _, total in rows if status in (WEBHOOK_DONE, WEBHOOK_DEAD, WEBHOOK_COALESCED))
+        
+        cursor.execute('''
+            SELECT MIN(received_at) FROM webhook_inbox WHERE status IN (?, ?)
+        ''', (WEBHOOK_PENDING, WEBHOOK_PROCESSING))
+        oldest = cursor.fetchone()[0]
+        
+        cursor.execute('''
+            SELECT (julianday(processed_at) - julianday(received_at)) * 86400.0
+            FROM webhook_inbox
+            WHERE status = ?
+            ORDER BY processed_at DESC
+            LIMIT ?
+        ''', (WEBHOOK_DONE, latency_sample))
+        latencies = sorted(row[0] for row in cursor.fetchall())
+        
+        oldest_age = (datetime.now() - datetime.fromisoformat(oldest)).total_seconds() if oldest else 0
+        
+        return {
+            'depth': by_status.get(WEBHOOK_PENDING, 0) + by_status.get(WEBHOOK_PROCESSING, 0),
+            'by_status': by_status,
+            'notifications': notifications,
+            'coalesced_rate': 1 - fetches / finished if finished else 0,
+            'oldest_pending_seconds': oldest_age,
+            'latency_seconds': {
+                'sample': len(latencies),
+                'avg': sum(latencies) / len(latencies) if latencies else 0,
+                'p50': latencies[len(latencies) // 2] if latencies else 0,
+                'p95': latencies[int(len(latencies) * 0.95)] if latencies else 0,
+                'max': latencies[-1] if latencies else 0
+            }
+        }
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao buscar estatísticas da inbox de webhooks: {e}")
+        return {
+            'depth': 0,
+            'by_status': {},
+            'notifications': 0,
+            'coalesced_rate': 0,
+            'oldest_pending_seconds': 0,
+            'latency_seconds': {}
+        }
+
+ASSESSMENT_COLUMNS = ['id', 'name', 'email', 'score', 'tier', 'pdf_key', 'pdf_url',
+                      'created_at', 'digest_sent_at', 'report_data']
+
+def save_assessment(name, email, score, tier, pdf_key=None, pdf_url=None, report_data=None):
+    """Registra uma avaliação concluída e retorna seu id (None em caso de erro)
+    
+    report_data: dados para gerar o PDF de novo (respostas e dados pessoais), guardados aqui
+    para que os links de relatório carreguem só a chave do PDF.
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT INTO assessments (name, email, score, tier, pdf_key, pdf_url, created_at, report_data)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (name, email, score, tier, pdf_key, pdf_url, datetime.now().isoformat(),
+              json.dumps(report_data, ensure_ascii=False) if report_data is not None else None))
+        assessment_id = cursor.lastrowid
+        
+        conn.commit()
+        return assessment_id
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao registrar avaliação: {e}")
+        return None
+
+def get_assessment_report(pdf_key):
+    """Dados para gerar o PDF de uma avaliação (report_data da mais recente com a chave) ou None"""
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT report_data FROM assessments
+            WHERE pdf_key = ? AND report_data IS NOT NULL
+            ORDER BY id DESC
+            LIMIT 1
+        ''', (pdf_key,))
+        row = cursor.fetchone()
+        
+        return json.loads(row[0]) if row else None
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao buscar dados do relatório {pdf_key}: {e}")
+        return None
+
+def purge_report_data(older_than_days):
+    """Apaga report_data das avaliações com mais de older_than_days dias e retorna quantas foram limpas
+    
+    Os links de relatório expiram nesse prazo: depois dele, respostas e dados pessoais não
+    precisam mais ficar no servidor.
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+        cursor.execute('''
+            UPDATE assessments SET report_data = NULL
+            WHERE report_data IS NOT NULL AND created_at < ?
+        ''', (cutoff,))
+        purged = cursor.rowcount
+        
+        conn.commit()
+        return purged
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao apagar dados de relatórios expirados: {e}")
+        return 0
+
+def get_assessments_pending_digest(limit=1000):
+    """Avaliações ainda não incluídas em um resumo, das mais antigas para as mais recentes"""
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT * FROM assessments
+            WHERE digest_sent_at IS NULL
+            ORDER BY created_at, id
+            LIMIT ?
+        ''', (limit,))
+        rows = cursor.fetchall()
+        
+        return [dict(zip(ASSESSMENT_COLUMNS, row)) for row in rows]
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao buscar avaliações para o resumo: {e}")
+        return []
+
+def mark_assessments_digested(assessment_ids):
+    """Marca as avaliações como incluídas no resumo"""
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        current_time = datetime.now().isoformat()
+        cursor.executemany('''
+            UPDATE assessments SET digest_sent_at = ? WHERE id = ?
+        ''', [(current_time, assessment_id) for assessment_id in assessment_ids])
+        
+        conn.commit()
+        return True
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao marcar avaliações do resumo: {e}")
+        return False
+
+JOB_COLUMNS = ['id', 'status', 'etapa', 'resultado', 'erro', 'created_at', 'updated_at', 'finished_at']
+
+# Campos que update_job_record pode alterar
+JOB_UPDATABLE = ('status', 'etapa', 'resultado', 'erro', 'finished_at')
+
+def create_job(job_id, status):
+    """Registra um job de segundo plano; retorna True se gravado"""
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        current_time = datetime.now().isoformat()
+        cursor.execute('''
+            INSERT INTO jobs (id, status, created_at, updated_at)
+            VALUES (?, ?, ?, ?)
+        ''', (job_id, status, current_time, current_time))
+        
+        conn.commit()
+        return True
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao registrar job {job_id}: {e}")
+        return False
+
+def update_job_record(job_id, fields):
+    """Atualiza os campos de um job (resultado é gravado como JSON); retorna True se o job existe"""
+    try:
+        fields = {campo: valor for campo, valor in fields.items() if campo in JOB_UPDATABLE}
+        if 'resultado' in fields:
+            fields['resultado'] = json.dumps(fields['resultado'])
+        fields['updated_at'] = datetime.now().isoformat()
+        
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        assignments = ', '.join(f"{campo} = ?" for campo in fields)
+        cursor.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+        updated = cursor.rowcount > 0
+        
+        conn.commit()
+        return updated
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao atualizar job {job_id}: {e}")
+        return False
+
+def get_job_record(job_id):
+    """Retorna o job como dicionário ou None se não existir"""
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(f'SELECT {", ".join(JOB_COLUMNS)} FROM jobs WHERE id = ?', (job_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        
+        job = dict(zip(JOB_COLUMNS, row))
+        job['resultado'] = json.loads(job['resultado']) if job['resultado'] else None
+        return job
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao buscar job {job_id}: {e}")
+        return None
+
+def purge_finished_jobs(older_than_seconds):
+    """Apaga os jobs finalizados há mais de older_than_seconds e retorna quantos foram apagados"""
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cutoff = (datetime.now() - timedelta(seconds=older_than_seconds)).isoformat()
+        cursor.execute('DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?', (cutoff,))
+        purged = cursor.rowcount
+        
+        conn.commit()
+        return purged
+        
+    except Exception as e:
+        rollback_connection()
+        logger.error(f"Erro ao apagar jobs expirados: {e}")
+        return 0
+
+if __name__ == '__main__':
+    # python database.py rebuild-stats: confere e recalcula transaction_stats e transaction_rollups
+    import sys
+    
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] == ['rebuild-stats']:
+        init_database()
+        drift = rebuild_transaction_stats()
+        rollup_drift = rebuild_transaction_rollups()
+        if drift is None or rollup_drift is None:
+            sys.exit(1)
+        for status, values in sorted(drift.items()):
+            print(f"{status}: esperado {values['expected']}, encontrado {values['found']}")
+        print(f"{len(drift)} status divergente(s) corrigido(s)")
+        print(f"{rollup_drift} linha(s) de agregados por período divergente(s) corrigida(s)")
+    else:
+        print("Uso: python database.py rebuild-stats")
+        sys.exit(2)
@@ -0,0 +1,255 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from database import enqueue_webhook, claim_webhooks, mark_webhook_done, mark_webhook_failed, save_transaction
+from cliente_mp import CircuitoAberto, tempo_circuito_aberto
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Notificações reservadas da inbox a cada rodada e consultas simultâneas ao Mercado Pago
+WEBHOOK_LOTE = int(os.getenv('WEBHOOK_LOTE', 20))
+WEBHOOK_RESOLVEDORES = int(os.getenv('WEBHOOK_RESOLVEDORES', 2))
+
+# Tentativas antes de mover a notificação para dead letter
+WEBHOOK_MAX_TENTATIVAS = int(os.getenv('WEBHOOK_MAX_TENTATIVAS', 8))
+
+# Backoff exponencial entre tentativas: base * 2^(tentativa-1), limitado ao máximo (segundos)
+WEBHOOK_BACKOFF_BASE = int(os.getenv('WEBHOOK_BACKOFF_BASE', 10))
+WEBHOOK_BACKOFF_MAX = int(os.getenv('WEBHOOK_BACKOFF_MAX', 1800))
+
+# Intervalo (segundos) entre consultas à inbox quando ela está vazia
+WEBHOOK_INTERVALO_POLL = int(os.getenv('WEBHOOK_INTERVALO_POLL', 5))
+
+# Espera (segundos) antes de consultar o pagamento, para juntar payment.created/payment.updated
+# e reenvios que chegam em rajada numa única consulta e escrita
+WEBHOOK_JANELA_COALESCENCIA = float(os.getenv('WEBHOOK_JANELA_COALESCENCIA', 2))
+
+# Notificações já gravadas, lembradas por processo para descartar reenvios idênticos
+WEBHOOK_DEDUP_TTL = int(os.getenv('WEBHOOK_DEDUP_TTL', 600))
+WEBHOOK_DEDUP_MAX = int(os.getenv('WEBHOOK_DEDUP_MAX', 10000))
+
+# Resultados de receber_notificacao
+RECEBIDA = 'received'
+DUPLICADA = 'duplicate'
+IGNORADA = 'ignored'
+ERRO = 'error'
+
+_acordar = threading.Event()
+_thread = None
+_lock = threading.Lock()
+_buscar_pagamento = None
+
+# chave da notificação -> momento (monotonic) em que foi gravada, da mais antiga para a mais recente
+_vistas = OrderedDict()
+
+_contadores = {
+    'recebidas': 0,
+    'duplicadas': 0,
+    'coalescidas': 0,
+    'cobertas': 0,
+    'ignoradas': 0,
+    'invalidas': 0,
+    'processadas': 0,
+    'aprovadas': 0,
+    'falhas': 0,
+    'dead': 0,
+    'tempo_consulta_total': 0.0,
+    'tempo_consulta_max': 0.0
+}
+
+def _incrementar(contador, valor=1):
+    with _lock:
+        _contadores[contador] += valor
+
+def extrair_notificacao(dados, parametros):
+    """(tópico, id do recurso) de uma notificação do Mercado Pago ou None se malformada
+
+    Aceita o formato Webhooks (JSON com type e data.id) e o IPN (topic e id na query string
+    ou em resource).
+    """
+    dados = dados if isinstance(dados, dict) else {}
+    topico = dados.get('type') or dados.get('topic') or parametros.get('type') or parametros.get('topic')
+
+    recurso = dados['data'].get('id') if isinstance(dados.get('data'), dict) else None
+    recurso = (recurso or parametros.get('data.id') or parametros.get('id')
+               or str(dados.get('resource') or '').rstrip('/').rsplit('/', 1)[-1])
+
+    if not topico or not str(recurso).isdigit():
+        return None
+    return str(topico), str(recurso)
+
+def _chave_notificacao(dados, topico, recurso):
+    """Identidade de uma notificação no formato Webhooks (o id se repete nos reenvios); None no IPN"""
+    if isinstance(dados, dict) and dados.get('id') is not None:
+        return f"{topico}:{recurso}:{dados['id']}"
+    return None
+
+def _ja_vista(chave):
+    """Notificação gravada há menos de WEBHOOK_DEDUP_TTL segundos por este processo"""
+    agora = time.monotonic()
+    with _lock:
+        while _vistas and next(iter(_vistas.values())) < agora - WEBHOOK_DEDUP_TTL:
+            _vistas.popitem(last=False)
+        return chave in _vistas
+
+def _lembrar(chave):
+    with _lock:
+        _vistas[chave] = time.monotonic()
+        _vistas.move_to_end(chave)
+        while len(_vistas) > WEBHOOK_DEDUP_MAX:
+            _vistas.popitem(last=False)
+
+def receber_notificacao(dados, parametros, origem):
+    """Valida a notificação, grava as de pagamento na inbox e acorda o resolvedor
+
+    Retorna (RECEBIDA, id), (DUPLICADA, None) para reenvios já gravados por este processo,
+    (IGNORADA, None) para outros tópicos ou notificações sem tópico/id reconhecível (respondidas
+    com 2xx para o Mercado Pago não reenviá-las) ou (ERRO, None) se a inbox não pôde ser
+    gravada (o Mercado Pago deve reenviar).
+
+    Entre processos, a deduplicação fica na inbox: notificações do mesmo pagamento ainda
+    pendentes são coalescidas numa única linha (database.enqueue_webhook).
+    """
+    notificacao = extrair_notificacao(dados, parametros)
+    if notificacao is None:
+        _incrementar('invalidas')
+        return IGNORADA, None
+
+    topico, recurso = notificacao
+    if topico != 'payment':
+        _incrementar('ignoradas')
+        return IGNORADA, None
+
+    _incrementar('recebidas')
+    chave = _chave_notificacao(dados, topico, recurso)
+    if chave and _ja_vista(chave):
+        _incrementar('duplicadas')
+        return DUPLICADA, None
+
+    payload = json.dumps(dados if dados else dict(parametros), ensure_ascii=False)
+    webhook_id, coalescida = enqueue_webhook(topico, recurso, payload, origem, WEBHOOK_JANELA_COALESCENCIA)
+    if webhook_id is None:
+        return ERRO, None
+
+    if chave:
+        _lembrar(chave)
+    if coalescida:
+        _incrementar('coalescidas')
+    elif WEBHOOK_JANELA_COALESCENCIA <= 0:
+        _acordar.set()
+    return RECEBIDA, webhook_id
+
+def calcular_proxima_tentativa(tentativas):
+    """Momento da próxima tentativa (backoff exponencial) ou None se as tentativas acabaram"""
+    if tentativas >= WEBHOOK_MAX_TENTATIVAS:
+        return None
+    espera = min(WEBHOOK_BACKOFF_BASE * 2 ** (tentativas - 1), WEBHOOK_BACKOFF_MAX)
+    return datetime.now() + timedelta(seconds=espera)
+
+def _registrar_pagamento(pagamento):
+    """Acesso premium: o pagamento aprovado fica registrado em transactions (status e external_reference)"""
+    external_reference = pagamento.get('external_reference', '')
+    if pagamento.get('status') == 'approved':
+        _incrementar('aprovadas')
+        logger.info(f"✅ Pagamento APROVADO - Ref: {external_reference}, Payment ID: {pagamento.get('id')}")
+    else:
+        logger.info(f"Pagamento {pagamento.get('id')} com status {pagamento.get('status')} - Ref: {external_reference}")
+
+def _resolver(notificacao):
+    """Consulta o pagamento no Mercado Pago, salva a transação e marca a notificação como processada"""
+    payment_id = notificacao['resource_id']
+    inicio = time.monotonic()
+    consultado_em = datetime.now()
+    try:
+        payment_info = _buscar_pagamento(payment_id)
+        if payment_info["status"] != 200:
+            raise RuntimeError(f"Mercado Pago respondeu {payment_info['status']}: {payment_info.get('response')}")
+        payment = payment_info["response"]
+
+        webhook_data = json.loads(notificacao['payload']) if notificacao['payload'] else None
+        if not save_transaction(payment, webhook_data):
+            raise RuntimeError(f"Erro ao salvar transação {payment_id}")
+    except CircuitoAberto as e:
+        # Mercado Pago fora do ar não conta como falha da notificação: volta quando o circuito reabrir
+        mark_webhook_failed(notificacao['id'], e, datetime.now() + timedelta(seconds=e.segundos), count_attempt=False)
+        return False
+    except Exception as e:
+        proxima = calcular_proxima_tentativa(notificacao['attempts'])
+        mark_webhook_failed(notificacao['id'], e, proxima)
+        _incrementar('falhas')
+        if proxima:
+            logger.warning(f"Falha ao processar notificação {notificacao['id']} do pagamento {payment_id} "
+                           f"(tentativa {notificacao['attempts']}), nova tentativa em {proxima.isoformat()}: {e}")
+        else:
+            _incrementar('dead')
+        return False
+
+    duracao = time.monotonic() - inicio
+    # Notificações do mesmo pagamento que chegaram antes da consulta já estão refletidas nela
+    cobertas = mark_webhook_done(notificacao['id'], consultado_em) or 0
+    with _lock:
+        _contadores['cobertas'] += cobertas
+        _contadores['processadas'] += 1
+        _contadores['tempo_consulta_total'] += duracao
+        _contadores['tempo_consulta_max'] = max(_contadores['tempo_consulta_max'], duracao)
+    _registrar_pagamento(payment)
+    return True
+
+def _loop_resolvedor():
+    """Reserva notificações da inbox e as resolve em paralelo"""
+    # Com janela de coalescência, a notificação só fica pronta depois dela: consultar nesse ritmo
+    intervalo = min(WEBHOOK_INTERVALO_POLL, WEBHOOK_JANELA_COALESCENCIA) if WEBHOOK_JANELA_COALESCENCIA > 0 else WEBHOOK_INTERVALO_POLL
+    with ThreadPoolExecutor(max_workers=WEBHOOK_RESOLVEDORES, thread_name_prefix='resolvedor') as executor:
+        while True:
+            # Circuito aberto: não reservar notificações que falhariam na hora
+            espera = tempo_circuito_aberto()
+            if espera:
+                time.sleep(min(espera, WEBHOOK_INTERVALO_POLL))
+                continue
+            try:
+                notificacoes = claim_webhooks(WEBHOOK_LOTE)
+                if notificacoes:
+                    list(executor.map(_resolver, notificacoes))
+                    continue
+            except Exception as e:
+                logger.error(f"Erro no resolvedor de webhooks: {e}", exc_info=True)
+
+            _acordar.wait(intervalo)
+            _acordar.clear()
+
+def iniciar_resolvedor(buscar_pagamento):
+    """Inicia a thread do resolvedor (uma por processo)
+
+    buscar_pagamento(payment_id) deve retornar a resposta do SDK ({'status': ..., 'response': ...}).
+    """
+    global _thread, _buscar_pagamento
+    with _lock:
+        _buscar_pagamento = buscar_pagamento
+        if _thread is not None and _thread.is_alive():
+            return
+        _thread = threading.Thread(target=_loop_resolvedor, name='resolvedor-webhook', daemon=True)
+        _thread.start()
+    logger.info(f"Resolvedor de webhooks iniciado (lotes de {WEBHOOK_LOTE}, {WEBHOOK_RESOLVEDORES} consultas simultâneas)")
+
+def get_resolvedor_stats():
+    """Contadores do resolvedor deste processo (tempo de consulta ao Mercado Pago por notificação)
+
+    taxa_deduplicacao: fração das notificações de pagamento recebidas que não geraram consulta
+    própria (reenvios descartados em memória, coalescidas na inbox ou cobertas por uma consulta).
+    """
+    with _lock:
+        stats = dict(_contadores)
+        stats['dedup_cache'] = len(_vistas)
+    processadas = stats['processadas']
+    stats['tempo_consulta_medio'] = stats['tempo_consulta_total'] / processadas if processadas else 0
+    evitadas = stats['duplicadas'] + stats['coalescidas'] + stats['cobertas']
+    stats['taxa_deduplicacao'] = evitadas / stats['recebidas'] if stats['recebidas'] else 0
+    stats['ativo'] = _thread is not None and _thread.is_alive()
+    return stats
@@ -0,0 +1,60 @@
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from database import create_job, update_job_record, get_job_record, purge_finished_jobs
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Número de threads que processam PDF/e-mail em segundo plano
+JOBS_MAX_WORKERS = int(os.getenv('JOBS_MAX_WORKERS', 4))
+
+# Tempo (em segundos) que um job finalizado permanece consultável
+JOBS_TTL_SEGUNDOS = int(os.getenv('JOBS_TTL_SEGUNDOS', 3600))
+
+# Estados possíveis de um job
+STATUS_NA_FILA = 'na_fila'
+STATUS_PROCESSANDO = 'processando'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_ERRO = 'erro'
+
+# Os jobs rodam no processo que os recebeu; o estado fica no banco (tabela jobs), então
+# /jobs/<id> funciona em qualquer worker gunicorn
+_executor = ThreadPoolExecutor(max_workers=JOBS_MAX_WORKERS, thread_name_prefix='job')
+
+def update_job(job_id, **campos):
+    """Atualiza os campos de um job (status, etapa, resultado...)"""
+    if campos.get('status') in (STATUS_CONCLUIDO, STATUS_ERRO):
+        campos['finished_at'] = datetime.now().isoformat()
+    update_job_record(job_id, campos)
+
+def _executar_job(job_id, func, args, kwargs):
+    """Executa a função do job registrando início, fim e erros"""
+    update_job(job_id, status=STATUS_PROCESSANDO)
+    try:
+        resultado = func(job_id, *args, **kwargs)
+        update_job(job_id, status=STATUS_CONCLUIDO, etapa='finalizado', resultado=resultado)
+    except Exception as e:
+        logger.error(f"Erro no job {job_id}: {e}", exc_info=True)
+        update_job(job_id, status=STATUS_ERRO, erro=str(e))
+
+def submit_job(func, *args, **kwargs):
+    """Enfileira func(job_id, *args, **kwargs) no pool de segundo plano e retorna o job_id"""
+    job_id = uuid.uuid4().hex
+
+    # Jobs finalizados há mais de JOBS_TTL_SEGUNDOS deixam de ser consultáveis
+    purge_finished_jobs(JOBS_TTL_SEGUNDOS)
+    if not create_job(job_id, STATUS_NA_FILA):
+        # O trabalho (PDF/e-mail) segue mesmo sem registro; só a consulta do progresso fica indisponível
+        logger.warning(f"Job {job_id} sem registro no banco: /jobs/{job_id} responderá 404")
+
+    _executor.submit(_executar_job, job_id, func, args, kwargs)
+    logger.info(f"Job {job_id} enfileirado")
+    return job_id
+
+def get_job(job_id):
+    """Retorna uma cópia serializável do job ou None se não existir"""
+    return get_job_record(job_id)
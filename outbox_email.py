@@ -0,0 +1,208 @@
+import logging
+import os
+import smtplib
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.mime.base import MIMEBase
+from email import encoders
+
+from database import enqueue_email, claim_emails, mark_email_sent, mark_email_failed
+from pool_smtp import enviar_mensagem, MAIL_MAX_CONEXOES
+from agendador_email import (
+    MAIL_PAUSA_LIMITE,
+    aguardar_envio,
+    envios_disponiveis,
+    tempo_ate_proximo_envio,
+    registrar_limite_atingido,
+    registrar_espera_fila
+)
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Diretório dos PDFs aguardando envio (removidos após o envio)
+EMAIL_OUTBOX_DIR = os.getenv('EMAIL_OUTBOX_DIR', os.path.join(os.path.dirname(__file__), 'outbox_email'))
+
+# E-mails reservados da outbox a cada rodada do remetente
+EMAIL_LOTE_ENVIO = int(os.getenv('EMAIL_LOTE_ENVIO', 20))
+
+# Tentativas antes de mover o e-mail para dead letter
+EMAIL_MAX_TENTATIVAS = int(os.getenv('EMAIL_MAX_TENTATIVAS', 6))
+
+# Backoff exponencial entre tentativas: base * 2^(tentativa-1), limitado ao máximo (segundos)
+EMAIL_BACKOFF_BASE = int(os.getenv('EMAIL_BACKOFF_BASE', 30))
+EMAIL_BACKOFF_MAX = int(os.getenv('EMAIL_BACKOFF_MAX', 3600))
+
+# Intervalo (segundos) entre consultas à outbox quando ela está vazia
+EMAIL_INTERVALO_POLL = int(os.getenv('EMAIL_INTERVALO_POLL', 5))
+
+_acordar = threading.Event()
+_thread = None
+_lock = threading.Lock()
+
+_contadores = {
+    'enviados': 0,
+    'falhas': 0,
+    'dead': 0,
+    'tempo_envio_total': 0.0,
+    'tempo_envio_max': 0.0
+}
+
+def _gravar_pdf(pdf_bytes):
+    """Grava o PDF a ser anexado e retorna o caminho"""
+    os.makedirs(EMAIL_OUTBOX_DIR, exist_ok=True)
+    caminho = os.path.join(EMAIL_OUTBOX_DIR, f"{uuid.uuid4().hex}.pdf")
+    with open(caminho, 'wb') as f:
+        f.write(pdf_bytes)
+    return caminho
+
+def enfileirar_email(destinatario, assunto, corpo_html, pdf_bytes=None, nome_anexo=None):
+    """Grava o e-mail (e o PDF anexo) na outbox e acorda o remetente; retorna o id ou None"""
+    try:
+        pdf_path = _gravar_pdf(pdf_bytes) if pdf_bytes else None
+    except OSError as e:
+        logger.error(f"Erro ao gravar PDF da outbox: {e}")
+        return None
+
+    email_id = enqueue_email(destinatario, assunto, corpo_html, pdf_path, nome_anexo)
+    if email_id is None and pdf_path:
+        _remover_pdf(pdf_path)
+    else:
+        _acordar.set()
+    return email_id
+
+def _remover_pdf(pdf_path):
+    try:
+        os.remove(pdf_path)
+    except OSError:
+        pass
+
+def montar_mensagem(email, conta):
+    """Monta a mensagem MIME de um registro da outbox, tendo a conta remetente no From"""
+    msg = MIMEMultipart()
+    msg['From'] = f"Método Faça Bem <{conta['usuario']}>"
+    msg['To'] = email['recipient']
+    msg['Subject'] = email['subject']
+
+    # --- Ajuste de encoding UTF-8 para evitar erros com acentos ---
+    html_part = MIMEText(email['body_html'], 'html', 'utf-8')
+    html_part.replace_header('Content-Type', 'text/html; charset="utf-8"')
+    msg.attach(html_part)
+
+    # Anexar PDF
+    if email['pdf_path']:
+        with open(email['pdf_path'], 'rb') as f:
+            pdf_bytes = f.read()
+        part = MIMEBase('application', 'octet-stream')
+        part.set_payload(pdf_bytes)
+        encoders.encode_base64(part)
+        part.add_header(
+            'Content-Disposition',
+            f'attachment; filename="{email["attachment_name"] or "Relatorio_Competencias.pdf"}"'
+        )
+        msg.attach(part)
+
+    return msg
+
+def calcular_proxima_tentativa(tentativas):
+    """Momento da próxima tentativa (backoff exponencial) ou None se as tentativas acabaram"""
+    if tentativas >= EMAIL_MAX_TENTATIVAS:
+        return None
+    espera = min(EMAIL_BACKOFF_BASE * 2 ** (tentativas - 1), EMAIL_BACKOFF_MAX)
+    return datetime.now() + timedelta(seconds=espera)
+
+def _incrementar(contador, valor=1):
+    with _lock:
+        _contadores[contador] += valor
+
+def _limite_do_provedor(erro):
+    """Recusa temporária do servidor (4xx) ou recusa que cita limite/cota de envio"""
+    if not isinstance(erro, smtplib.SMTPResponseException):
+        return False
+    mensagem = erro.smtp_error.decode('utf-8', 'replace') if isinstance(erro.smtp_error, bytes) else str(erro.smtp_error)
+    return 400 <= erro.smtp_code < 500 or any(termo in mensagem.lower() for termo in ('limit', 'quota', 'unusual'))
+
+def _enviar(email):
+    """Envia um e-mail reservado (dentro da cota de alguma conta) e registra o resultado na outbox"""
+    conta = aguardar_envio()
+    pronto_desde = datetime.fromisoformat(email['next_attempt_at'] or email['created_at'])
+    registrar_espera_fila((datetime.now() - pronto_desde).total_seconds())
+
+    inicio = time.monotonic()
+    try:
+        enviar_mensagem(montar_mensagem(email, conta), conta)
+    except Exception as e:
+        if _limite_do_provedor(e):
+            # Excesso de envios não conta como tentativa perdida: o e-mail volta após a pausa da conta
+            registrar_limite_atingido(conta['usuario'])
+            mark_email_failed(email['id'], e, datetime.now() + timedelta(seconds=MAIL_PAUSA_LIMITE), count_attempt=False)
+            _incrementar('falhas')
+            return False
+
+        proxima = calcular_proxima_tentativa(email['attempts'])
+        mark_email_failed(email['id'], e, proxima)
+        _incrementar('falhas')
+        if proxima:
+            logger.warning(f"Falha no envio do e-mail {email['id']} para {email['recipient']} "
+                           f"(tentativa {email['attempts']}), nova tentativa em {proxima.isoformat()}: {e}")
+        else:
+            # Dead letter não será reenviado: o PDF anexo não precisa mais ficar na outbox
+            _incrementar('dead')
+            if email['pdf_path']:
+                _remover_pdf(email['pdf_path'])
+        return False
+
+    duracao = time.monotonic() - inicio
+    mark_email_sent(email['id'], conta['usuario'])
+    if email['pdf_path']:
+        _remover_pdf(email['pdf_path'])
+    with _lock:
+        _contadores['enviados'] += 1
+        _contadores['tempo_envio_total'] += duracao
+        _contadores['tempo_envio_max'] = max(_contadores['tempo_envio_max'], duracao)
+    logger.info(f"E-mail {email['id']} enviado com sucesso para: {email['recipient']} via {conta['usuario']} ({duracao:.2f}s)")
+    return True
+
+def _loop_remetente():
+    """Reserva da outbox só o que cabe nas cotas de envio e envia pelas sessões do pool SMTP"""
+    with ThreadPoolExecutor(max_workers=MAIL_MAX_CONEXOES, thread_name_prefix='remetente') as executor:
+        while True:
+            try:
+                # Picos viram fila: sem cota, os e-mails continuam pending em vez de falhar no provedor
+                disponiveis = envios_disponiveis()
+                if disponiveis == 0:
+                    time.sleep(min(max(tempo_ate_proximo_envio(), 0.05), EMAIL_INTERVALO_POLL))
+                    continue
+                emails = claim_emails(min(EMAIL_LOTE_ENVIO, disponiveis))
+                if emails:
+                    list(executor.map(_enviar, emails))
+                    continue
+            except Exception as e:
+                logger.error(f"Erro no remetente de e-mails: {e}", exc_info=True)
+
+            _acordar.wait(EMAIL_INTERVALO_POLL)
+            _acordar.clear()
+
+def iniciar_remetente():
+    """Inicia a thread do remetente (uma por processo)"""
+    global _thread
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _thread = threading.Thread(target=_loop_remetente, name='remetente-email', daemon=True)
+        _thread.start()
+    logger.info(f"Remetente de e-mails iniciado (lotes de {EMAIL_LOTE_ENVIO}, {MAIL_MAX_CONEXOES} sessões SMTP)")
+
+def get_remetente_stats():
+    """Contadores do remetente deste processo (tempo de envio SMTP por e-mail)"""
+    with _lock:
+        stats = dict(_contadores)
+    enviados = stats['enviados']
+    stats['tempo_envio_medio'] = stats['tempo_envio_total'] / enviados if enviados else 0
+    stats['ativo'] = _thread is not None and _thread.is_alive()
+    return stats
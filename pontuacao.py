@@ -0,0 +1,194 @@
+import logging
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Mapeamento das 50 competências individuais
+COMPETENCIAS_MAPEAMENTO = {
+    # Comunicação (c1)
+    'c1_q1': 'Escuta ativa e empática',
+    'c1_q2': 'Comunicação não-violenta',
+    'c1_q3': 'Curiosidade genuína',
+    'c1_q4': 'Adaptação da linguagem',
+    'c1_q5': 'Clareza na transmissão',
+    'c1_q6': 'Busca por feedback',
+    'c1_q7': 'Linguagem corporal adequada',
+    'c1_q8': 'Mediação de conflitos',
+    'c1_q9': 'Comunicação assertiva',
+    'c1_q10': 'Reconhecimento de sucessos',
+    
+    # Organização (c2)
+    'c2_q1': 'Planejamento antecipado',
+    'c2_q2': 'Uso de sistemas organizacionais',
+    'c2_q3': 'Organização do espaço',
+    'c2_q4': 'Acesso rápido à informação',
+    'c2_q5': 'Divisão de projetos',
+    'c2_q6': 'Cumprimento de prazos',
+    'c2_q7': 'Revisão de prioridades',
+    'c2_q8': 'Minimização de distrações',
+    'c2_q9': 'Preparação para compromissos',
+    'c2_q10': 'Delegação eficaz',
+    
+    # Proatividade (c3)
+    'c3_q1': 'Identificação antecipada',
+    'c3_q2': 'Iniciativa para soluções',
+    'c3_q3': 'Responsabilidade pessoal',
+    'c3_q4': 'Melhoria contínua',
+    'c3_q5': 'Oferta de ajuda',
+    'c3_q6': 'Atitude positiva',
+    'c3_q7': 'Autodesenvolvimento',
+    'c3_q8': 'Adaptabilidade',
+    'c3_q9': 'Transformação de ideias',
+    'c3_q10': 'Antecipação de necessidades',
+    
+    # Pensamento Crítico (c4)
+    'c4_q1': 'Questionamento de padrões',
+    'c4_q2': 'Busca por evidências',
+    'c4_q3': 'Reconhecimento de vieses',
+    'c4_q4': 'Flexibilidade mental',
+    'c4_q5': 'Análise de causas profundas',
+    'c4_q6': 'Diferenciação de raciocínios',
+    'c4_q7': 'Consideração de perspectivas',
+    'c4_q8': 'Pausas estratégicas',
+    'c4_q9': 'Avaliação de riscos',
+    'c4_q10': 'Aprendizado com erros',
+    
+    # Produtividade (c5)
+    'c5_q1': 'Foco em uma tarefa',
+    'c5_q2': 'Eliminação de desperdícios',
+    'c5_q3': 'Técnicas de gestão de tempo',
+    'c5_q4': 'Pausas regulares',
+    'c5_q5': 'Estabelecimento de metas',
+    'c5_q6': 'Uso de ferramentas',
+    'c5_q7': 'Equilíbrio vida-trabalho',
+    'c5_q8': 'Avaliação de desempenho',
+    'c5_q9': 'Autocuidado produtivo',
+    'c5_q10': 'Celebração de conquistas'
+}
+
+# Mapeamento de categorias
+CATEGORIAS_COMPETENCIAS = {
+    'c1': 'Comunicação',
+    'c2': 'Organização', 
+    'c3': 'Proatividade',
+    'c4': 'Pensamento Crítico',
+    'c5': 'Produtividade'
+}
+
+# Competências principais na ordem das categorias c1..c5: (prefixo, chave das médias, nome, emoji)
+COMPETENCIAS_PRINCIPAIS = (
+    ('c1', 'comunicacao', 'Comunicação', '🟠'),
+    ('c2', 'organizacao', 'Organização', '🟡'),
+    ('c3', 'proatividade', 'Proatividade', '🔵'),
+    ('c4', 'pensamento_critico', 'Pensamento Crítico', '🟣'),
+    ('c5', 'produtividade', 'Produtividade', '🟢')
+)
+
+# Número de perguntas por competência principal e total de respostas
+PERGUNTAS_POR_CATEGORIA = 10
+TOTAL_RESPOSTAS = len(COMPETENCIAS_PRINCIPAIS) * PERGUNTAS_POR_CATEGORIA
+
+# Tabela pré-calculada: chave do formulário -> (categoria 0-4, posição 0-49)
+INDICE_RESPOSTAS = {
+    f"{prefixo}_q{pergunta}": (categoria, categoria * PERGUNTAS_POR_CATEGORIA + pergunta - 1)
+    for categoria, (prefixo, _, _, _) in enumerate(COMPETENCIAS_PRINCIPAIS)
+    for pergunta in range(1, PERGUNTAS_POR_CATEGORIA + 1)
+}
+
+# Chaves do formulário na ordem das posições (c1_q1 ... c5_q10)
+CHAVES_RESPOSTAS = tuple(sorted(INDICE_RESPOSTAS, key=lambda chave: INDICE_RESPOSTAS[chave][1]))
+
+# Nome e categoria de cada posição
+_NOMES_POSICOES = tuple(COMPETENCIAS_MAPEAMENTO[chave] for chave in CHAVES_RESPOSTAS)
+_CATEGORIAS_POSICOES = tuple(CATEGORIAS_COMPETENCIAS[chave[:2]] for chave in CHAVES_RESPOSTAS)
+
+# Posições em ordem alfabética do nome (critério de desempate do ranking)
+_POSICOES_ALFABETICAS = tuple(sorted(range(TOTAL_RESPOSTAS), key=lambda posicao: _NOMES_POSICOES[posicao]))
+
+# Prefixos aceitos para respostas fora da tabela (ex.: c1_q11), que só entram nas médias
+_CATEGORIA_POR_PREFIXO = {
+    f"{prefixo}_": categoria for categoria, (prefixo, _, _, _) in enumerate(COMPETENCIAS_PRINCIPAIS)
+}
+
+class ResultadoAvaliacao:
+    """Resultado compacto da pontuação de uma avaliação"""
+    __slots__ = (
+        'pontuacoes',
+        'medias',
+        'pontuacao_geral',
+        'ranking_50_competencias',
+        'ranking_principais',
+        'pontos_fortes',
+        'oportunidades',
+        'top_subcompetencias',
+        'bottom_subcompetencias',
+        'competencias_desenvolver'
+    )
+
+def _parsear_respostas(respostas):
+    """Converte as respostas em 50 posições (None = sem resposta) e acumula somas/contagens por categoria"""
+    pontuacoes = [None] * TOTAL_RESPOSTAS
+    somas = [0] * len(COMPETENCIAS_PRINCIPAIS)
+    contagens = [0] * len(COMPETENCIAS_PRINCIPAIS)
+
+    for key, value in respostas.items():
+        indice = INDICE_RESPOSTAS.get(key)
+        if indice is None:
+            categoria = _CATEGORIA_POR_PREFIXO.get(key[:3])
+            posicao = None
+        else:
+            categoria, posicao = indice
+        try:
+            valor = int(value)
+        except (ValueError, TypeError):
+            logger.warning(f"Valor inválido para {key}: {value}")
+            continue
+        if posicao is not None:
+            pontuacoes[posicao] = valor
+        if categoria is not None:
+            somas[categoria] += valor
+            contagens[categoria] += 1
+
+    return pontuacoes, somas, contagens
+
+def calcular_resultado_avaliacao(respostas):
+    """Calcula médias, pontuação geral, rankings e destaques das respostas em uma única passada"""
+    pontuacoes, somas, contagens = _parsear_respostas(respostas)
+
+    # Médias das 5 competências principais
+    medias = {}
+    ranking_principais = []
+    for categoria, (_, chave, nome, emoji) in enumerate(COMPETENCIAS_PRINCIPAIS):
+        media = somas[categoria] / contagens[categoria] if contagens[categoria] else 0
+        medias[chave] = media
+        ranking_principais.append({'nome': nome, 'emoji': emoji, 'media': media})
+
+    # Ordenar por média (decrescente), mantendo a ordem c1..c5 nos empates
+    ranking_principais.sort(key=lambda x: x['media'], reverse=True)
+
+    # Ranking das 50: agrupar por pontuação percorrendo as posições já em ordem alfabética
+    grupos = {}
+    for posicao in _POSICOES_ALFABETICAS:
+        valor = pontuacoes[posicao]
+        if valor is not None:
+            grupos.setdefault(valor, []).append({
+                'nome': _NOMES_POSICOES[posicao],
+                'categoria': _CATEGORIAS_POSICOES[posicao],
+                'pontuacao': valor
+            })
+    ranking_50 = []
+    for valor in sorted(grupos, reverse=True):
+        ranking_50.extend(grupos[valor])
+
+    resultado = ResultadoAvaliacao()
+    resultado.pontuacoes = pontuacoes
+    resultado.medias = medias
+    resultado.pontuacao_geral = sum(medias.values()) / len(medias)
+    resultado.ranking_50_competencias = ranking_50
+    resultado.ranking_principais = ranking_principais
+    resultado.pontos_fortes = ranking_principais[:3]
+    resultado.oportunidades = ranking_principais[:-4:-1]
+    resultado.top_subcompetencias = ranking_50[:5]
+    resultado.bottom_subcompetencias = ranking_50[-5:][::-1]
+    resultado.competencias_desenvolver = ranking_principais[:-4:-1]
+    return resultado
@@ -0,0 +1,140 @@
+import csv
+import io
+import logging
+
+try:
+    import numpy as np
+except ImportError:
+    # Sem NumPy a pontuação em lote fica indisponível (o restante do app funciona normalmente)
+    np = None
+
+from pontuacao import (
+    COMPETENCIAS_PRINCIPAIS,
+    COMPETENCIAS_MAPEAMENTO,
+    CHAVES_RESPOSTAS,
+    PERGUNTAS_POR_CATEGORIA,
+    TOTAL_RESPOSTAS
+)
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+_NOMES_PRINCIPAIS = tuple(nome for _, _, nome, _ in COMPETENCIAS_PRINCIPAIS)
+_CHAVES_MEDIAS = tuple(chave for _, chave, _, _ in COMPETENCIAS_PRINCIPAIS)
+
+def _calcular_posicao_alfabetica():
+    """Posição alfabética do nome de cada uma das 50 competências (desempate do ranking)"""
+    nomes = [COMPETENCIAS_MAPEAMENTO[chave] for chave in CHAVES_RESPOSTAS]
+    posicoes = np.empty(TOTAL_RESPOSTAS, dtype=np.int64)
+    posicoes[sorted(range(TOTAL_RESPOSTAS), key=lambda posicao: nomes[posicao])] = np.arange(TOTAL_RESPOSTAS)
+    return posicoes
+
+_POSICAO_ALFABETICA = _calcular_posicao_alfabetica() if np is not None else None
+
+def numpy_disponivel():
+    """Indica se a pontuação em lote pode ser usada"""
+    return np is not None
+
+def converter_notas(matriz):
+    """Matriz N×50 de inteiros na escala 1-5 (ValueError para valores fracionários, não numéricos ou fora da escala)
+
+    A conversão direta para int64 truncaria 4.7 para 4; como na pontuação por requisição
+    (int()), só notas inteiras são aceitas.
+    """
+    valores = np.asarray(matriz)
+    if valores.ndim != 2 or valores.shape[1] != TOTAL_RESPOSTAS:
+        raise ValueError(f"Matriz de respostas deve ter formato N×{TOTAL_RESPOSTAS}, recebido {valores.shape}")
+
+    if valores.dtype.kind == 'f':
+        if not np.all(np.isfinite(valores) & (valores == np.floor(valores))):
+            linha, coluna = np.argwhere(~(np.isfinite(valores) & (valores == np.floor(valores))))[0]
+            raise ValueError(f"nota não inteira na linha {linha + 1}, {CHAVES_RESPOSTAS[coluna]}: {valores[linha, coluna]}")
+    elif valores.dtype.kind not in 'iuUS':
+        raise ValueError(f"notas devem ser números inteiros de 1 a 5 (recebido {valores.dtype})")
+
+    try:
+        notas = valores.astype(np.int64)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"nota não inteira: {e}")
+
+    fora_da_escala = (notas < 1) | (notas > 5)
+    if fora_da_escala.any():
+        linha, coluna = np.argwhere(fora_da_escala)[0]
+        raise ValueError(f"nota fora da escala 1-5 na linha {linha + 1}, {CHAVES_RESPOSTAS[coluna]}: {notas[linha, coluna]}")
+    return notas
+
+def ler_linhas_csv(conteudo):
+    """Lê um CSV de respostas (50 colunas; cabeçalho c1_q1..c5_q10 opcional) e retorna as linhas, sem o cabeçalho"""
+    linhas = [linha for linha in csv.reader(io.StringIO(conteudo)) if linha and any(campo.strip() for campo in linha)]
+    if not linhas:
+        return []
+
+    # Com cabeçalho, as colunas podem vir em qualquer ordem
+    cabecalho = [campo.strip() for campo in linhas[0]]
+    if all(chave in cabecalho for chave in CHAVES_RESPOSTAS):
+        colunas = [cabecalho.index(chave) for chave in CHAVES_RESPOSTAS]
+        linhas = [[linha[coluna] for coluna in colunas] for linha in linhas[1:]]
+    return linhas
+
+def ler_matriz_csv(conteudo):
+    """Lê um CSV de respostas (50 colunas; cabeçalho c1_q1..c5_q10 opcional) e retorna uma matriz N×50"""
+    linhas = ler_linhas_csv(conteudo)
+    if not linhas:
+        return np.empty((0, TOTAL_RESPOSTAS), dtype=np.int64)
+    return converter_notas(linhas)
+
+def calcular_resultados_lote(matriz):
+    """Pontua N avaliações de uma vez a partir de uma matriz N×50 (colunas c1_q1..c5_q10)
+
+    Retorna arrays NumPy com as mesmas contas de calcular_resultado_avaliacao:
+    medias (N×5), pontuacao_geral (N), ordem_principais (N×5, índices das categorias
+    da maior para a menor média) e ordem_50 (N×50, índices das competências no ranking).
+    """
+    if np is None:
+        raise RuntimeError("NumPy não está instalado: pontuação em lote indisponível")
+
+    notas = converter_notas(matriz)
+
+    total = notas.shape[0]
+    categorias = len(COMPETENCIAS_PRINCIPAIS)
+
+    # Médias por categoria: soma inteira exata dividida pelo número de perguntas
+    somas = notas.reshape(total, categorias, PERGUNTAS_POR_CATEGORIA).sum(axis=2)
+    medias = somas / PERGUNTAS_POR_CATEGORIA
+
+    # Pontuação geral somando as médias na mesma ordem (c1..c5) da versão por requisição
+    soma_medias = medias[:, 0].copy()
+    for categoria in range(1, categorias):
+        soma_medias += medias[:, categoria]
+    pontuacao_geral = soma_medias / categorias
+
+    # Ranking das 5: média decrescente, empates na ordem c1..c5 (ordenação estável)
+    ordem_principais = np.argsort(-medias, axis=1, kind='stable')
+
+    # Ranking das 50: pontuação decrescente, empates em ordem alfabética do nome
+    chave_ordenacao = -notas * TOTAL_RESPOSTAS + _POSICAO_ALFABETICA
+    ordem_50 = np.argsort(chave_ordenacao, axis=1, kind='stable')
+
+    return {
+        'medias': medias,
+        'pontuacao_geral': pontuacao_geral,
+        'ordem_principais': ordem_principais,
+        'ordem_50': ordem_50
+    }
+
+def formatar_resultados_lote(resultados):
+    """Converte o resultado de calcular_resultados_lote em uma lista de dicionários serializáveis"""
+    medias = resultados['medias'].tolist()
+    pontuacao_geral = resultados['pontuacao_geral'].tolist()
+    ordem_principais = resultados['ordem_principais'].tolist()
+    ordem_50 = resultados['ordem_50'].tolist()
+
+    return [
+        {
+            'medias': dict(zip(_CHAVES_MEDIAS, medias[i])),
+            'pontuacao_geral': pontuacao_geral[i],
+            'ranking_principais': [_NOMES_PRINCIPAIS[categoria] for categoria in ordem_principais[i]],
+            'ranking_50_competencias': [CHAVES_RESPOSTAS[posicao] for posicao in ordem_50[i]]
+        }
+        for i in range(len(pontuacao_geral))
+    ]
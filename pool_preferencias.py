@@ -0,0 +1,178 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+
+from cliente_mp import tempo_circuito_aberto
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Preferências de pagamento criadas com antecedência, por URL base (0 desliga o pool)
+MP_POOL_PREFERENCIAS = int(os.getenv('MP_POOL_PREFERENCIAS', 5))
+
+# Validade (segundos) de cada preferência no Mercado Pago e margem para substituí-la antes de expirar
+MP_PREFERENCIA_VALIDADE = int(os.getenv('MP_PREFERENCIA_VALIDADE', 3600))
+MP_PREFERENCIA_MARGEM = int(os.getenv('MP_PREFERENCIA_MARGEM', 600))
+
+# URLs base (separadas por vírgula) com pool; o /checkout de qualquer outro Host cria a preferência na hora
+MP_POOL_URL_BASE = [url.strip().rstrip('/') for url in os.getenv('MP_POOL_URL_BASE', '').split(',') if url.strip()]
+
+# Intervalo máximo (segundos) entre verificações do pool
+MP_POOL_INTERVALO = int(os.getenv('MP_POOL_INTERVALO', 60))
+
+_acordar = threading.Event()
+_thread = None
+_lock = threading.Lock()
+_criar_no_mp = None
+
+# URL base -> deque de preferências prontas, da que expira primeiro para a última
+_pools = {url: deque() for url in MP_POOL_URL_BASE}
+
+_contadores = {
+    'entregues_do_pool': 0,
+    'pool_vazio': 0,
+    'criadas': 0,
+    'expiradas': 0,
+    'falhas': 0
+}
+
+def dados_preferencia(base_url, agora=None):
+    """Dados da preferência Premium com external_reference único e prazo de expiração"""
+    agora = agora or datetime.now().astimezone()
+    return {
+        "items": [
+            {
+                "title": "Avaliação de Competências - Versão Premium",
+                "quantity": 1,
+                "unit_price": 29.90,
+                "currency_id": "BRL"
+            }
+        ],
+        'back_urls': {
+            'success': f'{base_url}/pagamento_sucesso',
+            'failure': f'{base_url}/pagamento_falha',
+            'pending': f'{base_url}/pagamento_pendente',
+        },
+        "external_reference": f"premium_{agora.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}",
+        "expires": True,
+        "expiration_date_from": agora.isoformat(timespec='milliseconds'),
+        "expiration_date_to": (agora + timedelta(seconds=MP_PREFERENCIA_VALIDADE)).isoformat(timespec='milliseconds')
+    }
+
+def criar_preferencia(base_url):
+    """Cria uma preferência no Mercado Pago; retorna {id, init_point, external_reference, expira_em} ou None
+
+    Falhas de rede e CircuitoAberto são propagadas para quem chamou.
+    """
+    preference_data = dados_preferencia(base_url)
+    logger.info(f"Criando preferência MP com dados: {preference_data}")
+    preference_response = _criar_no_mp(preference_data)
+
+    if preference_response["status"] != 201:
+        logger.error(f"Erro ao criar preferência MP: {preference_response}")
+        return None
+
+    preference = preference_response["response"]
+    logger.info(f"Preferência criada com sucesso: {preference['id']}")
+    return {
+        'id': preference['id'],
+        'init_point': preference['init_point'],
+        'external_reference': preference_data['external_reference'],
+        'expira_em': time.monotonic() + MP_PREFERENCIA_VALIDADE
+    }
+
+def _descartar_expirando(pool, agora):
+    """Remove do início do pool as preferências dentro da margem de expiração (chamar com _lock)"""
+    while pool and pool[0]['expira_em'] - MP_PREFERENCIA_MARGEM <= agora:
+        pool.popleft()
+        _contadores['expiradas'] += 1
+
+def retirar_preferencia(base_url):
+    """Preferência pronta para a URL base (a próxima a expirar) ou None se o pool estiver vazio
+
+    Só as URLs de MP_POOL_URL_BASE têm pool: o Host da requisição não escolhe para onde
+    apontam os back_urls das preferências criadas em segundo plano.
+    """
+    with _lock:
+        pool = _pools.get(base_url)
+        entrada = None
+        if pool is not None:
+            _descartar_expirando(pool, time.monotonic())
+            entrada = pool.popleft() if pool else None
+        _contadores['entregues_do_pool' if entrada else 'pool_vazio'] += 1
+    if pool is not None:
+        _acordar.set()
+    return entrada
+
+def _completar():
+    """Repõe os pools até MP_POOL_PREFERENCIAS; retorna os segundos até a próxima verificação"""
+    with _lock:
+        urls = list(_pools)
+    proxima = MP_POOL_INTERVALO
+    for base_url in urls:
+        while True:
+            with _lock:
+                pool = _pools[base_url]
+                _descartar_expirando(pool, time.monotonic())
+                faltam = MP_POOL_PREFERENCIAS - len(pool)
+            if faltam <= 0:
+                break
+            # Mercado Pago indisponível: esperar o circuito em vez de acumular falhas
+            espera = tempo_circuito_aberto()
+            if espera:
+                return min(max(espera, 1), MP_POOL_INTERVALO)
+            try:
+                entrada = criar_preferencia(base_url)
+            except Exception as e:
+                logger.error(f"Erro ao repor o pool de preferências de {base_url}: {e}")
+                entrada = None
+            if entrada is None:
+                with _lock:
+                    _contadores['falhas'] += 1
+                break
+            with _lock:
+                pool.append(entrada)
+                _contadores['criadas'] += 1
+
+        with _lock:
+            if pool:
+                proxima = min(proxima, pool[0]['expira_em'] - MP_PREFERENCIA_MARGEM - time.monotonic())
+    return max(proxima, 1)
+
+def _loop_pool():
+    while True:
+        try:
+            espera = _completar()
+        except Exception as e:
+            logger.error(f"Erro no pool de preferências: {e}", exc_info=True)
+            espera = MP_POOL_INTERVALO
+        _acordar.wait(espera)
+        _acordar.clear()
+
+def iniciar_pool_preferencias(criar_no_mp):
+    """Inicia a thread que mantém o pool de preferências (uma por processo)
+
+    criar_no_mp(preference_data) deve retornar a resposta do SDK ({'status': ..., 'response': ...}).
+    """
+    global _thread, _criar_no_mp
+    with _lock:
+        _criar_no_mp = criar_no_mp
+        if MP_POOL_PREFERENCIAS <= 0 or not _pools or (_thread is not None and _thread.is_alive()):
+            return
+        _thread = threading.Thread(target=_loop_pool, name='pool-preferencias', daemon=True)
+        _thread.start()
+    logger.info(f"Pool de preferências iniciado ({MP_POOL_PREFERENCIAS} para {', '.join(_pools)}, validade {MP_PREFERENCIA_VALIDADE}s)")
+
+def get_pool_preferencias_stats():
+    """Preferências prontas por URL base e taxa de checkouts atendidos pelo pool"""
+    with _lock:
+        stats = dict(_contadores)
+        stats['prontas'] = {base_url: len(pool) for base_url, pool in _pools.items()}
+    pedidos = stats['entregues_do_pool'] + stats['pool_vazio']
+    stats['taxa_acerto'] = stats['entregues_do_pool'] / pedidos if pedidos else 0
+    stats['ativo'] = _thread is not None and _thread.is_alive()
+    return stats
@@ -0,0 +1,152 @@
+import atexit
+import logging
+import os
+import smtplib
+import threading
+import time
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Máximo de sessões SMTP simultâneas por conta (limite do provedor)
+MAIL_MAX_CONEXOES = int(os.getenv('MAIL_MAX_CONEXOES', 3))
+
+# Sessões ociosas há mais tempo que isto (segundos) são fechadas em vez de reutilizadas
+MAIL_CONEXAO_MAX_OCIOSA = int(os.getenv('MAIL_CONEXAO_MAX_OCIOSA', 240))
+
+# Timeout de rede (segundos) das conexões SMTP
+MAIL_TIMEOUT = int(os.getenv('MAIL_TIMEOUT', 30))
+
+_pools = {}
+_lock = threading.Lock()
+
+def conta_padrao():
+    """Conta SMTP configurada nas variáveis de ambiente MAIL_*"""
+    return {
+        'servidor': os.getenv("MAIL_SERVER"),
+        'porta': int(os.getenv("MAIL_PORT", 465)),
+        'usuario': os.getenv("MAIL_USERNAME"),
+        'senha': os.getenv("MAIL_PASSWORD")
+    }
+
+def _obter_pool(conta):
+    """Pool (sessões ociosas + semáforo) de uma conta, criado na primeira utilização"""
+    chave = (conta['servidor'], conta['porta'], conta['usuario'])
+    with _lock:
+        pool = _pools.get(chave)
+        if pool is None:
+            pool = {
+                'semaforo': threading.BoundedSemaphore(MAIL_MAX_CONEXOES),
+                'ociosas': [],
+                'lock': threading.Lock(),
+                'conexoes_abertas': 0,
+                'reutilizacoes': 0
+            }
+            _pools[chave] = pool
+        return pool
+
+def _conectar(conta):
+    """Abre uma sessão autenticada (SSL na porta 465, STARTTLS nas demais)"""
+    if conta['porta'] == 465:
+        conexao = smtplib.SMTP_SSL(conta['servidor'], conta['porta'], timeout=MAIL_TIMEOUT)
+        logger.info(f"Conectado ao servidor SMTP (SSL): {conta['servidor']}")
+    else:
+        conexao = smtplib.SMTP(conta['servidor'], conta['porta'], timeout=MAIL_TIMEOUT)
+        logger.info(f"Conectado ao servidor SMTP (STARTTLS): {conta['servidor']}")
+        conexao.ehlo()
+        conexao.starttls()
+    try:
+        conexao.login(conta['usuario'], conta['senha'])
+    except Exception:
+        _fechar(conexao)
+        raise
+    return conexao
+
+def _fechar(conexao):
+    """Encerra a sessão ignorando erros (o servidor pode já ter derrubado a conexão)"""
+    try:
+        conexao.quit()
+    except Exception:
+        try:
+            conexao.close()
+        except Exception:
+            pass
+
+def _retirar_conexao(pool, conta):
+    """Reaproveita uma sessão ociosa que responda ao NOOP ou abre uma nova"""
+    while True:
+        with pool['lock']:
+            if not pool['ociosas']:
+                break
+            conexao, ultimo_uso = pool['ociosas'].pop()
+
+        if time.monotonic() - ultimo_uso > MAIL_CONEXAO_MAX_OCIOSA:
+            _fechar(conexao)
+            continue
+        try:
+            codigo, _ = conexao.noop()
+        except (smtplib.SMTPException, OSError):
+            codigo = None
+        if codigo == 250:
+            with pool['lock']:
+                pool['reutilizacoes'] += 1
+            return conexao
+        _fechar(conexao)
+
+    conexao = _conectar(conta)
+    with pool['lock']:
+        pool['conexoes_abertas'] += 1
+    return conexao
+
+def _devolver_conexao(pool, conexao):
+    with pool['lock']:
+        pool['ociosas'].append((conexao, time.monotonic()))
+
+def enviar_mensagem(msg, conta=None):
+    """Envia a mensagem por uma sessão do pool, reconectando uma vez se o servidor tiver derrubado a sessão"""
+    conta = conta or conta_padrao()
+    pool = _obter_pool(conta)
+
+    with pool['semaforo']:
+        conexao = _retirar_conexao(pool, conta)
+        try:
+            try:
+                conexao.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                logger.warning("Sessão SMTP desconectada pelo servidor, reconectando")
+                _fechar(conexao)
+                conexao = _conectar(conta)
+                with pool['lock']:
+                    pool['conexoes_abertas'] += 1
+                conexao.send_message(msg)
+        except Exception:
+            _fechar(conexao)
+            raise
+        _devolver_conexao(pool, conexao)
+
+def get_pool_stats():
+    """Sessões abertas/reutilizadas e ociosas por conta"""
+    with _lock:
+        pools = list(_pools.items())
+
+    stats = {}
+    for (servidor, porta, usuario), pool in pools:
+        with pool['lock']:
+            stats[f"{usuario}@{servidor}:{porta}"] = {
+                'conexoes_abertas': pool['conexoes_abertas'],
+                'reutilizacoes': pool['reutilizacoes'],
+                'ociosas': len(pool['ociosas'])
+            }
+    return stats
+
+def fechar_conexoes():
+    """Fecha todas as sessões ociosas (chamado na saída do processo)"""
+    with _lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        with pool['lock']:
+            ociosas, pool['ociosas'] = pool['ociosas'], []
+        for conexao, _ in ociosas:
+            _fechar(conexao)
+
+atexit.register(fechar_conexoes)
@@ -0,0 +1,47 @@
+import logging
+import os
+import threading
+
+import pdfkit
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Renderizações simultâneas (processos wkhtmltopdf abertos ao mesmo tempo). Não há renderizador
+# persistente: o wkhtmltopdf só roda como linha de comando, um processo por documento
+PDF_RENDER_CONCORRENCIA = int(os.getenv('PDF_RENDER_CONCORRENCIA', 2))
+
+# Tempo máximo (em segundos) de espera por uma vaga de renderização
+PDF_RENDER_TIMEOUT = int(os.getenv('PDF_RENDER_TIMEOUT', 90))
+
+_vagas = threading.BoundedSemaphore(PDF_RENDER_CONCORRENCIA)
+_lock = threading.Lock()
+_configuracao = None
+
+def _obter_configuracao():
+    """Configuração do pdfkit (caminho do wkhtmltopdf), resolvida uma vez por processo"""
+    global _configuracao
+    with _lock:
+        if _configuracao is None:
+            try:
+                _configuracao = pdfkit.configuration()
+            except OSError:
+                # Sem wkhtmltopdf o erro aparece ao renderizar, com a mensagem original do pdfkit
+                return None
+        return _configuracao
+
+def renderizar_pdf(html, options=None):
+    """Renderiza o HTML com o wkhtmltopdf e retorna os bytes do PDF
+
+    No máximo PDF_RENDER_CONCORRENCIA renderizações rodam ao mesmo tempo; as demais esperam uma vaga
+    por até PDF_RENDER_TIMEOUT segundos.
+    """
+    if not _vagas.acquire(timeout=PDF_RENDER_TIMEOUT):
+        raise TimeoutError(f"Nenhuma vaga de renderização PDF em {PDF_RENDER_TIMEOUT}s")
+    try:
+        configuracao = _obter_configuracao()
+        if configuracao is None:
+            return pdfkit.from_string(html, False, options=options)
+        return pdfkit.from_string(html, False, options=options, configuration=configuracao)
+    finally:
+        _vagas.release()
@@ -0,0 +1,165 @@
+import html
+import io
+import logging
+import os
+import threading
+import time
+import zipfile
+from datetime import datetime, timedelta
+
+from database import get_assessments_pending_digest, mark_assessments_digested, purge_report_data
+from cache_pdf import get_pdf
+from outbox_email import enfileirar_email
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Periodicidade do resumo de avaliações enviado à equipe: 'hora' ou 'dia'
+RESUMO_EMAIL_PERIODO = os.getenv('RESUMO_EMAIL_PERIODO', 'dia')
+
+# Hora do envio quando o resumo é diário
+RESUMO_EMAIL_HORA = int(os.getenv('RESUMO_EMAIL_HORA', 8))
+
+# Destinatário do resumo (padrão: a própria conta remetente, que antes recebia cópia de cada relatório)
+RESUMO_EMAIL_DESTINO = os.getenv('RESUMO_EMAIL_DESTINO') or os.getenv('MAIL_USERNAME')
+
+# Anexar os PDFs do período em um ZIP (desligado por padrão: o resumo traz só os links)
+RESUMO_EMAIL_ANEXAR_PDFS = os.getenv('RESUMO_EMAIL_ANEXAR_PDFS', 'false').lower() in ('1', 'true', 'sim')
+RESUMO_EMAIL_ANEXO_MAX_MB = int(os.getenv('RESUMO_EMAIL_ANEXO_MAX_MB', 15))
+
+# Máximo de avaliações por mensagem de resumo
+RESUMO_EMAIL_MAX_AVALIACOES = int(os.getenv('RESUMO_EMAIL_MAX_AVALIACOES', 500))
+
+_thread = None
+_lock = threading.Lock()
+_retencao_dados_dias = None
+
+def proximo_envio(agora):
+    """Próximo horário de envio do resumo (início da próxima hora ou RESUMO_EMAIL_HORA do dia)"""
+    if RESUMO_EMAIL_PERIODO == 'hora':
+        return (agora + timedelta(hours=1)).replace(minute=0, second=0, microsecond=0)
+    alvo = agora.replace(hour=RESUMO_EMAIL_HORA, minute=0, second=0, microsecond=0)
+    if alvo <= agora:
+        alvo += timedelta(days=1)
+    return alvo
+
+def montar_resumo(avaliacoes):
+    """Assunto e corpo HTML do resumo: uma linha por avaliação com link para o PDF"""
+    linhas = []
+    for avaliacao in avaliacoes:
+        link = (f'<a href="{html.escape(avaliacao["pdf_url"])}">PDF</a>' if avaliacao['pdf_url'] else '—')
+        data = datetime.fromisoformat(avaliacao['created_at']).strftime('%d/%m/%Y %H:%M')
+        linhas.append(f"""
+                <tr>
+                    <td style="padding: 4px 8px;">{data}</td>
+                    <td style="padding: 4px 8px;">{html.escape(avaliacao['name'])}</td>
+                    <td style="padding: 4px 8px;">{html.escape(avaliacao['email'])}</td>
+                    <td style="padding: 4px 8px; text-align: right;">{(avaliacao['score'] or 0):.2f}</td>
+                    <td style="padding: 4px 8px;">{html.escape(avaliacao['tier'] or '')}</td>
+                    <td style="padding: 4px 8px;">{link}</td>
+                </tr>""")
+
+    total = len(avaliacoes)
+    premium = sum(1 for avaliacao in avaliacoes if avaliacao['tier'] == 'premium')
+    assunto = f"[Método Faça Bem] Resumo de avaliações: {total} nova(s)"
+    corpo_html = f"""
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 900px; margin: 0 auto; padding: 20px;">
+                <h2 style="color: #4CAF50;">Resumo de avaliações</h2>
+                <p><strong>{total}</strong> avaliação(ões) concluída(s), sendo <strong>{premium}</strong> premium.</p>
+                <table style="border-collapse: collapse; font-size: 14px;">
+                    <tr style="background: #f5f5f5;">
+                        <th style="padding: 4px 8px; text-align: left;">Data</th>
+                        <th style="padding: 4px 8px; text-align: left;">Nome</th>
+                        <th style="padding: 4px 8px; text-align: left;">E-mail</th>
+                        <th style="padding: 4px 8px; text-align: right;">Pontuação</th>
+                        <th style="padding: 4px 8px; text-align: left;">Versão</th>
+                        <th style="padding: 4px 8px; text-align: left;">Relatório</th>
+                    </tr>{''.join(linhas)}
+                </table>
+                <p style="font-size: 12px; color: #777;">Os links dos relatórios exigem a credencial de administrador (ADMIN_TOKEN).</p>
+            </div>
+        </body>
+        </html>
+        """
+    return assunto, corpo_html
+
+def _zip_pdfs(avaliacoes):
+    """ZIP com os PDFs ainda em cache, respeitando RESUMO_EMAIL_ANEXO_MAX_MB (None se vazio)"""
+    limite_bytes = RESUMO_EMAIL_ANEXO_MAX_MB * 1024 * 1024
+    total = 0
+    saida = io.BytesIO()
+    with zipfile.ZipFile(saida, 'w', zipfile.ZIP_DEFLATED) as arquivo_zip:
+        for avaliacao in avaliacoes:
+            pdf_bytes = get_pdf(avaliacao['pdf_key']) if avaliacao['pdf_key'] else None
+            if not pdf_bytes:
+                continue
+            if total + len(pdf_bytes) > limite_bytes:
+                logger.warning(f"Resumo: anexo limitado a {RESUMO_EMAIL_ANEXO_MAX_MB} MB, demais PDFs apenas por link")
+                break
+            nome_arquivo = avaliacao['name'].replace(' ', '_').replace('/', '_').replace('\\', '_')
+            arquivo_zip.writestr(f"{avaliacao['id']:06d}_relatorio_{nome_arquivo}.pdf", pdf_bytes)
+            total += len(pdf_bytes)
+    return saida.getvalue() if total else None
+
+def enviar_resumo():
+    """Enfileira o(s) resumo(s) das avaliações ainda não resumidas e retorna quantas foram incluídas"""
+    if not RESUMO_EMAIL_DESTINO:
+        logger.warning("Resumo de avaliações sem destinatário (RESUMO_EMAIL_DESTINO/MAIL_USERNAME)")
+        return 0
+
+    incluidas = 0
+    while True:
+        avaliacoes = get_assessments_pending_digest(RESUMO_EMAIL_MAX_AVALIACOES)
+        if not avaliacoes:
+            break
+
+        assunto, corpo_html = montar_resumo(avaliacoes)
+        anexo = _zip_pdfs(avaliacoes) if RESUMO_EMAIL_ANEXAR_PDFS else None
+        nome_anexo = f"relatorios_{datetime.now().strftime('%Y%m%d_%H%M')}.zip" if anexo else None
+
+        if enfileirar_email(RESUMO_EMAIL_DESTINO, assunto, corpo_html, anexo, nome_anexo) is None:
+            logger.error("Resumo de avaliações não pôde ser enfileirado; nova tentativa no próximo período")
+            break
+
+        mark_assessments_digested([avaliacao['id'] for avaliacao in avaliacoes])
+        incluidas += len(avaliacoes)
+
+    if incluidas:
+        logger.info(f"Resumo de {incluidas} avaliação(ões) enfileirado para {RESUMO_EMAIL_DESTINO}")
+    return incluidas
+
+def limpar_dados_relatorio():
+    """Apaga os dados para gerar o PDF das avaliações cujos links de relatório já expiraram"""
+    if _retencao_dados_dias is None:
+        return 0
+    limpas = purge_report_data(_retencao_dados_dias)
+    if limpas:
+        logger.info(f"Dados de relatório apagados de {limpas} avaliação(ões) com mais de {_retencao_dados_dias} dias")
+    return limpas
+
+def _loop_resumo():
+    while True:
+        limpar_dados_relatorio()
+        espera = (proximo_envio(datetime.now()) - datetime.now()).total_seconds()
+        time.sleep(max(espera, 1))
+        try:
+            enviar_resumo()
+        except Exception as e:
+            logger.error(f"Erro ao enviar resumo de avaliações: {e}", exc_info=True)
+
+def iniciar_resumo(retencao_dados_dias=None):
+    """Inicia a thread do resumo periódico (uma por processo)
+
+    retencao_dados_dias: a cada período, apaga report_data das avaliações mais antigas que isso
+    (a validade dos links de relatório).
+    """
+    global _thread, _retencao_dados_dias
+    with _lock:
+        _retencao_dados_dias = retencao_dados_dias
+        if _thread is not None and _thread.is_alive():
+            return
+        _thread = threading.Thread(target=_loop_resumo, name='resumo-email', daemon=True)
+        _thread.start()
+    logger.info(f"Resumo de avaliações agendado ({RESUMO_EMAIL_PERIODO}), próximo envio: {proximo_envio(datetime.now()).isoformat()}")
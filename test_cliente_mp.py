@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Testes do cliente HTTP do Mercado Pago (conexão reaproveitada e novas tentativas)
+"""
+
+import sys
+import os
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Adicionar o diretório atual ao path para importar os módulos
+sys.path.insert(0, os.path.dirname(__file__))
+
+from mercadopago.config.config import Config
+
+import cliente_mp
+
+class Stub(BaseHTTPRequestHandler):
+    """Responde com os status de `respostas` em sequência (200 quando acabam)"""
+    protocol_version = 'HTTP/1.1'
+    respostas = []
+    conexoes = 0
+
+    def setup(self):
+        super().setup()
+        Stub.conexoes += 1
+
+    def do_GET(self):
+        status = Stub.respostas.pop(0) if Stub.respostas else 200
+        dados = json.dumps({'id': 123, 'status': 'approved'}).encode()
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def sdk(monkeypatch):
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), Stub)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    monkeypatch.setattr(Config, '_Config__api_base_url', f"http://127.0.0.1:{servidor.server_address[1]}")
+    monkeypatch.setattr(cliente_mp, 'MP_BACKOFF_BASE', 0.01)
+    monkeypatch.setattr(cliente_mp, '_sessao', None)
+    monkeypatch.setattr(cliente_mp, '_endpoints', {})
+    monkeypatch.setattr(cliente_mp, '_circuito', dict(cliente_mp._circuito, estado=cliente_mp.CIRCUITO_FECHADO,
+                                                      falhas_seguidas=0, sonda_em_andamento=False))
+    Stub.conexoes = 0
+    Stub.respostas = []
+    yield cliente_mp.criar_sdk('TEST-123')
+    servidor.shutdown()
+    servidor.server_close()
+
+def test_conexao_reaproveitada(sdk):
+    """Várias chamadas usam a mesma conexão keep-alive"""
+    for _ in range(5):
+        assert sdk.payment().get(123)['status'] == 200
+    assert Stub.conexoes == 1
+    assert cliente_mp.get_mp_stats()['endpoints']['GET /v1/payments/:id']['chamadas'] == 5
+
+def test_novas_tentativas(sdk):
+    """503/429 são repetidos até MP_MAX_RETENTATIVAS; esgotadas, o último status é retornado"""
+    Stub.respostas = [503, 429]
+    assert sdk.payment().get(123)['response']['status'] == 'approved'
+
+    Stub.respostas = [500, 500, 500, 500]
+    assert sdk.payment().get(123)['status'] == 500
+
+    metricas = cliente_mp.get_mp_stats()['endpoints']['GET /v1/payments/:id']
+    assert metricas['retentativas'] == 2 + cliente_mp.MP_MAX_RETENTATIVAS
+    assert metricas['por_status'] == {'503': 1, '429': 1, '200': 1, '500': cliente_mp.MP_MAX_RETENTATIVAS + 1}
+
+def test_circuito_aberto_e_sonda(sdk, monkeypatch):
+    """Falhas seguidas abrem o circuito (chamadas recusadas sem rede); a chamada de teste o fecha"""
+    monkeypatch.setattr(cliente_mp, 'MP_MAX_RETENTATIVAS', 0)
+    monkeypatch.setattr(cliente_mp, 'MP_CIRCUITO_FALHAS', 3)
+    monkeypatch.setattr(cliente_mp, 'MP_CIRCUITO_ABERTO', 60)
+
+    Stub.respostas = [502, 503, 504]
+    assert [sdk.payment().get(123)['status'] for _ in range(3)] == [502, 503, 504]
+    assert cliente_mp.tempo_circuito_aberto() > 59
+
+    with pytest.raises(cliente_mp.CircuitoAberto):
+        sdk.payment().get(123)
+    assert cliente_mp.get_mp_stats()['circuito']['recusadas'] == 1
+    assert cliente_mp.get_mp_stats()['endpoints']['GET /v1/payments/:id']['chamadas'] == 3
+
+    # Passado o tempo aberto, uma chamada de teste: falha reabre, sucesso fecha
+    cliente_mp._circuito['aberto_ate'] = 0
+    Stub.respostas = [500]
+    assert sdk.payment().get(123)['status'] == 500
+    assert cliente_mp.get_mp_stats()['circuito']['estado'] == cliente_mp.CIRCUITO_ABERTO
+
+    cliente_mp._circuito['aberto_ate'] = 0
+    assert sdk.payment().get(123)['status'] == 200
+    assert cliente_mp.get_mp_stats()['circuito']['estado'] == cliente_mp.CIRCUITO_FECHADO
+
+def test_prazo_da_chamada(sdk, monkeypatch):
+    """Sem prazo para esperar outra tentativa, a última resposta é devolvida"""
+    monkeypatch.setattr(cliente_mp, 'calcular_espera', lambda tentativa, resposta=None: 1)
+    Stub.respostas = [503, 503]
+    with cliente_mp.prazo_chamada(0.5):
+        assert sdk.payment().get(123)['status'] == 503
+    assert cliente_mp.get_mp_stats()['endpoints']['GET /v1/payments/:id']['retentativas'] == 0
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Testes da gravação de transações (UPSERT por payment_id e carga em lote)
+"""
+
+import sys
+import os
+import threading
+
+# Adicionar o diretório atual ao path para importar os módulos
+sys.path.insert(0, os.path.dirname(__file__))
+
+import database
+
+def pagamento(payment_id, status='pending', valor=29.90, referencia='premium_20250730_143000'):
+    """Pagamento no formato retornado pela API do Mercado Pago"""
+    return {
+        'id': payment_id,
+        'external_reference': referencia,
+        'status': status,
+        'transaction_amount': valor,
+        'currency_id': 'BRL',
+        'payment_method_id': 'pix',
+        'payment_type_id': 'bank_transfer',
+        'payer': {'email': 'teste@exemplo.com', 'first_name': 'João', 'last_name': 'Silva'}
+    }
+
+def test_upsert_atualiza_sem_duplicar(banco):
+    """A segunda notificação atualiza status/valor e preserva created_at e external_reference"""
+    assert database.save_transaction(pagamento(123), {'type': 'payment'})
+    original = database.get_transaction_by_payment_id('123')
+
+    assert database.save_transaction(pagamento(123, 'approved', referencia='outra'))
+    atualizada = database.get_transaction_by_payment_id('123')
+
+    assert atualizada['id'] == original['id']
+    assert atualizada['status'] == 'approved'
+    assert atualizada['created_at'] == original['created_at']
+    assert atualizada['external_reference'] == 'premium_20250730_143000'
+    assert atualizada['payer_name'] == 'João Silva'
+    assert database.get_transaction_stats()['total_transactions'] == 1
+
+def test_notificacoes_simultaneas(banco):
+    """Threads gravando o mesmo payment_id ao mesmo tempo resultam em uma única linha"""
+    resultados = []
+
+    def gravar():
+        resultados.append(database.save_transaction(pagamento(999, 'approved')))
+        database.close_connection()
+
+    threads = [threading.Thread(target=gravar) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(resultados)
+    assert database.get_transaction_stats()['total_transactions'] == 1
+
+def test_gravacao_em_lote(banco):
+    """Lote grava inserções e atualizações em uma única transação"""
+    database.save_transaction(pagamento(1))
+
+    salvos = database.save_transactions_bulk(
+        pagamento(i, 'approved') for i in range(1, 1001)
+    )
+
+    assert salvos == 1000
+    stats = database.get_transaction_stats()
+    assert stats['total_transactions'] == 1000
+    assert stats['by_status'] == {'approved': {'count': 1000, 'total_amount': stats['total_amount']}}
+
+def test_lote_com_erro_nao_grava_nada(banco):
+    """Um pagamento inválido desfaz o lote inteiro"""
+    pagamentos = [pagamento(1), pagamento(2), {'id': 3, 'transaction_amount': 'inválido'}]
+
+    assert database.save_transactions_bulk(pagamentos) == 0
+    assert database.get_transaction_stats()['total_transactions'] == 0
+
+def test_paginacao_por_chave(banco):
+    """Páginas por (created_at, id) cobrem todas as transações, sem repetir, inclusive com created_at empatado"""
+    database.save_transactions_bulk(
+        pagamento(i, 'approved' if i % 2 else 'pending') for i in range(1, 26)
+    )
+    conn = database.get_connection()
+    conn.execute("UPDATE transactions SET created_at = '2025-01-01T00:00:00' WHERE id % 3 = 0")
+    conn.commit()
+
+    for listar, esperado in (
+        (lambda antes: database.get_all_transactions(limit=4, before=antes), 25),
+        (lambda antes: database.get_transactions_by_status('approved', limit=4, before=antes), 13)
+    ):
+        vistos = []
+        antes = None
+        while True:
+            pagina = listar(antes)
+            if not pagina:
+                break
+            vistos.extend((t['created_at'], t['id']) for t in pagina)
+            antes = vistos[-1]
+
+        assert len(vistos) == esperado
+        assert vistos == sorted(set(vistos), reverse=True)
+
+def test_estatisticas_acompanham_mudanca_de_status(banco):
+    """pending→approved move a transação entre os status; valores somados em centavos"""
+    database.save_transaction(pagamento(1, 'pending', 29.90))
+    database.save_transaction(pagamento(2, 'pending', 0.10))
+    database.save_transaction(pagamento(1, 'approved', 29.90))
+    database.save_transaction(pagamento(2, 'pending', 0.20))
+
+    stats = database.get_transaction_stats()
+    assert stats == {
+        'total_transactions': 2,
+        'total_amount': 30.10,
+        'by_status': {
+            'approved': {'count': 1, 'total_amount': 29.90},
+            'pending': {'count': 1, 'total_amount': 0.20}
+        }
+    }
+    assert database.rebuild_transaction_stats() == {}
+
+def test_rebuild_corrige_divergencia(banco):
+    """O rebuild aponta e corrige estatísticas que não batem com as transações"""
+    database.save_transactions_bulk(pagamento(i, 'approved', 10) for i in range(1, 6))
+    conn = database.get_connection()
+    conn.execute("UPDATE transaction_stats SET count = 7 WHERE status = 'approved'")
+    conn.execute("DELETE FROM transactions WHERE payment_id = '5'")
+    conn.commit()
+
+    assert database.rebuild_transaction_stats() == {
+        'approved': {'expected': (4, 4000), 'found': (6, 4000)}
+    }
+    assert database.get_transaction_stats()['total_transactions'] == 4
+    assert database.get_transaction_stats()['total_amount'] == 40
+
+def test_agregados_por_periodo(banco):
+    """Agregados por hora/dia acompanham inserções e mudanças de status e batem com o rebuild"""
+    database.save_transactions_bulk([pagamento(1, 'pending', 29.90), pagamento(2, 'approved', 49.90)])
+    cartao = dict(pagamento(3, 'rejected', 10), payment_method_id='visa', payment_type_id='credit_card')
+    database.save_transaction(cartao)
+    database.save_transaction(pagamento(1, 'approved', 29.90))
+    conn = database.get_connection()
+    conn.execute("UPDATE transactions SET created_at = '2025-01-02T10:15:00' WHERE payment_id = '3'")
+    conn.commit()
+
+    hoje = database.get_transaction_by_payment_id('1')['created_at'][:10]
+    serie = database.get_transaction_timeseries('day', '2025-01-01', '9999-12-31')
+    assert [ponto['period'] for ponto in serie] == ['2025-01-02', hoje]
+
+    assert serie[0]['by_payment_type'] == {'credit_card': {'count': 1, 'amount': 10}}
+    assert serie[1]['count'] == 2
+    assert serie[1]['revenue'] == 79.80
+    assert serie[1]['conversion_rate'] == 1
+    assert serie[1]['by_status'] == {'approved': {'count': 2, 'amount': 79.80}}
+
+    por_hora = database.get_transaction_timeseries('hour', '2025-01-02T10', '2025-01-02T10')
+    assert [(ponto['period'], ponto['conversion_rate']) for ponto in por_hora] == [('2025-01-02T10', 0)]
+    assert database.rebuild_transaction_rollups() == 0
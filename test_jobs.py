@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Testes dos jobs de segundo plano (estado no banco, consultável de qualquer worker)
+"""
+
+import sys
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Adicionar o diretório atual ao path para importar os módulos
+sys.path.insert(0, os.path.dirname(__file__))
+
+import database
+import jobs
+
+def test_estado_do_job_fica_no_banco(banco):
+    """O progresso e o resultado são lidos do banco, não da memória do processo que executou o job"""
+    liberar = threading.Event()
+
+    def tarefa(job_id, valor):
+        jobs.update_job(job_id, etapa='gerando_pdf')
+        liberar.wait(5)
+        return {'valor': valor}
+
+    job_id = jobs.submit_job(tarefa, 42)
+    assert database.get_job_record(job_id)['status'] in (jobs.STATUS_NA_FILA, jobs.STATUS_PROCESSANDO)
+
+    liberar.set()
+    for _ in range(50):
+        job = jobs.get_job(job_id)
+        if job['status'] == jobs.STATUS_CONCLUIDO:
+            break
+        time.sleep(0.1)
+
+    assert job['status'] == jobs.STATUS_CONCLUIDO
+    assert job['etapa'] == 'finalizado'
+    assert job['resultado'] == {'valor': 42}
+    assert job['finished_at']
+    assert jobs.get_job('inexistente') is None
+
+def test_jobs_finalizados_expiram(banco):
+    """Jobs finalizados há mais de JOBS_TTL_SEGUNDOS são apagados; os em andamento ficam"""
+    assert database.create_job('antigo', jobs.STATUS_CONCLUIDO)
+    assert database.create_job('rodando', jobs.STATUS_PROCESSANDO)
+    database.update_job_record('antigo', {'finished_at': (datetime.now() - timedelta(hours=2)).isoformat()})
+
+    assert database.purge_finished_jobs(3600) == 1
+    assert database.get_job_record('antigo') is None
+    assert database.get_job_record('rodando')['status'] == jobs.STATUS_PROCESSANDO
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Testes da outbox de e-mails (reserva em lote, reagendamento e dead letter)
+"""
+
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Adicionar o diretório atual ao path para importar os módulos
+sys.path.insert(0, os.path.dirname(__file__))
+
+import database
+
+def test_reserva_em_lote(banco):
+    """Cada e-mail pendente é reservado por um único lote"""
+    ids = [database.enqueue_email(f'u{i}@teste.com', 'Assunto', '<p>corpo</p>') for i in range(5)]
+
+    primeiro_lote = database.claim_emails(limit=3)
+    segundo_lote = database.claim_emails(limit=3)
+
+    assert [email['id'] for email in primeiro_lote] == ids[:3]
+    assert [email['id'] for email in segundo_lote] == ids[3:]
+    assert all(email['status'] == database.EMAIL_SENDING and email['attempts'] == 1 for email in primeiro_lote)
+    assert database.claim_emails(limit=3) == []
+
+def test_reagendamento_e_dead_letter(banco):
+    """Falha com próxima tentativa volta para pending; sem próxima tentativa vai para dead"""
+    email_id = database.enqueue_email('u@teste.com', 'Assunto', '<p>corpo</p>')
+    database.claim_emails()
+
+    # Reagendado para o futuro: ainda não pode ser reservado
+    database.mark_email_failed(email_id, 'timeout', datetime.now() + timedelta(hours=1))
+    assert database.claim_emails() == []
+
+    # Reagendado para agora: volta a ser reservado, com a tentativa contabilizada
+    database.mark_email_failed(email_id, 'timeout', datetime.now())
+    [email] = database.claim_emails()
+    assert email['attempts'] == 2
+
+    database.mark_email_failed(email_id, 'recusado')
+    stats = database.get_outbox_stats()
+    assert stats['by_status'] == {database.EMAIL_DEAD: 1}
+    assert stats['depth'] == 0
+
+def test_latencia_de_envio(banco):
+    """Estatísticas incluem a latência dos e-mails enviados"""
+    for i in range(3):
+        database.enqueue_email(f'u{i}@teste.com', 'Assunto', '<p>corpo</p>')
+    database.enqueue_email('fila@teste.com', 'Assunto', '<p>corpo</p>')
+
+    for email in database.claim_emails(limit=3):
+        database.mark_email_sent(email['id'])
+
+    stats = database.get_outbox_stats()
+    assert stats['depth'] == 1
+    assert stats['by_status'][database.EMAIL_SENT] == 3
+    assert stats['latency_seconds']['sample'] == 3
+    assert stats['latency_seconds']['max'] >= 0
+
+def test_agendador_respeita_cotas_e_distribui(banco, monkeypatch):
+    """O agendador não passa da cota por minuto e alterna entre as contas remetentes"""
+    import agendador_email
+
+    monkeypatch.setenv('MAIL_USERNAME', 'a@teste.com')
+    monkeypatch.setenv('MAIL_USERNAME_2', 'b@teste.com')
+    monkeypatch.setattr(agendador_email, 'MAIL_LIMITE_POR_MINUTO', 3)
+    monkeypatch.setattr(agendador_email, '_remetentes', None)
+
+    assert agendador_email.envios_disponiveis() == 6
+    contas = [agendador_email.reservar_envio() for _ in range(6)]
+    assert sorted(conta['usuario'] for conta in contas) == ['a@teste.com'] * 3 + ['b@teste.com'] * 3
+    assert agendador_email.reservar_envio() is None
+    assert 0 < agendador_email.tempo_ate_proximo_envio() <= 20
+
+def test_avaliacoes_do_resumo(banco):
+    """Cada avaliação entra em um único resumo"""
+    import resumo_email
+
+    database.save_assessment('Ana <Silva>', 'ana@teste.com', 4.2, 'premium', None, 'https://exemplo/relatorio')
+    database.save_assessment('Bruno', 'bruno@teste.com', 3.1, 'gratuita')
+
+    avaliacoes = database.get_assessments_pending_digest()
+    assunto, corpo_html = resumo_email.montar_resumo(avaliacoes)
+    assert '2 nova(s)' in assunto
+    assert 'Ana &lt;Silva&gt;' in corpo_html and 'https://exemplo/relatorio' in corpo_html
+
+    database.mark_assessments_digested([avaliacao['id'] for avaliacao in avaliacoes])
+    assert database.get_assessments_pending_digest() == []
+
+def test_dados_do_relatorio_ficam_no_servidor(banco):
+    """Os dados para gerar o PDF de novo são buscados pela chave (a mais recente vence)"""
+    dados = {'nome': 'Ana', 'email': 'ana@teste.com', 'celular': '', 'versao': 'gratuita',
+             'data_avaliacao': '01/01/2025', 'respostas': ['3'] * 50}
+    database.save_assessment('Ana', 'ana@teste.com', 3.0, 'gratuita', 'a' * 64, None, dict(dados, nome='Antiga'))
+    database.save_assessment('Ana', 'ana@teste.com', 3.0, 'gratuita', 'a' * 64, None, dados)
+    database.save_assessment('Bruno', 'bruno@teste.com', 3.1, 'gratuita', 'b' * 64)
+
+    assert database.get_assessment_report('a' * 64) == dados
+    assert database.get_assessment_report('b' * 64) is None
+
+def test_dados_do_relatorio_apagados_apos_validade_do_link(banco):
+    """report_data das avaliações mais antigas que a validade dos links é apagado"""
+    dados = {'nome': 'Ana', 'respostas': ['3'] * 50}
+    antiga = database.save_assessment('Ana', 'ana@teste.com', 3.0, 'gratuita', 'a' * 64, None, dados)
+    database.save_assessment('Bruno', 'bruno@teste.com', 3.0, 'gratuita', 'b' * 64, None, dados)
+    conn = database.get_connection()
+    conn.execute('UPDATE assessments SET created_at = ? WHERE id = ?',
+                 ((datetime.now() - timedelta(days=31)).isoformat(), antiga))
+    conn.commit()
+
+    assert database.purge_report_data(30) == 1
+    assert database.get_assessment_report('a' * 64) is None
+    assert database.get_assessment_report('b' * 64) == dados
+    assert database.purge_report_data(30) == 0
+
+def test_limite_do_provedor_nao_consome_tentativas(banco, tmp_path, monkeypatch):
+    """Recusa por limite reagenda sem gastar tentativa; dead letter remove o PDF anexo"""
+    import smtplib
+    import outbox_email
+
+    monkeypatch.setattr(outbox_email, 'EMAIL_OUTBOX_DIR', str(tmp_path / 'outbox'))
+    monkeypatch.setattr(outbox_email, 'aguardar_envio', lambda: {'usuario': 'a@teste.com'})
+    monkeypatch.setattr(outbox_email, 'registrar_limite_atingido', lambda usuario: None)
+    monkeypatch.setattr(outbox_email, 'MAIL_PAUSA_LIMITE', 0)
+    monkeypatch.setattr(outbox_email, 'EMAIL_MAX_TENTATIVAS', 2)
+    erro = [smtplib.SMTPResponseException(451, b'4.7.1 rate limit exceeded')]
+
+    def enviar_mensagem(msg, conta):
+        raise erro[0]
+
+    monkeypatch.setattr(outbox_email, 'enviar_mensagem', enviar_mensagem)
+    email_id = outbox_email.enfileirar_email('u@teste.com', 'Assunto', '<p>corpo</p>', b'%PDF-teste')
+
+    for _ in range(3):
+        [email] = database.claim_emails()
+        assert email['attempts'] == 1
+        assert outbox_email._enviar(email) is False
+
+    # Falhas reais: a primeira reagenda, a segunda esgota as tentativas
+    erro[0] = smtplib.SMTPResponseException(550, b'5.1.1 mailbox unavailable')
+    [email] = database.claim_emails()
+    outbox_email._enviar(email)
+    database.mark_email_failed(email_id, 'antecipar a nova tentativa', datetime.now())
+    [email] = database.claim_emails()
+    assert email['attempts'] == 2
+    outbox_email._enviar(email)
+
+    assert database.get_outbox_stats()['by_status'] == {database.EMAIL_DEAD: 1}
+    assert not os.listdir(tmp_path / 'outbox')
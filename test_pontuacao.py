@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Testes da pontuação por requisição e da pontuação em lote (NumPy)
+"""
+
+import sys
+import os
+import random
+
+import pytest
+
+# Adicionar o diretório atual ao path para importar os módulos
+sys.path.insert(0, os.path.dirname(__file__))
+
+from pontuacao import CHAVES_RESPOSTAS, COMPETENCIAS_MAPEAMENTO, calcular_resultado_avaliacao
+
+np = pytest.importorskip('numpy')
+
+from pontuacao_lote import ler_matriz_csv, calcular_resultados_lote, formatar_resultados_lote
+
+def gerar_matriz(total, semente=42):
+    """Gera respostas aleatórias na escala 1-5"""
+    aleatorio = random.Random(semente)
+    return [[aleatorio.randint(1, 5) for _ in CHAVES_RESPOSTAS] for _ in range(total)]
+
+def test_resultado_por_requisicao():
+    """Médias, pontuação geral e destaques de uma avaliação simples"""
+    respostas = {chave: str(int(chave[1])) for chave in CHAVES_RESPOSTAS}  # c1 = 1 ... c5 = 5
+    resultado = calcular_resultado_avaliacao(respostas)
+
+    assert resultado.medias == {
+        'comunicacao': 1.0,
+        'organizacao': 2.0,
+        'proatividade': 3.0,
+        'pensamento_critico': 4.0,
+        'produtividade': 5.0
+    }
+    assert resultado.pontuacao_geral == 3.0
+    assert [comp['nome'] for comp in resultado.pontos_fortes] == ['Produtividade', 'Pensamento Crítico', 'Proatividade']
+    assert [comp['nome'] for comp in resultado.competencias_desenvolver] == ['Comunicação', 'Organização', 'Proatividade']
+    assert len(resultado.ranking_50_competencias) == 50
+    assert resultado.ranking_50_competencias[0]['categoria'] == 'Produtividade'
+
+def test_lote_igual_a_pontuacao_por_requisicao():
+    """A pontuação em lote deve reproduzir exatamente a pontuação de cada requisição"""
+    matriz = gerar_matriz(500)
+    lote = formatar_resultados_lote(calcular_resultados_lote(matriz))
+
+    for linha, resultado_lote in zip(matriz, lote):
+        resultado = calcular_resultado_avaliacao({chave: str(valor) for chave, valor in zip(CHAVES_RESPOSTAS, linha)})
+
+        assert resultado_lote['medias'] == resultado.medias
+        assert resultado_lote['pontuacao_geral'] == resultado.pontuacao_geral
+        assert resultado_lote['ranking_principais'] == [comp['nome'] for comp in resultado.ranking_principais]
+        assert [COMPETENCIAS_MAPEAMENTO[chave] for chave in resultado_lote['ranking_50_competencias']] == \
+            [comp['nome'] for comp in resultado.ranking_50_competencias]
+
+def test_ler_matriz_csv_com_cabecalho_fora_de_ordem():
+    """O cabeçalho permite enviar as colunas em qualquer ordem"""
+    matriz = gerar_matriz(3)
+    chaves = list(reversed(CHAVES_RESPOSTAS))
+    linhas = [','.join(chaves)] + [','.join(str(linha[CHAVES_RESPOSTAS.index(chave)]) for chave in chaves) for linha in matriz]
+
+    assert ler_matriz_csv('\n'.join(linhas)).tolist() == matriz
+
+def test_lote_rejeita_formato_invalido():
+    """Linhas sem as 50 respostas são recusadas"""
+    with pytest.raises(ValueError):
+        calcular_resultados_lote([[1, 2, 3]])
+
+def test_lote_rejeita_notas_nao_inteiras_ou_fora_da_escala():
+    """4.7 não é truncado para 4: notas fracionárias, não numéricas ou fora de 1-5 são recusadas"""
+    linha = [3] * len(CHAVES_RESPOSTAS)
+    for invalida in (4.7, 0, 6, 'x', None):
+        with pytest.raises(ValueError):
+            calcular_resultados_lote([linha[:-1] + [invalida]])
+    with pytest.raises(ValueError):
+        ler_matriz_csv(','.join(['3'] * 49 + ['4.7']))
+
+    assert calcular_resultados_lote([linha[:-1] + [4.0]])['pontuacao_geral'].tolist() == pytest.approx([3.02])
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Testes do pool de preferências de checkout (reposição, validade e pool vazio)
+"""
+
+import sys
+import os
+import time
+from collections import deque
+
+import pytest
+
+# Adicionar o diretório atual ao path para importar os módulos
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pool_preferencias
+
+BASE_URL = 'https://competencias.example.com'
+
+@pytest.fixture
+def criadas(monkeypatch):
+    """Substitui a API do Mercado Pago e guarda os dados de cada preferência criada"""
+    dados = []
+
+    def criar_no_mp(preference_data):
+        dados.append(preference_data)
+        return {'status': 201, 'response': {'id': f"pref-{len(dados)}", 'init_point': f"https://mp.example.com/{len(dados)}"}}
+
+    monkeypatch.setattr(pool_preferencias, '_criar_no_mp', criar_no_mp)
+    monkeypatch.setattr(pool_preferencias, '_pools', {BASE_URL: deque()})
+    monkeypatch.setattr(pool_preferencias, '_contadores', dict.fromkeys(pool_preferencias._contadores, 0))
+    monkeypatch.setattr(pool_preferencias, 'MP_POOL_PREFERENCIAS', 3)
+    return dados
+
+def test_pool_vazio_e_host_fora_da_configuracao(criadas):
+    """Pool vazio ou Host fora de MP_POOL_URL_BASE ficam sem preferência; após a reposição, o pool atende"""
+    assert pool_preferencias.retirar_preferencia(BASE_URL) is None
+    assert pool_preferencias.retirar_preferencia('https://atacante.example.com') is None
+
+    pool_preferencias._completar()
+    assert len(criadas) == 3
+    assert len({d['external_reference'] for d in criadas}) == 3
+    assert all(d['back_urls']['success'] == f"{BASE_URL}/pagamento_sucesso" and d['expires'] for d in criadas)
+
+    preferencia = pool_preferencias.retirar_preferencia(BASE_URL)
+    assert preferencia['id'] == 'pref-1'
+    stats = pool_preferencias.get_pool_preferencias_stats()
+    assert stats['prontas'] == {BASE_URL: 2}
+    assert stats['entregues_do_pool'] == 1 and stats['pool_vazio'] == 2
+
+def test_preferencias_perto_de_expirar_sao_descartadas(criadas):
+    """Preferências dentro da margem de expiração não são entregues e são substituídas"""
+    pool_preferencias._completar()
+    for entrada in pool_preferencias._pools[BASE_URL]:
+        entrada['expira_em'] = time.monotonic() + pool_preferencias.MP_PREFERENCIA_MARGEM - 1
+
+    pool_preferencias._completar()
+    assert len(criadas) == 6
+    assert pool_preferencias._contadores['expiradas'] == 3
+    assert pool_preferencias.retirar_preferencia(BASE_URL)['id'] == 'pref-4'
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Testes da inbox de webhooks do Mercado Pago (gravação rápida e resolução em segundo plano)
+"""
+
+import sys
+import os
+import json
+
+# Adicionar o diretório atual ao path para importar os módulos
+sys.path.insert(0, os.path.dirname(__file__))
+
+import database
+import inbox_webhook
+
+def test_extrair_notificacao():
+    """Formatos Webhooks e IPN; notificações sem id numérico são inválidas"""
+    assert inbox_webhook.extrair_notificacao({'type': 'payment', 'data': {'id': 123}}, {}) == ('payment', '123')
+    assert inbox_webhook.extrair_notificacao(None, {'topic': 'payment', 'id': '456'}) == ('payment', '456')
+    assert inbox_webhook.extrair_notificacao(
+        {'topic': 'merchant_order', 'resource': 'https://api.mercadolibre.com/merchant_orders/789'}, {}
+    ) == ('merchant_order', '789')
+    assert inbox_webhook.extrair_notificacao({'type': 'payment', 'data': {}}, {}) is None
+    assert inbox_webhook.extrair_notificacao({'type': 'payment', 'data': {'id': '1; DROP'}}, {}) is None
+
+def test_receber_e_resolver(banco, monkeypatch):
+    """A notificação é gravada na inbox; o resolvedor salva a transação ou reagenda em caso de falha"""
+    respostas = {
+        '123': {'status': 200, 'response': {'id': 123, 'status': 'approved', 'transaction_amount': 29.90,
+                                            'external_reference': 'premium_20250730_143000'}},
+        '456': {'status': 500, 'response': {'message': 'internal error'}}
+    }
+    monkeypatch.setattr(inbox_webhook, '_buscar_pagamento', lambda payment_id: respostas[payment_id])
+    monkeypatch.setattr(inbox_webhook, 'WEBHOOK_JANELA_COALESCENCIA', 0)
+
+    assert inbox_webhook.receber_notificacao({'type': 'merchant_order', 'data': {'id': 1}}, {}, '/webhook') == (inbox_webhook.IGNORADA, None)
+    assert inbox_webhook.receber_notificacao({'type': 'payment', 'data': {}}, {}, '/webhook') == (inbox_webhook.IGNORADA, None)
+    resultado, webhook_id = inbox_webhook.receber_notificacao(
+        {'type': 'payment', 'action': 'payment.updated', 'data': {'id': '123'}}, {}, '/mp/webhook'
+    )
+    assert resultado == inbox_webhook.RECEBIDA
+    inbox_webhook.receber_notificacao({}, {'topic': 'payment', 'id': '456'}, '/webhook_mercadopago')
+
+    notificacoes = database.claim_webhooks(10)
+    assert [n['resource_id'] for n in notificacoes] == ['123', '456']
+    assert json.loads(notificacoes[0]['payload'])['action'] == 'payment.updated'
+    assert database.claim_webhooks(10) == []
+
+    assert [inbox_webhook._resolver(n) for n in notificacoes] == [True, False]
+    assert database.get_transaction_by_payment_id('123')['status'] == 'approved'
+
+    stats = database.get_webhook_inbox_stats()
+    assert stats['by_status'] == {'done': 1, 'pending': 1}
+    assert stats['latency_seconds']['sample'] == 1
+
+def test_deduplicacao_e_coalescencia(banco, monkeypatch):
+    """Reenvios são descartados em memória; a rajada de um pagamento vira uma consulta e uma escrita"""
+    consultas = []
+
+    def buscar(payment_id):
+        consultas.append(payment_id)
+        return {'status': 200, 'response': {'id': int(payment_id), 'status': 'approved', 'transaction_amount': 10}}
+
+    monkeypatch.setattr(inbox_webhook, '_buscar_pagamento', buscar)
+    monkeypatch.setattr(inbox_webhook, '_vistas', type(inbox_webhook._vistas)())
+    monkeypatch.setattr(inbox_webhook, 'WEBHOOK_JANELA_COALESCENCIA', 0)
+
+    criado = {'id': 1001, 'type': 'payment', 'action': 'payment.created', 'data': {'id': '777'}}
+    atualizado = {'id': 1002, 'type': 'payment', 'action': 'payment.updated', 'data': {'id': '777'}}
+    resultados = [inbox_webhook.receber_notificacao(dados, {}, '/mp/webhook')
+                  for dados in (criado, criado, atualizado, atualizado)]
+    inbox_webhook.receber_notificacao({}, {'topic': 'payment', 'id': '777'}, '/webhook_mercadopago')
+
+    assert [resultado for resultado, _ in resultados] == [inbox_webhook.RECEBIDA, inbox_webhook.DUPLICADA,
+                                                          inbox_webhook.RECEBIDA, inbox_webhook.DUPLICADA]
+    assert resultados[0][1] == resultados[2][1]
+
+    notificacoes = database.claim_webhooks(10)
+    assert len(notificacoes) == 1 and notificacoes[0]['notifications'] == 3
+    assert json.loads(notificacoes[0]['payload']) == {'topic': 'payment', 'id': '777'}
+
+    # Notificação que chega durante a consulta fica pendente e é coberta por ela
+    def buscar_com_notificacao(payment_id):
+        inbox_webhook.receber_notificacao({'id': 1003, 'type': 'payment', 'data': {'id': '777'}}, {}, '/webhook')
+        return buscar(payment_id)
+
+    monkeypatch.setattr(inbox_webhook, '_buscar_pagamento', buscar_com_notificacao)
+    assert inbox_webhook._resolver(notificacoes[0])
+    assert consultas == ['777']
+    assert database.get_webhook_inbox_stats()['by_status'] == {'done': 1, 'pending': 1}
+
+    # A pendente foi recebida depois do início da consulta: continua na fila
+    pendentes = database.claim_webhooks(10)
+    assert [n['resource_id'] for n in pendentes] == ['777']
+
+    # Já a recebida antes da consulta seguinte é coberta por ela, sem consulta própria
+    monkeypatch.setattr(inbox_webhook, '_buscar_pagamento', buscar)
+    inbox_webhook.receber_notificacao({'id': 1004, 'type': 'payment', 'data': {'id': '777'}}, {}, '/webhook')
+    assert inbox_webhook._resolver(pendentes[0])
+    assert consultas == ['777', '777']
+    assert database.get_webhook_inbox_stats()['by_status'] == {'done': 2, 'coalesced': 1}
+    assert database.claim_webhooks(10) == []
+
+def test_circuito_aberto_nao_consome_tentativas(banco, monkeypatch):
+    """Notificação recusada pelo circuit breaker volta para a fila sem gastar tentativa"""
+    from cliente_mp import CircuitoAberto
+
+    def buscar_pagamento(payment_id):
+        raise CircuitoAberto(0)
+
+    monkeypatch.setattr(inbox_webhook, '_buscar_pagamento', buscar_pagamento)
+    monkeypatch.setattr(inbox_webhook, 'WEBHOOK_JANELA_COALESCENCIA', 0)
+    inbox_webhook.receber_notificacao({'type': 'payment', 'data': {'id': '789'}}, {}, '/webhook')
+
+    for _ in range(inbox_webhook.WEBHOOK_MAX_TENTATIVAS + 1):
+        [notificacao] = database.claim_webhooks()
+        assert notificacao['attempts'] == 1
+        assert inbox_webhook._resolver(notificacao) is False
+
+    assert database.get_webhook_inbox_stats()['by_status'] == {database.WEBHOOK_PENDING: 1}